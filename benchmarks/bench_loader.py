@@ -0,0 +1,61 @@
+"""
+Data loader: 기존 pandas python engine (sep=None 자동 감지) vs. app.logic.loader.load_xrr_text
+
+    python benchmarks/bench_loader.py
+"""
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from app.logic.loader import load_xrr_text  # noqa: E402
+
+ROWS = [1_000, 10_000, 100_000, 1_000_000]
+FORMATS = {
+    "tab": "\t",
+    "space": " ",
+    "comma": ",",
+}
+
+
+def make_text(n_rows, sep, header=True):
+    q = np.linspace(0.005, 0.5, n_rows)
+    r = np.exp(-q * 30) + 1e-7
+    lines = ["# XRR scan", "# q R dR"] if header else []
+    body = "\n".join(f"{a:.6e}{sep}{b:.6e}{sep}{0.05 * b:.6e}" for a, b in zip(q, r))
+    return "\n".join(lines + [body])
+
+
+def old_loader(text):
+    # baseline: header/주석 줄은 to_numeric + dropna 로 걸러짐
+    df = pd.read_csv(io.StringIO(text), sep=None, engine="python", header=None, names=["q", "intensity"], usecols=[0, 1])
+    return df.apply(pd.to_numeric, errors="coerce").dropna()
+
+
+def timed(fn, text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'rows':>9} {'format':>6} {'old (ms)':>10} {'new (ms)':>10} {'speedup':>8}")
+    for n_rows in ROWS:
+        for name, sep in FORMATS.items():
+            text = make_text(n_rows, sep)
+            repeat = 1 if n_rows >= 1_000_000 else 3
+            t_old = timed(old_loader, text, repeat)
+            t_new = timed(load_xrr_text, text, repeat)
+            print(f"{n_rows:>9} {name:>6} {t_old * 1e3:>10.1f} {t_new * 1e3:>10.1f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
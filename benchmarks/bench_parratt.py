@@ -0,0 +1,74 @@
+"""
+Per-evaluation latency: 기존 residual 경로 (dict 복사 + calculate_xrr_simulation + param2refl)
+vs. 컴파일된 스택 + native Parratt 커널, 두 경로의 최대 |Δlog10 R| (R > 1e-10 인 점).
+허용 오차는 tests/test_parratt.py (LOG_TOL) 참고.
+
+    python benchmarks/bench_parratt.py
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from app.logic.fitting import calculate_xrr_simulation  # noqa: E402
+from app.logic.layers import compile_stack  # noqa: E402
+
+Q_POINTS = [500, 2000, 5000, 20000]
+N_LAYERS = [2, 5, 10, 30]
+
+
+def make_layers(n_layers):
+    """기판 + SiO₂ + (n_layers - 1) 개의 Film"""
+    layers = [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+        {"layer": "SiO₂", "thickness": 15.0, "sld": 2.20, "roughness": 3.0},
+    ]
+    for i in range(n_layers - 1):
+        layers.append({"layer": "Film", "thickness": 50.0 + 5 * i, "sld": 4.0 + (i % 3), "roughness": 4.0})
+    return layers
+
+
+def time_call(fn, min_time=0.2):
+    fn()
+    n, start = 0, time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / n
+
+
+def main():
+    print(f"{'q pts':>7} {'layers':>6} {'old (ms)':>10} {'native (ms)':>12} {'speedup':>8} {'max dlog10R':>12}")
+    for n_q in Q_POINTS:
+        q = np.linspace(0.005, 0.5, n_q)
+        for n_layers in N_LAYERS:
+            layers = make_layers(n_layers)
+            stack = compile_stack(layers)
+            p = stack.p0 * 1.01
+
+            def old_path():
+                temp_layers = [L.copy() for L in layers]
+                for val, (row, key) in zip(p, stack.param_map):
+                    temp_layers[row][key] = val
+                return calculate_xrr_simulation(q, temp_layers)
+
+            def new_path():
+                return stack.reflectivity(q, p)
+
+            R_old, R_new = np.asarray(old_path(), dtype=float), new_path()
+            above = (R_old > 1e-10) & (R_new > 1e-10)
+            dlog = np.abs(np.log10(R_new[above]) - np.log10(R_old[above])).max(initial=0.0)
+
+            t_old = time_call(old_path)
+            t_new = time_call(new_path)
+            print(f"{n_q:>7} {n_layers:>6} {t_old * 1e3:>10.3f} {t_new * 1e3:>12.3f} {t_old / t_new:>7.1f}x "
+                  f"{dlog:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
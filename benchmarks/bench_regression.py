@@ -0,0 +1,251 @@
+"""
+피팅 벤치마크 / 회귀 테스트.
+알려진 스택에서 param2refl 로 합성 곡선을 만들고 (Poisson 노이즈 + background),
+AI guess (또는 흐트린 정답) 에서 시작해 피팅한 뒤 wall time / nfev / 레이어별 파라미터 복원 오차를 기록합니다.
+결과는 JSON 으로 저장하고, 저장된 baseline 과 비교해서 느려지거나 부정확해진 경우를 표시합니다.
+
+    python benchmarks/bench_regression.py --out results.json
+    python benchmarks/bench_regression.py --baseline baseline.json          # 회귀가 있으면 exit 1
+    python benchmarks/bench_regression.py --save-baseline baseline.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from app.logic.fitting import calculate_xrr_simulation, run_fitting_algorithm  # noqa: E402
+from app.logic.layers import LayerStack  # noqa: E402
+from app.logic.parratt import FIELDS  # noqa: E402
+
+WAVELENGTH = 1.5406
+SUBSTRATE = {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2}
+
+
+def _film(thickness, sld, roughness, name="Film", **extra):
+    return dict({"layer": name, "thickness": thickness, "sld": sld, "roughness": roughness}, **extra)
+
+
+# 테이블 순서 (기판이 첫 행), start: "ai" = AI guess 에서 시작 / "perturbed" = 흐트린 정답에서 시작
+CASES = [
+    {"name": "single_film", "start": "ai", "layers": [
+        SUBSTRATE, _film(12.0, 3.47, 3.0, "SiO₂"), _film(250.0, 4.5, 4.0)]},
+    {"name": "bilayer", "start": "ai", "layers": [
+        SUBSTRATE, _film(15.0, 3.47, 3.0, "SiO₂"), _film(80.0, 8.0, 4.0), _film(150.0, 3.0, 5.0)]},
+    {"name": "thin_dense", "start": "ai", "layers": [
+        SUBSTRATE, _film(10.0, 3.47, 2.5, "SiO₂"), _film(40.0, 19.0, 3.0)]},
+    {"name": "rough_film", "start": "ai", "layers": [
+        SUBSTRATE, _film(20.0, 3.47, 4.0, "SiO₂"), _film(300.0, 5.0, 12.0)]},
+    {"name": "superlattice", "start": "perturbed", "layers": [
+        SUBSTRATE, _film(15.0, 3.47, 3.0, "SiO₂"),
+        _film(20.0, 9.0, 4.0, "Film B", repeat="10"), _film(30.0, 4.0, 3.0, "Film A", repeat="10")]},
+]
+
+# baseline 대비 허용 범위
+TOLERANCES = {
+    "time_rel": 0.25,      # wall time 25% 이상 증가
+    "time_abs": 0.05,      # 단, 0.05 s 이하 차이는 무시
+    "nfev_rel": 0.25,      # 함수 평가 수 25% 이상 증가
+    "error_abs": 0.02,     # 파라미터 상대 오차가 0.02 (2%p) 이상 증가
+}
+
+
+def make_curve(layers, seed, n_points=1000, q_max=0.3, flux=1e7, background=2.0):
+    """정답 스택 -> (q, 강도, dR): param2refl 곡선 * flux + background 에 Poisson 노이즈"""
+    rng = np.random.default_rng(seed)
+    q = np.linspace(0.005, q_max, n_points)
+    counts = rng.poisson(calculate_xrr_simulation(q, layers) * flux + background).astype(float)
+    return q, counts, np.sqrt(np.maximum(counts, 1.0))
+
+
+def perturbed_start(layers, seed, amount=0.08):
+    """정답에서 각 모델 파라미터를 ±amount 비율로 흐트린 시작 테이블"""
+    rng = np.random.default_rng(seed + 1000)
+    stack = LayerStack.from_table(layers)
+    films, sio2, _ = stack.model_rows()
+    start = [dict(L) for L in layers]
+    for row in films + [sio2]:
+        for key in FIELDS:
+            start[row][key] = float(start[row][key]) * (1.0 + rng.uniform(-amount, amount))
+    return start
+
+
+def recovery_errors(true_layers, fitted_layers):
+    """
+    레이어별 파라미터 복원 오차 {행 이름: {key: 상대 오차}}.
+    구조 (모델 행 수) 가 다르면 None.
+    """
+    truth, fitted = LayerStack.from_table(true_layers), LayerStack.from_table(fitted_layers)
+    t_films, t_sio2, _ = truth.model_rows()
+    f_films, f_sio2, _ = fitted.model_rows()
+    if len(t_films) != len(f_films) or (t_sio2 is None) != (f_sio2 is None):
+        return None
+    errors = {}
+    for i, (t_row, f_row) in enumerate(zip(t_films + [t_sio2], f_films + [f_sio2])):
+        name = f"{i}:{truth.names[t_row]}"
+        errors[name] = {
+            key: float(abs(fitted.values[f, f_row] - truth.values[f, t_row]) / max(abs(truth.values[f, t_row]), 1e-9))
+            for f, key in enumerate(FIELDS)
+        }
+    return errors
+
+
+def run_case(case, seed, use_ai=True):
+    """케이스 하나 (seed 하나) 실행 -> 결과 dict"""
+    q, intensity, errors = make_curve(case["layers"], seed)
+    result = {"case": case["name"], "seed": seed, "start": case["start"], "ai_time_s": 0.0}
+
+    start_layers = None
+    if case["start"] == "ai" and use_ai:
+        t0 = time.perf_counter()
+        try:
+            from app.logic.ai_interface import run_ai_prediction
+            start_layers = run_ai_prediction(q, intensity, WAVELENGTH)
+        except Exception as e:
+            result["ai_error"] = str(e)
+        result["ai_time_s"] = time.perf_counter() - t0
+        if start_layers is not None:
+            result["ai_errors"] = recovery_errors(case["layers"], start_layers)
+    if start_layers is None:
+        start_layers = perturbed_start(case["layers"], seed)
+        result["start"] = "perturbed"
+
+    t0 = time.perf_counter()
+    fitted, info = run_fitting_algorithm(
+        start_layers, q, intensity, WAVELENGTH, full_output=True, errors=errors, weighting="log"
+    )
+    result.update({
+        "fit_time_s": time.perf_counter() - t0,
+        "success": info["success"],
+        "nfev": info["nfev"],
+        "njev": info["njev"],
+        "cost": info["cost"],
+        "redchi": info["redchi"],
+        "errors": recovery_errors(case["layers"], fitted),
+    })
+    result["wall_time_s"] = result["ai_time_s"] + result["fit_time_s"]
+    result["max_error"] = _max_error(result["errors"])
+    return result
+
+
+def _max_error(errors):
+    if not errors:
+        return None
+    return max(v for layer in errors.values() for v in layer.values())
+
+
+def run_suite(cases=CASES, seeds=(0, 1, 2), use_ai=True):
+    results = [run_case(case, seed, use_ai) for case in cases for seed in seeds]
+    return {"meta": _metadata(), "results": results, "summary": summarize(results)}
+
+
+def summarize(results):
+    times = [r["wall_time_s"] for r in results]
+    max_errors = [r["max_error"] for r in results if r["max_error"] is not None]
+    return {
+        "n_runs": len(results),
+        "n_success": sum(r["success"] for r in results),
+        "total_wall_time_s": float(np.sum(times)),
+        "median_wall_time_s": float(np.median(times)),
+        "total_nfev": int(sum(r["nfev"] for r in results)),
+        "median_max_error": float(np.median(max_errors)) if max_errors else None,
+        "structure_mismatches": sum(r["errors"] is None for r in results),
+    }
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, tolerances=TOLERANCES):
+    """
+    baseline 결과와 비교 -> 회귀 리스트 [{"case", "seed", "metric", "baseline", "current"}]
+    (case, seed, 시작점) 이 baseline 에 없으면 건너뜁니다.
+    """
+    base = {(r["case"], r["seed"], r["start"]): r for r in baseline["results"]}
+    flags = []
+
+    def flag(r, metric, old, new):
+        flags.append({"case": r["case"], "seed": r["seed"], "metric": metric, "baseline": old, "current": new})
+
+    for r in results["results"]:
+        b = base.get((r["case"], r["seed"], r["start"]))
+        if b is None:
+            continue
+        if b["success"] and not r["success"]:
+            flag(r, "success", True, False)
+        if r["wall_time_s"] > b["wall_time_s"] * (1 + tolerances["time_rel"]) \
+                and r["wall_time_s"] - b["wall_time_s"] > tolerances["time_abs"]:
+            flag(r, "wall_time_s", b["wall_time_s"], r["wall_time_s"])
+        if r["nfev"] > b["nfev"] * (1 + tolerances["nfev_rel"]):
+            flag(r, "nfev", b["nfev"], r["nfev"])
+        if b["max_error"] is not None and (r["max_error"] is None
+                                           or r["max_error"] > b["max_error"] + tolerances["error_abs"]):
+            flag(r, "max_error", b["max_error"], r["max_error"])
+    return flags
+
+
+def print_report(suite, flags=None):
+    print(f"{'case':<14} {'seed':>4} {'start':<10} {'time (s)':>9} {'nfev':>5} {'χ²_red':>9} {'max err':>8}")
+    for r in suite["results"]:
+        err = f"{r['max_error']:.3f}" if r["max_error"] is not None else "mismatch"
+        print(f"{r['case']:<14} {r['seed']:>4} {r['start']:<10} {r['wall_time_s']:>9.3f} {r['nfev']:>5} "
+              f"{r['redchi']:>9.3g} {err:>8}")
+    s = suite["summary"]
+    print(f"\n{s['n_success']}/{s['n_runs']} converged, total {s['total_wall_time_s']:.2f} s, "
+          f"{s['total_nfev']} nfev, median max error {s['median_max_error']}")
+    if flags is not None:
+        if not flags:
+            print("✅ No regressions against baseline")
+        for f in flags:
+            print(f"❌ {f['case']} (seed {f['seed']}): {f['metric']} {f['baseline']} -> {f['current']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="XRR fitting benchmark / regression suite")
+    parser.add_argument("--out", help="결과 JSON 경로")
+    parser.add_argument("--baseline", help="비교할 baseline JSON (회귀가 있으면 exit 1)")
+    parser.add_argument("--save-baseline", help="이번 결과를 baseline 으로 저장")
+    parser.add_argument("--seeds", type=int, default=3, help="케이스당 노이즈 seed 수")
+    parser.add_argument("--cases", nargs="*", help="실행할 케이스 이름 (기본: 전체)")
+    parser.add_argument("--no-ai", action="store_true", help="AI guess 없이 흐트린 정답에서 시작")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in CASES if not args.cases or c["name"] in args.cases]
+    suite = run_suite(cases, tuple(range(args.seeds)), use_ai=not args.no_ai)
+
+    flags = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            flags = compare(suite, json.load(f))
+        suite["regressions"] = flags
+    print_report(suite, flags)
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(suite, f, indent=2, ensure_ascii=False)
+            print(f"💾 Saved: {path}")
+    return 1 if flags else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
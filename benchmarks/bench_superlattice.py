@@ -0,0 +1,49 @@
+"""
+[A/B]×N 초격자: N 개 주기를 모두 펼친 Parratt 재귀 vs. 주기 전달 행렬 거듭제곱 (repeat 블록).
+
+    python benchmarks/bench_superlattice.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from app.logic.layers import compile_stack  # noqa: E402
+from bench_parratt import time_call  # noqa: E402
+
+Q_POINTS = 2000
+REPEATS = [5, 20, 50, 100]
+
+
+def make_layers(n_repeat, unroll):
+    """기판 + SiO₂ + [A/B]×n_repeat (unroll=True 이면 행을 모두 펼침)"""
+    layers = [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.07, "roughness": 3.0},
+        {"layer": "SiO₂", "thickness": 15.0, "sld": 3.47, "roughness": 3.0},
+    ]
+    period = [
+        {"layer": "Film B", "thickness": 20.0, "sld": 9.0, "roughness": 4.0},
+        {"layer": "Film A", "thickness": 30.0, "sld": 4.0, "roughness": 3.0},
+    ]
+    if unroll:
+        return layers + period * n_repeat
+    return layers + [dict(L, repeat=str(n_repeat)) for L in period]
+
+
+def main():
+    q = np.linspace(0.005, 0.5, Q_POINTS)
+    print(f"{'N':>5} {'params (full)':>14} {'params (block)':>15} {'full (ms)':>10} {'block (ms)':>11} {'speedup':>8} {'max |Δlog R|':>13}")
+    for n_repeat in REPEATS:
+        full = compile_stack(make_layers(n_repeat, unroll=True))
+        block = compile_stack(make_layers(n_repeat, unroll=False))
+        diff = np.max(np.abs(np.log10(full.simulate(q)) - np.log10(block.simulate(q))))
+        t_full = time_call(lambda: full.reflectivity(q, full.p0))
+        t_block = time_call(lambda: block.reflectivity(q, block.p0))
+        print(f"{n_repeat:>5} {full.p0.size:>14} {block.p0.size:>15} {t_full * 1e3:>10.2f} {t_block * 1e3:>11.2f} "
+              f"{t_full / t_block:>7.1f}x {diff:>13.2e}")
+
+
+if __name__ == "__main__":
+    main()
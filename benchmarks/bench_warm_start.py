@@ -0,0 +1,76 @@
+"""
+Warm start 효과 측정: 기본 테이블 값에서 시작 vs. AI guess + FFT 두께 시작 (좁힌 bounds).
+샘플 곡선 폴더를 주면 그 파일들로, 없으면 합성 곡선으로 측정합니다.
+
+    python benchmarks/bench_warm_start.py [--data "resource/*.dat"] [--n 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from app.batch import collect_files  # noqa: E402
+from app.logic.ai_interface import run_ai_prediction  # noqa: E402
+from app.logic.analysis import warm_start  # noqa: E402
+from app.logic.fitting import run_fitting_algorithm  # noqa: E402
+from app.logic.layers import compile_stack  # noqa: E402
+from app.logic.utils import read_xrr_file  # noqa: E402
+
+WAVELENGTH = 1.5406
+COLD_LAYERS = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 10.0, "sld": 2.20, "roughness": 0.3},
+    {"layer": "Film", "thickness": 100.0, "sld": 4.0, "roughness": 0.3},
+]
+
+
+def synthetic_corpus(n, seed=0):
+    rng = np.random.default_rng(seed)
+    q = np.linspace(0.005, 0.3, 1000)
+    for _ in range(n):
+        layers = [dict(L) for L in COLD_LAYERS]
+        layers[1].update(thickness=rng.uniform(5, 25), sld=rng.uniform(1.8, 2.6), roughness=rng.uniform(1, 5))
+        layers[2].update(thickness=rng.uniform(50, 400), sld=rng.uniform(2, 20), roughness=rng.uniform(1, 8))
+        stack = compile_stack(layers)
+        refl = stack.reflectivity(q, stack.p0) * 1e6
+        yield q, refl * rng.lognormal(0, 0.05, len(q))
+
+
+def file_corpus(pattern):
+    for path in collect_files(pattern):
+        yield read_xrr_file(path)
+
+
+def fit(layers, q, refl, bounds=None):
+    start = time.perf_counter()
+    _, info = run_fitting_algorithm(layers, q, refl, WAVELENGTH, full_output=True, bounds=bounds)
+    return info, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=None)
+    parser.add_argument("--n", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = file_corpus(args.data) if args.data else synthetic_corpus(args.n)
+    rows = []
+    for q, refl in corpus:
+        cold, t_cold = fit(COLD_LAYERS, q, refl)
+        seed, bounds = warm_start(q, refl, run_ai_prediction(q, refl, WAVELENGTH))
+        warm, t_warm = fit(seed, q, refl, bounds)
+        rows.append((cold["njev"], warm["njev"], cold["nfev"], warm["nfev"], cold["cost"], warm["cost"], t_cold, t_warm))
+
+    rows = np.array(rows)
+    cols = ["iter cold", "iter warm", "nfev cold", "nfev warm", "cost cold", "cost warm", "time cold", "time warm"]
+    print(f"{len(rows)} curves (median)")
+    for name, val in zip(cols, np.median(rows, axis=0)):
+        print(f"  {name:>10}: {val:.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
 from dash import Dash
 import dash_bootstrap_components as dbc
 
+from .instrumentation import install
+from .jobs import background_callback_manager
+
 app = Dash(
     __name__,
     use_pages=True,
     external_stylesheets=[dbc.themes.BOOTSTRAP],
-    suppress_callback_exceptions=True
+    suppress_callback_exceptions=True,
+    background_callback_manager=background_callback_manager
 )
 
 server = app.server
+# /metrics, 요청별 payload 크기 / cProfile (app.instrumentation)
+install(server)
@@ -0,0 +1,130 @@
+"""
+Headless batch fitting.
+
+    python -m app.batch "scans/*.dat" --model model.json --out results.csv
+
+model.json 은 layers-table 과 같은 형식의 레이어 리스트입니다.
+피팅 세션은 끝에 한 번에 세션 DB (XRR_DB_PATH) 에 기록됩니다 (--no-db 로 끔).
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.logic.datastore import DatasetStore
+from app.logic.fit_cache import cached_fit
+from app.logic.fitting import run_fitting_algorithm
+from app.logic.sessions import session_db
+from app.logic.utils import read_xrr_file
+
+DATA_SUFFIXES = (".dat", ".xy", ".txt", ".csv")
+
+
+def collect_files(pattern):
+    """디렉토리 또는 glob 패턴 -> 정렬된 데이터 파일 리스트"""
+    path = Path(pattern)
+    if path.is_dir():
+        files = [p for p in path.iterdir() if p.suffix.lower() in DATA_SUFFIXES]
+    else:
+        files = [Path(p) for p in glob.glob(pattern, recursive=True)]
+    return sorted(p for p in files if p.is_file())
+
+
+def fit_file(path, layers, wavelength, use_cache=True):
+    """워커 프로세스에서 파일 하나를 피팅하고 (결과 행 dict, 세션 기록 dict 또는 None) 을 반환"""
+    row = {"file": str(path)}
+    start = time.perf_counter()
+    session = None
+    try:
+        q, intensity, errors = read_xrr_file(path, errors=True)
+        data = np.vstack([q, intensity] + ([errors] if errors is not None else []))
+        fit = cached_fit if use_cache else run_fitting_algorithm
+        fitted, info = fit(layers, q, intensity, wavelength, full_output=True, errors=errors)
+        session = {"sample": Path(path).name, "source": "batch", "data_hash": DatasetStore.make_key(data),
+                   "wavelength": wavelength, "initial_layers": layers, "final_layers": fitted, "info": info,
+                   "settings": {"weighting": "log", "errors": errors is not None}}
+    except Exception as e:
+        fitted, info = layers, {"success": False, "cost": float("nan"), "nfev": 0, "njev": 0, "message": str(e),
+                                "redchi": float("nan"), "uncertainties": []}
+
+    row.update({
+        "success": info["success"],
+        "cost": info["cost"],
+        "iterations": info["njev"],
+        "nfev": info["nfev"],
+        "redchi": info["redchi"],
+        "wall_time_s": time.perf_counter() - start,
+        "cache": info.get("cache", "off"),
+        "message": info["message"],
+    })
+    uncertainties = info["uncertainties"]
+    for i, layer in enumerate(fitted):
+        for key in ("thickness", "sld", "roughness"):
+            row[f"L{i}_{layer.get('layer', '-')}_{key}"] = layer.get(key)
+            if i < len(uncertainties) and key in uncertainties[i]:
+                row[f"L{i}_{layer.get('layer', '-')}_{key}_err"] = uncertainties[i][key]
+    if session is not None:
+        session["wall_time_s"] = row["wall_time_s"]
+    # 캐시에서 그대로 꺼낸 결과는 이미 기록된 피팅이므로 세션을 다시 만들지 않음
+    if info.get("cache") == "hit":
+        session = None
+    return row, session
+
+
+def run_batch(files, layers, wavelength, workers=None, db=session_db, use_cache=True):
+    """
+    ProcessPool 로 모든 파일을 병렬 피팅 -> 결과 DataFrame.
+    db 가 있으면 새로 피팅한 세션 (캐시 hit 제외) 을 끝에 한 트랜잭션으로 기록합니다.
+    use_cache: 바뀌지 않은 파일 (데이터 / 모델 / 설정이 같음) 은 fit_cache 의 결과를 그대로 씁니다.
+    """
+    workers = workers or os.cpu_count() or 1
+    rows, sessions = [], []
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        futures = [pool.submit(fit_file, f, layers, wavelength, use_cache) for f in files]
+        for n, fut in enumerate(as_completed(futures), 1):
+            row, session = fut.result()
+            rows.append(row)
+            if session is not None:
+                sessions.append(session)
+            status = "✅" if row["success"] else "❌"
+            print(f"{status} [{n}/{len(files)}] {row['file']} (cost={row['cost']:.4g}, {row['wall_time_s']:.2f}s)")
+    if db is not None and sessions:
+        db.record_fits(sessions)
+        print(f"💾 Saved {len(sessions)} fit sessions -> {db.path}")
+    return pd.DataFrame(rows).sort_values("file").reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch XRR fitting")
+    parser.add_argument("data", help="데이터 디렉토리 또는 glob 패턴")
+    parser.add_argument("--model", required=True, help="시작 레이어 모델 (JSON)")
+    parser.add_argument("--wavelength", type=float, default=1.5406, help="빔 파장 (Å)")
+    parser.add_argument("--out", default="batch_results.csv", help="결과 테이블 (.csv)")
+    parser.add_argument("--workers", type=int, default=None, help="프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--no-db", action="store_true", help="피팅 세션을 DB 에 기록하지 않음")
+    parser.add_argument("--no-cache", action="store_true", help="결과 캐시를 쓰지 않고 모든 파일을 다시 피팅")
+    args = parser.parse_args(argv)
+
+    files = collect_files(args.data)
+    if not files:
+        parser.error(f"No data files found: {args.data}")
+
+    with open(args.model, encoding="utf-8") as f:
+        layers = json.load(f)
+
+    print(f"🚀 Batch fitting {len(files)} files...")
+    start = time.perf_counter()
+    results = run_batch(files, layers, args.wavelength, args.workers, db=None if args.no_db else session_db,
+                        use_cache=not args.no_cache)
+    results.to_csv(args.out, index=False)
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
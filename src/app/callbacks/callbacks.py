@@ -1,35 +1,89 @@
-import pandas as pd
+import threading
+import time
+from collections import OrderedDict
+
 import numpy as np
-from dash import callback, Output, Input, State, ctx, no_update
+import pandas as pd
+from dash import callback, dcc, html, Output, Input, State, ctx, no_update, Patch
 import plotly.graph_objects as go
 
 from app.components.film_3d import generate_film_stack_figure
+from app.jobs import WORKERS_PER_JOB, job_slot
+from app.instrumentation import instrumented
 from app.logic.materials import INITIAL_LAYERS, MATERIAL_DB
-from app.logic.ai_interface import run_ai_prediction
-from app.logic.fitting import run_fitting_algorithm
+from app.logic.ai_interface import run_ai_prediction, run_lookup_prediction
+from app.logic.fit_cache import cached_fit
+from app.logic.global_fit import run_global_fit
+from app.logic.analysis import warm_start
+from app.logic.datastore import dataset_store, load_dataset
+from app.logic.instrument import Instrument
+from app.logic.sessions import session_db
 
-from app.logic.utils import parse_contents, reset_suggestion_table, calculate_xrr_curve, format_table_data
-from app.logic.plotting import create_comparison_graph, create_residual_graph, create_fft_graph
+from app.logic.utils import (
+    parse_contents, reset_suggestion_table, calculate_xrr_curve, format_table_data, layers_key, RateLimiter
+)
+from app.logic.plotting import (
+    create_comparison_graph, create_residual_graph, create_fft_graph,
+    display_indices, residual_trace, TRACE_AI, TRACE_FIT
+)
 
-# 1. 파일 업로드
+# 1. 파일 업로드 (같은 데이터의 저장된 피팅이 있으면 마지막 결과를 제안 테이블에 복원)
 @callback(
     Output('xrr-data-store', 'data'),
     Output('upload-status', 'children'),
+    Output("ai-results-table", "data", allow_duplicate=True),
+    Output("fit-status-store", "data", allow_duplicate=True),
+    Output("fit-chi2", "children", allow_duplicate=True),
     Input('upload-data', 'contents'),
     State('upload-data', 'filename'),
     prevent_initial_call=True
 )
+@instrumented
 def update_output(contents, filename):
     if contents:
         data = parse_contents(contents, filename)
-        return (data, f"✅ Loaded: {filename}") if data else (None, "❌ Error")
-    return None, "Awaiting upload..."
+        if data is None or data.shape[1] == 0:
+            return None, "❌ Error", no_update, no_update, no_update
+        # 클라이언트에는 서버측 데이터 키만 저장
+        key = dataset_store.put(data)
+        try:
+            saved, n_fits = session_db.reopen(key)
+        except Exception as e:
+            print(f"Session DB error: {e}")
+            saved, n_fits = None, 0
+        history = f" ({n_fits} saved fits)" if n_fits else ""
+        if saved is None:
+            return key, f"✅ Loaded: {filename}{history}", no_update, no_update, no_update
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(saved["created_at"]))
+        chi2 = f"χ²_red: {saved['redchi']:.4g}" if saved["redchi"] is not None else "χ²: -"
+        return (key, f"✅ Loaded: {filename}{history}, restored fit from {date}", saved["final_layers"], True,
+                f"{chi2}  (saved fit, {date})")
+    return None, "Awaiting upload...", no_update, no_update, no_update
+
+# 1-b. Instrument 설정 (분해능 / footprint / scale / background)
+@callback(
+    Output('instrument-store', 'data'),
+    Input('instrument-resolution-mode', 'value'),
+    Input('instrument-resolution', 'value'),
+    Input('instrument-sample-length', 'value'),
+    Input('instrument-beam-width', 'value'),
+    Input('instrument-scale', 'value'),
+    Input('instrument-background', 'value'),
+    Input('input-wavelength', 'value'),
+)
+@instrumented
+def update_instrument(mode, resolution, sample_length, beam_width, scale, background, wavelength):
+    # dq/q 는 % 로 입력
+    if mode == "dq/q" and resolution:
+        resolution = resolution / 100.0
+    return Instrument(mode, resolution, wavelength, sample_length, beam_width, scale, background).to_dict()
 
 # 2. 테이블 하이라이트
 @callback(
     Output("layers-table", "style_data_conditional"),
     Input("layers-table", "active_cell")
 )
+@instrumented
 def highlight_active_row(active_cell):
     style = [{'if': {'row_index': 'odd'}, 'backgroundColor': '#f9fafb'}]
     if active_cell:
@@ -41,91 +95,231 @@ def highlight_active_row(active_cell):
         })
     return style
 
-# 3. Layers Table & Status Update
+# 3. Layers Table 편집 (액션별로 분리: 각 액션은 자신이 바꾸는 출력만 갱신)
+MATERIAL_BUTTONS = [f"mat-{mat['formula'].replace('₂','2').replace('₅','5')}" for mat in MATERIAL_DB]
+
+# 3-a. 재료 / 빈 행 추가
 @callback(
-    [Output("layers-table", "data", allow_duplicate=True),
-     Output("layers-table", "active_cell"),
-     Output("ai-results-table", "data"),
-     Output("ai-param-store", "data"),
-     Output("fit-status-store", "data")], 
-    
-    [Input(f"mat-{mat['formula'].replace('₂','2').replace('₅','5')}", "n_clicks") for mat in MATERIAL_DB],
-    Input("btn-init-ai", "n_clicks"),
-    Input("btn-apply-ai", "n_clicks"),
+    Output("layers-table", "data", allow_duplicate=True),
+    Output("ai-results-table", "data"),
+    Output("fit-status-store", "data"),
+    [Input(btn, "n_clicks") for btn in MATERIAL_BUTTONS],
     Input("btn-add-row", "n_clicks"),
+    State("layers-table", "data"),
+    prevent_initial_call=True
+)
+@instrumented
+def add_layer(*args):
+    triggered_id = ctx.triggered_id
+    if not triggered_id: return [no_update]*3
+    layers_data = list(args[-1]) if args[-1] else []
+
+    if triggered_id.startswith("mat-"):
+        formula = triggered_id.replace("mat-", "")
+        defaults = {"Si": 2.33, "SiO2": 2.20, "Al2O3": 3.95, "Cr": 7.19, "Au": 19.32}
+        new_layer = {"layer": formula, "thickness": 10.0, "sld": defaults.get(formula.replace('2','₂').replace('5','₅'), 2.0), "roughness": 0.3}
+    else:
+        new_layer = {"layer": "New Layer", "thickness": 10.0, "sld": 2.0, "roughness": 0.3}
+
+    layers_data.append(new_layer)
+    return layers_data, reset_suggestion_table(layers_data), False
+
+# 3-b. 행 이동
+@callback(
+    Output("layers-table", "data", allow_duplicate=True),
+    Output("layers-table", "active_cell"),
+    Output("ai-results-table", "data", allow_duplicate=True),
+    Output("fit-status-store", "data", allow_duplicate=True),
     Input("btn-move-up", "n_clicks"),
     Input("btn-move-down", "n_clicks"),
-    Input("btn-start-fit", "n_clicks"),
-    
     State("layers-table", "data"),
     State("layers-table", "active_cell"),
+    prevent_initial_call=True
+)
+@instrumented
+def move_layer(n_up, n_down, layers_data, active_cell):
+    if not active_cell or not layers_data: return [no_update]*4
+    layers_data = list(layers_data)
+    move = -1 if ctx.triggered_id == "btn-move-up" else 1
+    idx = active_cell['row']
+    target = idx + move
+    if not 0 <= target < len(layers_data): return [no_update]*4
+
+    layers_data[idx], layers_data[target] = layers_data[target], layers_data[idx]
+    active_cell['row'] = target
+    return layers_data, active_cell, reset_suggestion_table(layers_data), False
+
+# 3-c. 제안 적용
+@callback(
+    Output("layers-table", "data", allow_duplicate=True),
+    Output("layers-table", "active_cell", allow_duplicate=True),
+    Output("fit-status-store", "data", allow_duplicate=True),
+    Input("btn-apply-ai", "n_clicks"),
     State("ai-results-table", "data"),
+    prevent_initial_call=True
+)
+@instrumented
+def apply_suggestion(n_clicks, ai_data_stored):
+    if not ai_data_stored: return [no_update]*3
+    return ai_data_stored, None, False
+
+# 3-1. AI 초기화 (Background Job)
+@callback(
+    Output("ai-results-table", "data", allow_duplicate=True),
+    Output("ai-param-store", "data", allow_duplicate=True),
+    Output("fit-status-store", "data", allow_duplicate=True),
+    Input("btn-init-ai", "n_clicks"),
     State("xrr-data-store", "data"),
     State("input-wavelength", "value"),
+    background=True,
+    running=[(Output("btn-init-ai", "disabled"), True, False)],
+    progress=[Output("job-status", "children")],
+    progress_default=["Status: Ready"],
+    cancel=[Input("btn-cancel-job", "n_clicks")],
     prevent_initial_call=True
 )
-def update_layers_table(*args):
-    if not ctx.triggered: return [no_update]*5
-    triggered_id = ctx.triggered_id
-    
-    layers_data = list(args[-5]) if args[-5] else []
-    active_cell = args[-4]
-    ai_data_stored = args[-3]
-    xrr_store_data = args[-2]
-    wavelength_val = args[-1]
+@instrumented
+def run_ai_job(set_progress, n_clicks, xrr_store_data, wavelength_val):
+    q_exp, raw_intensity = load_dataset(xrr_store_data)
+    if q_exp is None: return [no_update]*3
     wl = float(wavelength_val or 1.54)
-    
-    new_layer = None
-    structure_changed = False 
-    
-    # 1. 재료 추가
-    if triggered_id.startswith("mat-"):
-        formula = triggered_id.replace("mat-", "")
-        defaults = {"Si": 2.33, "SiO2": 2.20, "Al2O3": 3.95, "Cr": 7.19, "Au": 19.32}
-        new_layer = {"layer": formula, "thickness": 10.0, "sld": defaults.get(formula.replace('2','₂').replace('5','₅'), 2.0), "roughness": 0.3}
-    
-    # 2. AI 초기화
-    elif triggered_id == "btn-init-ai":
-        if not xrr_store_data: return [no_update]*5
-        df = pd.DataFrame(xrr_store_data)
-        ai_prediction = run_ai_prediction(df['q'].values, df['intensity'].values, wl)
-        return no_update, no_update, ai_prediction, ai_prediction, False
-
-    # 3. Fitting 수행
-    elif triggered_id == "btn-start-fit":
-        if not xrr_store_data or not layers_data: return [no_update]*5
-        df = pd.DataFrame(xrr_store_data)
-        fitted_layers = run_fitting_algorithm(layers_data, df['q'].values, df['intensity'].values, wl)
-        return no_update, no_update, fitted_layers, no_update, True
-
-    # 4. 제안 적용
-    elif triggered_id == "btn-apply-ai":
-        if ai_data_stored:
-            return ai_data_stored, None, no_update, no_update, False
-        return [no_update]*5
-
-    # 5. 행 조작
-    elif triggered_id == "btn-add-row":
-        new_layer = {"layer": "New Layer", "thickness": 10.0, "sld": 2.0, "roughness": 0.3}
-    elif triggered_id in ["btn-move-up", "btn-move-down"]:
-        move = -1 if "up" in triggered_id else 1
-        if active_cell:
-            idx = active_cell['row']
-            target = idx + move
-            if 0 <= target < len(layers_data):
-                layers_data[idx], layers_data[target] = layers_data[target], layers_data[idx]
-                active_cell['row'] = target
-                structure_changed = True
-                return layers_data, active_cell, reset_suggestion_table(layers_data), no_update, False
-
-    if new_layer:
-        layers_data.append(new_layer)
-        structure_changed = True
-        
-    if structure_changed:
-        return layers_data, no_update, reset_suggestion_table(layers_data), no_update, False
-        
-    return [no_update]*5
+
+    with job_slot(on_wait=lambda: set_progress(["Status: Queued ⏳"])):
+        set_progress(["Status: AI Guess running 🤖"])
+        ai_prediction = run_ai_prediction(q_exp, raw_intensity, wl)
+    return ai_prediction, ai_prediction, False
+
+# 3-1b. Lookup 초기화 (레시피 라이브러리, 처음 한 번만 라이브러리 생성)
+@callback(
+    Output("ai-results-table", "data", allow_duplicate=True),
+    Output("ai-param-store", "data", allow_duplicate=True),
+    Output("fit-status-store", "data", allow_duplicate=True),
+    Input("btn-init-lookup", "n_clicks"),
+    State("xrr-data-store", "data"),
+    State("layers-table", "data"),
+    State("input-wavelength", "value"),
+    background=True,
+    running=[(Output("btn-init-lookup", "disabled"), True, False)],
+    progress=[Output("job-status", "children")],
+    progress_default=["Status: Ready"],
+    cancel=[Input("btn-cancel-job", "n_clicks")],
+    prevent_initial_call=True
+)
+@instrumented
+def run_lookup_job(set_progress, n_clicks, xrr_store_data, layers_data, wavelength_val):
+    q_exp, raw_intensity = load_dataset(xrr_store_data)
+    if q_exp is None or not layers_data: return [no_update]*3
+    wl = float(wavelength_val or 1.54)
+
+    with job_slot(on_wait=lambda: set_progress(["Status: Queued ⏳"])):
+        set_progress(["Status: Lookup running 📚"])
+        prediction = run_lookup_prediction(q_exp, raw_intensity, wl, layers_data)
+    if prediction is None:
+        set_progress(["Status: Lookup needs free Film / SiO₂ parameters ⚠"])
+        return [no_update]*3
+    return prediction, prediction, False
+
+# 3-2. Fitting 수행 (Background Job)
+@callback(
+    Output("ai-results-table", "data", allow_duplicate=True),
+    Output("fit-status-store", "data", allow_duplicate=True),
+    Output("fit-chi2", "children"),
+    Input("btn-start-fit", "n_clicks"),
+    State("layers-table", "data"),
+    State("xrr-data-store", "data"),
+    State("input-wavelength", "value"),
+    State("fit-options", "value"),
+    State("ai-param-store", "data"),
+    State("instrument-store", "data"),
+    State("fit-weighting", "value"),
+    State("upload-data", "filename"),
+    background=True,
+    running=[(Output("btn-start-fit", "disabled"), True, False)],
+    progress=[Output("job-status", "children"), Output("fit-progress-store", "data")],
+    progress_default=["Status: Ready", None],
+    cancel=[Input("btn-cancel-job", "n_clicks")],
+    prevent_initial_call=True
+)
+@instrumented
+def run_fit_job(set_progress, n_clicks, layers_data, xrr_store_data, wavelength_val, fit_options, ai_params,
+                instrument_data, weighting, filename):
+    q_exp, raw_intensity, errors = load_dataset(xrr_store_data, errors=True)
+    if q_exp is None or not layers_data: return [no_update]*3
+    wl = float(wavelength_val or 1.54)
+    start = time.perf_counter()
+    initial_layers = layers_data
+    i_exp = np.where(raw_intensity <= 0, 1e-10, raw_intensity)
+    instrument = Instrument.from_dict(instrument_data)
+
+    # 진행 중인 피팅 결과는 최대 4 Hz 로만 전달, 곡선은 웹 프로세스에서 표시 q-grid 로만 계산 (show_fit_progress)
+    limiter = RateLimiter(max_rate_hz=4.0)
+
+    def status(text):
+        set_progress([text, None])
+
+    def report(info):
+        if not limiter.ready():
+            return
+        set_progress([f"Status: Fitting ▶ iter {info['iteration']}, cost {info['cost']:.4g}",
+                      {"data": xrr_store_data, "layers": info['layers']}])
+
+    fit_options = fit_options or []
+    fit_kwargs = dict(
+        instrument=instrument, errors=errors, weighting=weighting or "log",
+        mask_critical="mask_critical" in fit_options, reject_outliers="outliers" in fit_options,
+    )
+    with job_slot(on_wait=lambda: status("Status: Queued ⏳")):
+        bounds = None
+        if "warm" in fit_options:
+            # AI 예측 (없으면 새로 실행) + FFT 두께 -> 사용자 행에 시작값 / 좁힌 bounds (Fix / Link / ×N 유지)
+            status("Status: Warm start 🤖")
+            ai_layers = ai_params or run_ai_prediction(q_exp, raw_intensity, wl)
+            layers_data, bounds = warm_start(q_exp, i_exp, ai_layers, layers_data)
+
+        if "global" in fit_options:
+            status("Status: Global search ▶")
+            candidates = run_global_fit(layers_data, q_exp, raw_intensity, wl, workers=WORKERS_PER_JOB, bounds=bounds,
+                                        **fit_kwargs)
+            # 최적 후보에서 로컬 피팅을 한 번 더 (이미 수렴했으므로 짧음) -> χ² / 불확도 계산
+            layers_data = candidates[0]["layers"] if candidates else layers_data
+
+        status("Status: Fitting ▶")
+        # 같은 (데이터, 스택, 설정) 이면 캐시된 결과, "cache_warm" 이면 시작값만 바뀐 경우 캐시된 해에서 시작
+        fitted_layers, info = cached_fit(
+            layers_data, q_exp, raw_intensity, wl, full_output=True, progress_callback=report, bounds=bounds,
+            warm_start="cache_warm" in fit_options, **fit_kwargs
+        )
+    # 캐시에서 그대로 꺼낸 결과는 이미 기록된 피팅이므로 다시 기록하지 않음
+    if info.get("cache") != "hit":
+        _record_session(filename, xrr_store_data, wl, initial_layers, fitted_layers, info,
+                        time.perf_counter() - start, dict(fit_kwargs, options=fit_options, errors=errors is not None))
+    return fitted_layers, True, _fit_report(fitted_layers, info)
+
+def _record_session(filename, data_key, wavelength, initial_layers, fitted_layers, info, wall_time, settings):
+    """피팅 세션을 DB 에 기록 (실패해도 피팅 결과는 그대로 반환)"""
+    settings["instrument"] = settings["instrument"].to_dict()
+    try:
+        session_db.record_fit(sample=filename, source="app", data_hash=data_key, wavelength=wavelength,
+                              initial_layers=initial_layers, final_layers=fitted_layers, info=info,
+                              wall_time_s=wall_time, settings=settings)
+    except Exception as e:
+        print(f"Session DB error: {e}")
+
+_SYMBOLS = {"thickness": "d", "sld": "ρ", "roughness": "σ"}
+
+def _fit_report(layers, info):
+    """피팅 결과 -> 사이드바 χ² / 파라미터 불확도 표시"""
+    if not info.get("success") and not np.isfinite(info.get("redchi", np.nan)):
+        return f"χ²: - ({info.get('message', 'failed')})"
+    lines = [html.Div(
+        f"χ²_red: {info['redchi']:.4g}  (N={info['n_points']}, masked {info['n_masked']}, "
+        f"scale {info['scale']:.3g}, bkg {info['background']:.3g})"
+    )]
+    for layer, errs in zip(layers, info.get("uncertainties", [])):
+        if errs:
+            terms = ", ".join(f"{_SYMBOLS[k]} {float(layer[k]):.3g} ± {v:.2g}" for k, v in errs.items())
+            lines.append(html.Div(f"{layer.get('layer', '-')}: {terms}"))
+    return lines
 
 # 4. 3D View Update
 @callback(
@@ -136,75 +330,211 @@ def update_layers_table(*args):
     Input("btn-view-iso", "n_clicks"),
     prevent_initial_call=False
 )
+@instrumented
 def update_3d_view(layers_data, *args):
     view = "iso"
     if ctx.triggered_id == "btn-view-top": view = "top"
     elif ctx.triggered_id == "btn-view-side": view = "side"
     return generate_film_stack_figure(layers_data or INITIAL_LAYERS, view)
 
-# 5. 통합 그래프 업데이트 (스케일링 적용)
-@callback(
-    [Output("reflectivity-graph", "figure"),
-     Output("residual-graph", "figure"),
-     Output("fourier-graph", "figure"),
-     Output("final-params-table", "data")],
-    [Input("layers-table", "data"),       
-     Input("xrr-data-store", "data"),
-     Input("input-wavelength", "value"),
-     Input("ai-param-store", "data"),
-     Input("ai-results-table", "data"),
-     Input("fit-status-store", "data")]
-)
-def update_graphs_and_results(layers_manual, uploaded_data, wavelength, ai_params, right_panel_data, is_fitted):
-    
-    # 1. Exp Data Prep & Scaling Factor 계산
-    if not uploaded_data:
-        # 데이터가 없을 때: Mock 데이터로 스케일 1.0 설정
-        q_exp = np.linspace(0.01, 0.5, 500)
-        scale_factor = 1.0 
-        
-        # 빈 그래프 리턴 (깔끔하게)
-        empty_fig = go.Figure()
-        empty_fig.update_layout(template="plotly_white", xaxis={'visible':False}, yaxis={'visible':False})
-        return empty_fig, empty_fig, empty_fig, []
+# 5. 그래프 업데이트 (그래프별로 분리: 각 그래프는 자신이 의존하는 입력에서만 다시 계산)
+def _empty_figure():
+    fig = go.Figure()
+    fig.update_layout(template="plotly_white", xaxis={'visible':False}, yaxis={'visible':False})
+    return fig
+
+# 데이터 키 -> 표시용 배열 (최근 8 개), 없는 키는 저장하지 않음 (다시 업로드되면 바로 보이도록)
+_display_cache = OrderedDict()
+_display_lock = threading.Lock()
+
+def _display_data(data_key):
+    """
+    데이터 키 -> 표시용 배열 (키는 content hash 라서 같은 키면 내용도 같음)
+    Returns:
+        (q_exp, i_exp, q_disp, i_disp, i_raw_disp) / 데이터가 없으면 None
+        i_raw_disp: 0 처리 전 강도 (scale / background 를 풀 때 사용, <= 0 인 점은 제외됨)
+    """
+    with _display_lock:
+        if data_key in _display_cache:
+            _display_cache.move_to_end(data_key)
+            return _display_cache[data_key]
+    q_exp, raw_intensity = load_dataset(data_key)
+    if q_exp is None:
+        return None
+    # Log용 0 처리
+    i_exp = np.where(raw_intensity <= 0, 1e-10, raw_intensity)
+    # 표시용 q-grid (decimation) - 곡선 시뮬레이션도 표시 포인트에서만 수행
+    idx = display_indices(i_exp)
+    result = q_exp, i_exp, q_exp[idx], i_exp[idx], raw_intensity[idx]
+    with _display_lock:
+        _display_cache[data_key] = result
+        if len(_display_cache) > 8:
+            _display_cache.popitem(last=False)
+    return result
+
+def _display(data_key):
+    return _display_data(data_key) if isinstance(data_key, str) else None
+
+def _model_intensity(q, layers, instrument, i_ref):
+    """레이어 -> 실험 데이터와 비교할 강도 (분해능 / footprint 적용, scale / background 는 i_ref 에 맞춰 풂)"""
+    instrument = Instrument.from_dict(instrument)
+    return instrument.intensity(calculate_xrr_curve(q, layers, instrument), i_ref)
+
+def _data_changed():
+    """
+    초기 호출이거나 이번 라운드에 xrr-data-store 가 바뀌었으면 True (전체 figure 를 보내야 함).
+    업로드 / 복원 때는 여러 입력이 같은 라운드에 바뀌고 triggered_id 는 그중 첫 번째뿐이므로 전체 목록을 봅니다.
+    """
+    return not ctx.triggered or "xrr-data-store.data" in ctx.triggered_prop_ids
+
+def _fit_layers(right_panel_data, is_fitted):
+    if is_fitted and right_panel_data and not any(str(r.get('thickness')) == '?' for r in right_panel_data):
+        return right_panel_data
+    return None
+
+# 5-a. 메인 그래프 (Exp / AI / Fit)
+@callback(
+    Output("reflectivity-graph", "figure"),
+    Input("xrr-data-store", "data"),
+    Input("ai-param-store", "data"),
+    Input("ai-results-table", "data"),
+    Input("fit-status-store", "data"),
+    Input("instrument-store", "data")
+)
+@instrumented
+def update_reflectivity_graph(uploaded_data, ai_params, right_panel_data, is_fitted, instrument):
+    data = _display(uploaded_data)
+    if data is None:
+        return _empty_figure()
+    _, _, q_disp, i_disp, i_raw = data
+
+    # 0~1로 정규화된 시뮬레이션 (+ 분해능 / footprint) -> 데이터에 맞춘 scale / background
+    i_ai = _model_intensity(q_disp, ai_params, instrument, i_raw) if ai_params else None
+    fit_layers = _fit_layers(right_panel_data, is_fitted)
+    i_fit = _model_intensity(q_disp, fit_layers, instrument, i_raw) if fit_layers else None
+
+    # 데이터가 바뀌었을 때만 전체 figure, 나머지는 바뀐 trace 만 Patch 로 전송
+    if _data_changed():
+        return create_comparison_graph(q_disp, i_disp, i_ai, i_fit)
+
+    fig_main = Patch()
+    for trace, curve in ((TRACE_AI, i_ai), (TRACE_FIT, i_fit)):
+        fig_main["data"][trace]["visible"] = curve is not None
+        if curve is not None:
+            fig_main["data"][trace]["y"] = curve
+    return fig_main
+
+# 5-a'. 피팅 진행 중 곡선 / 결과 테이블 (run_fit_job 의 progress payload 하나로 함께 갱신)
+@callback(
+    Output("reflectivity-graph", "figure", allow_duplicate=True),
+    Output("final-params-table", "data", allow_duplicate=True),
+    Input("fit-progress-store", "data"),
+    State("xrr-data-store", "data"),
+    State("instrument-store", "data"),
+    prevent_initial_call=True
+)
+@instrumented
+def show_fit_progress(progress, uploaded_data, instrument):
+    # 피팅 중에 다른 데이터가 올라왔으면 이전 데이터의 곡선은 버림
+    if not progress or progress.get("data") != uploaded_data:
+        return no_update, no_update
+    data = _display(uploaded_data)
+    if data is None:
+        return no_update, no_update
+    _, _, q_disp, _, i_raw = data
+
+    fig_main = Patch()
+    fig_main["data"][TRACE_FIT]["visible"] = True
+    fig_main["data"][TRACE_FIT]["y"] = _model_intensity(q_disp, progress["layers"], instrument, i_raw)
+    return fig_main, format_table_data(progress["layers"])
+
+# 5-b. Residual 대상 선택 (Fit > AI > Manual), 대상이 바뀔 때만 store 갱신
+@callback(
+    Output("residual-target-store", "data"),
+    Input("layers-table", "data"),
+    Input("ai-param-store", "data"),
+    Input("ai-results-table", "data"),
+    Input("fit-status-store", "data"),
+    State("residual-target-store", "data")
+)
+@instrumented
+def select_residual_target(layers_manual, ai_params, right_panel_data, is_fitted, current):
+    fit_layers = _fit_layers(right_panel_data, is_fitted)
+    if fit_layers:
+        target = {"label": "Resid (Fit)", "layers": fit_layers}
+    elif ai_params:
+        target = {"label": "Resid (AI)", "layers": ai_params}
     else:
-        df = pd.DataFrame(uploaded_data)
-        q_exp = df['q'].values
-        # 원본 Intensity
-        raw_intensity = df['intensity'].values
-        # Log용 0 처리
-        i_exp = np.where(raw_intensity <= 0, 1e-10, raw_intensity)
-        
-        # 🔥 [중요] 스케일 팩터 = 실험 데이터의 최대값
-        scale_factor = np.max(i_exp) if len(i_exp) > 0 else 1.0
-
-    # 2. Curve Calculation (Normalize -> Multiply by Scale Factor)
-    
-    # (A) AI Curve
-    i_ai = None
-    if ai_params:
-         # 0~1로 정규화된 시뮬레이션 * 실험데이터 최대값
-         i_ai = calculate_xrr_curve(q_exp, ai_params) * scale_factor
-
-    # (B) Fit Curve
-    i_fit = None
-    if is_fitted and right_panel_data:
-        valid = not any(str(r.get('thickness')) == '?' for r in right_panel_data)
-        if valid:
-            i_fit = calculate_xrr_curve(q_exp, right_panel_data) * scale_factor
-
-    # (C) Manual Curve (Residual Fallback용)
-    i_man = calculate_xrr_curve(q_exp, layers_manual) * scale_factor
-
-    # 3. Graph Generation
-    fig_main = create_comparison_graph(q_exp, i_exp, i_ai, i_fit)
-    
-    target_sim = i_fit if i_fit is not None else (i_ai if i_ai is not None else i_man)
-    label_resid = "Resid (Fit)" if i_fit is not None else ("Resid (AI)" if i_ai is not None else "Resid (Manual)")
-    
-    fig_resid = create_residual_graph(q_exp, i_exp, target_sim, label_resid)
-    fig_fft = create_fft_graph(q_exp, i_exp)
-    
-    table_data = format_table_data(layers_manual)
-
-    return fig_main, fig_resid, fig_fft, table_data
\ No newline at end of file
+        target = {"label": "Resid (Manual)", "layers": layers_manual or []}
+
+    if current and current.get("label") == target["label"] \
+            and layers_key(current.get("layers") or []) == layers_key(target["layers"]):
+        return no_update
+    return target
+
+# 5-c. Residual 그래프
+@callback(
+    Output("residual-graph", "figure"),
+    Input("xrr-data-store", "data"),
+    Input("residual-target-store", "data"),
+    Input("instrument-store", "data")
+)
+@instrumented
+def update_residual_graph(uploaded_data, target, instrument):
+    data = _display(uploaded_data)
+    if data is None or not target:
+        return _empty_figure()
+    _, _, q_disp, i_disp, i_raw = data
+
+    target_sim = _model_intensity(q_disp, target["layers"], instrument, i_raw)
+    if _data_changed():
+        return create_residual_graph(q_disp, i_disp, target_sim, target["label"])
+
+    fig_resid = Patch()
+    fig_resid["data"][0]["y"] = residual_trace(q_disp, i_disp, target_sim)[1]
+    fig_resid["data"][0]["name"] = target["label"]
+    return fig_resid
+
+# 5-d. FFT 그래프 (데이터가 바뀔 때만)
+@callback(
+    Output("fourier-graph", "figure"),
+    Input("xrr-data-store", "data")
+)
+@instrumented
+def update_fft_graph(uploaded_data):
+    data = _display(uploaded_data)
+    if data is None:
+        return _empty_figure()
+    q_exp, i_exp = data[0], data[1]
+    return create_fft_graph(q_exp, i_exp)
+
+# 5-e. 결과 테이블
+@callback(
+    Output("final-params-table", "data"),
+    Input("layers-table", "data")
+)
+@instrumented
+def update_final_table(layers_manual):
+    return format_table_data(layers_manual)
+
+# 5-f. CSV export (현재 데이터의 피팅 이력, 없으면 현재 결과 테이블)
+@callback(
+    Output("download-fits", "data"),
+    Input("btn-export", "n_clicks"),
+    State("xrr-data-store", "data"),
+    State("final-params-table", "data"),
+    prevent_initial_call=True
+)
+@instrumented
+def export_csv(n_clicks, xrr_store_data, final_table):
+    rows = []
+    if xrr_store_data:
+        try:
+            rows = session_db.export_rows(data_hash=xrr_store_data)
+        except Exception as e:
+            print(f"Session DB error: {e}")
+    if not rows:
+        rows = final_table
+    if not rows:
+        return no_update
+    return dcc.send_data_frame(pd.DataFrame(rows).to_csv, "xrr_fits.csv", index=False)
@@ -1,5 +1,8 @@
+import numpy as np
 import plotly.graph_objects as go
 
+from app.logic.layers import LayerStack
+
 def generate_film_stack_figure(layers_data, view_angle="iso"):
     """
     Plotly Mesh3d를 사용하여 박막 적층 구조를 3D로 시각화합니다.
@@ -17,38 +20,28 @@ def generate_film_stack_figure(layers_data, view_angle="iso"):
     }
 
     z_current = 0
+    stack = LayerStack.from_table(layers_data)
+    # 기판(∞)은 20, 값이 없는 레이어(?)는 10 으로 표시
+    thicknesses = np.where(np.isinf(stack.thickness), 20.0, np.nan_to_num(stack.thickness, nan=10.0))
     
     # 바닥부터 쌓기 위해 역순 처리 혹은 인덱스 조정 (여기선 순서대로 쌓음)
-    for layer in reversed(layers_data):
-        name = layer["layer"].split()[0]
-        try:
-            thickness = float(layer["thickness"]) if layer["thickness"] != "∞" else 20.0
-        except (ValueError, TypeError):
-            thickness = 10.0
-
+    # 반복 블록은 한 주기만 그리고, 나머지 (N-1) 주기는 반투명 상자 하나로 표시
+    rows = list(range(len(stack)))[::-1]
+    for pos, row in enumerate(rows):
+        name = (stack.names[row].split() or ["-"])[0]
+        thickness = float(thicknesses[row])
         color = colors.get(name, colors["default"])
-        
-        # 육면체 생성 (x, y: -5~5)
-        x = [-5, -5, 5, 5, -5, -5, 5, 5]
-        y = [-5, 5, 5, -5, -5, 5, 5, -5]
-        z = [z_current, z_current, z_current, z_current, 
-             z_current + thickness, z_current + thickness, z_current + thickness, z_current + thickness]
-        
-        # Mesh3d의 i, j, k 인덱스 (육면체의 12개 삼각형 면)
-        fig.add_trace(go.Mesh3d(
-            x=x, y=y, z=z,
-            i=[7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2],
-            j=[3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3],
-            k=[0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6],
-            color=color,
-            opacity=0.9,
-            name=f"{name} ({thickness}nm)",
-            flatshading=True,
-            showscale=False
-        ))
-        
+        _add_box(fig, z_current, thickness, color, f"{name} ({thickness}nm)")
         z_current += thickness
 
+        block = stack.block[row]
+        if block >= 0 and (pos + 1 == len(rows) or stack.block[rows[pos + 1]] != block):
+            count = int(stack.repeat[row])
+            period = float(thicknesses[stack.block == block].sum())
+            height = period * (count - 1)
+            _add_box(fig, z_current, height, colors["default"], f"×{count} ({period:.1f}nm / period)", opacity=0.35)
+            z_current += height
+
     # 카메라 시점 설정
     camera = dict(eye=dict(x=1.5, y=1.5, z=1.5))
     if view_angle == "top":
@@ -69,4 +62,24 @@ def generate_film_stack_figure(layers_data, view_angle="iso"):
         plot_bgcolor='rgba(0,0,0,0)',
         showlegend=False
     )
-    return fig
\ No newline at end of file
+    return fig
+
+
+def _add_box(fig, z0, height, color, name, opacity=0.9):
+    """z0 ~ z0 + height 육면체 (x, y: -5~5)"""
+    x = [-5, -5, 5, 5, -5, -5, 5, 5]
+    y = [-5, 5, 5, -5, -5, 5, 5, -5]
+    z = [z0] * 4 + [z0 + height] * 4
+
+    # Mesh3d의 i, j, k 인덱스 (육면체의 12개 삼각형 면)
+    fig.add_trace(go.Mesh3d(
+        x=x, y=y, z=z,
+        i=[7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2],
+        j=[3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3],
+        k=[0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6],
+        color=color,
+        opacity=opacity,
+        name=name,
+        flatshading=True,
+        showscale=False
+    ))
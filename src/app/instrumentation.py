@@ -0,0 +1,353 @@
+"""
+계측.
+- Callback: 어떤 입력이 어떤 callback 을 실행시켰는지, 몇 개의 출력을 갱신했는지(fan-out),
+  얼마나 걸렸는지를 로그로 남깁니다.
+- metrics: 파싱 / 시뮬레이션 / 피팅 / AI / callback 의 타이머, 카운터, 값 (nfev, payload 크기 등).
+  background job 프로세스의 값도 공유 저장소 (diskcache) 로 모아서 서버의 /metrics 에서 봅니다.
+- install(server): /metrics 엔드포인트 (XRR_METRICS=1 일 때만), 요청별 payload 크기, (선택) 요청별 cProfile 덤프
+"""
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from dash import ctx, no_update
+
+logger = logging.getLogger("xrr.callbacks")
+
+# callback 이름 -> {"calls", "total_ms", "max_ms", "outputs_updated"}
+callback_stats = defaultdict(lambda: {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "outputs_updated": 0})
+
+# XRR_PROFILE=1 이면 모든 요청, 아니면 쉼표로 구분한 출력 id 일부 (예: "reflectivity-graph,ai-results-table")
+PROFILE = os.environ.get("XRR_PROFILE", "")
+PROFILE_DIR = os.environ.get("XRR_PROFILE_DIR", os.path.join(".cache", "profiles"))
+# PROFILE_DIR 에 남기는 .prof 최대 수 (오래된 것부터 삭제)
+PROFILE_KEEP = int(os.environ.get("XRR_PROFILE_KEEP", 50))
+# /metrics 와 요청별 프로파일 (?profile=1, X-Profile 헤더) 을 켜는 설정.
+# remote_addr 는 reverse proxy 뒤에서 항상 로컬이므로 접속 주소로 판단하지 않음
+METRICS_ENDPOINT = os.environ.get("XRR_METRICS", "") == "1"
+# 서버 프로세스는 FLUSH_SECONDS 초 또는 FLUSH_EVENTS 개 기록마다 공유 저장소에 씀 (요청마다 SQLite 쓰기 방지)
+FLUSH_SECONDS = float(os.environ.get("XRR_METRICS_FLUSH_S", 5))
+FLUSH_EVENTS = int(os.environ.get("XRR_METRICS_FLUSH_EVENTS", 500))
+_STORE_KEY = "xrr-metrics"
+
+
+class Metrics:
+    """
+    프로세스 로컬 타이머 / 카운터 / 값 집계.
+    timers: 이름 -> [count, total_ms, max_ms], counters: 이름 -> n,
+    values: 이름 -> [count, sum, max, last] (nfev, payload bytes 처럼 크기가 의미 있는 값)
+    bind(store) 로 공유 저장소를 연결하면 flush() 때 로컬 값을 합쳐 넣고 비웁니다.
+    maybe_flush(): FLUSH_SECONDS / FLUSH_EVENTS 마다 flush,
+    job 프로세스 (job_process=True) 는 callback 하나 실행 후 종료되므로 매번 flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.store = None
+        self.job_process = False
+        self._clear()
+
+    def _clear(self):
+        self._pid = os.getpid()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._timers = defaultdict(lambda: [0, 0.0, 0.0])
+        self._counters = defaultdict(int)
+        self._values = defaultdict(lambda: [0, 0.0, float("-inf"), 0.0])
+
+    def _check_fork(self):
+        # fork 된 job 프로세스는 부모의 (아직 flush 안 된) 값을 물려받으므로 버리고 시작
+        if self._pid != os.getpid():
+            self._clear()
+
+    def bind(self, store):
+        self.store = store
+
+    # --- 기록 ---
+    def add_time(self, name, ms):
+        with self._lock:
+            self._check_fork()
+            self._pending += 1
+            t = self._timers[name]
+            t[0] += 1
+            t[1] += ms
+            t[2] = max(t[2], ms)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._check_fork()
+            self._pending += 1
+            self._counters[name] += n
+
+    def observe(self, name, value):
+        with self._lock:
+            self._check_fork()
+            self._pending += 1
+            v = self._values[name]
+            v[0] += 1
+            v[1] += value
+            v[2] = max(v[2], value)
+            v[3] = value
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, (time.perf_counter() - start) * 1e3)
+
+    def timed(self, name):
+        """함수 데코레이터 버전의 timer"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # --- 조회 / 공유 ---
+    def _take(self):
+        with self._lock:
+            self._check_fork()
+            local = {"timers": dict(self._timers), "counters": dict(self._counters), "values": dict(self._values)}
+            self._clear()
+        return local
+
+    def flush(self):
+        """로컬 값을 공유 저장소에 합치고 비움 (저장소가 없으면 아무것도 안 함)"""
+        if self.store is None:
+            return
+        local = self._take()
+        if not any(local.values()):
+            return
+        try:
+            with self.store.transact():
+                self.store.set(_STORE_KEY, _merge(self.store.get(_STORE_KEY) or _empty(), local))
+        except Exception as e:
+            logger.warning("metrics flush failed: %s", e)
+
+    def maybe_flush(self):
+        """주기가 됐으면 flush (job 프로세스는 항상)"""
+        if self.store is None:
+            return
+        if not self.job_process:
+            with self._lock:
+                due = (self._pending >= FLUSH_EVENTS
+                       or time.monotonic() - self._last_flush >= FLUSH_SECONDS)
+            if not due:
+                return
+        self.flush()
+
+    def collect(self):
+        """전체 집계 (공유 저장소가 있으면 모든 프로세스, 없으면 이 프로세스)"""
+        if self.store is None:
+            with self._lock:
+                self._check_fork()
+                return _merge(_empty(), {"timers": dict(self._timers), "counters": dict(self._counters),
+                                         "values": dict(self._values)})
+        self.flush()
+        return self.store.get(_STORE_KEY) or _empty()
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+        if self.store is not None:
+            self.store.delete(_STORE_KEY)
+
+
+def _empty():
+    return {"timers": {}, "counters": {}, "values": {}}
+
+
+def _merge(total, local):
+    for name, (n, ms, mx) in local["timers"].items():
+        t = total["timers"].setdefault(name, [0, 0.0, 0.0])
+        total["timers"][name] = [t[0] + n, t[1] + ms, max(t[2], mx)]
+    for name, n in local["counters"].items():
+        total["counters"][name] = total["counters"].get(name, 0) + n
+    for name, (n, s, mx, last) in local["values"].items():
+        v = total["values"].setdefault(name, [0, 0.0, float("-inf"), 0.0])
+        total["values"][name] = [v[0] + n, v[1] + s, max(v[2], mx), last]
+    return total
+
+
+metrics = Metrics()
+
+
+def report(data=None):
+    """집계 -> 읽기 쉬운 dict (평균 포함)"""
+    data = data or metrics.collect()
+    return {
+        "timers": {k: {"count": n, "total_ms": round(ms, 3), "mean_ms": round(ms / n, 3) if n else 0.0,
+                       "max_ms": round(mx, 3)} for k, (n, ms, mx) in sorted(data["timers"].items())},
+        "counters": dict(sorted(data["counters"].items())),
+        "values": {k: {"count": n, "mean": s / n if n else 0.0, "max": mx, "last": last}
+                   for k, (n, s, mx, last) in sorted(data["values"].items())},
+    }
+
+
+def _count_updates(result):
+    values = result if isinstance(result, (list, tuple)) else [result]
+    return sum(v is not no_update for v in values), len(values)
+
+
+def instrumented(func):
+    """@callback 아래에 붙여서 사용: 트리거 / fan-out / 실행 시간 기록"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            trigger = ", ".join(t["prop_id"] for t in ctx.triggered) or "initial"
+        except Exception:
+            trigger = "-"
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1e3
+            metrics.add_time(f"callback.{func.__name__}", elapsed_ms)
+
+        updated, total = _count_updates(result)
+        stats = callback_stats[func.__name__]
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["outputs_updated"] += updated
+        metrics.count(f"callback.{func.__name__}.outputs_updated", updated)
+        metrics.maybe_flush()
+        logger.info("⏱ %s ← %s | %.1f ms | fan-out %d/%d", func.__name__, trigger, elapsed_ms, updated, total)
+        return result
+    return wrapper
+
+
+# --- Flask ---
+def _dash_outputs(request):
+    """/_dash-update-component 요청 -> 출력 id 리스트 ("graph.figure", ...)"""
+    try:
+        output = (request.get_json(silent=True) or {}).get("output", "")
+    except Exception:
+        return []
+    if not output:
+        return []
+    # 여러 출력은 "..a.data...b.figure.." 형태
+    return [o for o in output.strip(".").split("...") if o] if output.startswith("..") else [output]
+
+
+def _should_profile(request):
+    # 요청으로 켜는 프로파일은 XRR_METRICS=1 일 때만 (XRR_PROFILE 은 서버 설정이므로 모든 요청)
+    if METRICS_ENDPOINT and (request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"):
+        return True
+    if not PROFILE:
+        return False
+    if PROFILE == "1":
+        return True
+    outputs = " ".join(_dash_outputs(request))
+    return any(part and part in outputs for part in PROFILE.split(","))
+
+
+# 프로세스당 프로파일러는 하나만 켤 수 있으므로 (Python 3.12+) 동시에 하나의 요청만 프로파일
+_profile_lock = threading.Lock()
+
+
+def _start_profile():
+    """프로파일러 시작 -> Profile, 이미 다른 요청 / 도구가 프로파일 중이면 None (건너뜀)"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 다른 프로파일링 도구가 이미 켜져 있음
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _stop_profile(profiler):
+    try:
+        profiler.disable()
+    finally:
+        _profile_lock.release()
+
+
+def _rotate_profiles(directory, keep=PROFILE_KEEP):
+    files = sorted(directory.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+    for path in files[:max(0, len(files) - keep)]:
+        path.unlink(missing_ok=True)
+
+
+def install(server):
+    """
+    Flask server 에 계측 연결.
+    - GET /metrics: 전체 집계 JSON (XRR_METRICS=1 일 때만, 아니면 404. ?reset=1 이면 조회 후 초기화)
+    - 모든 요청의 처리 시간, Dash 출력별 응답 (직렬화된 figure 등) 크기
+    - XRR_PROFILE / ?profile=1 / X-Profile 헤더 (XRR_METRICS=1 일 때만): 요청별 cProfile 을 XRR_PROFILE_DIR 에 .prof 로 저장
+      (동시에 하나만, 최근 XRR_PROFILE_KEEP 개만 유지)
+    - 값은 주기적으로 공유 저장소에 flush, 워커 종료 시 남은 값도 flush
+    """
+    from flask import Response, abort, g, request
+
+    atexit.register(metrics.flush)
+
+    @server.route("/metrics")
+    def metrics_endpoint():
+        if not METRICS_ENDPOINT:
+            abort(404)
+        data = report()
+        from app.logic.utils import simulation_cache
+        data["simulation_cache"] = simulation_cache.info()
+        data["callbacks"] = {k: dict(v) for k, v in callback_stats.items()}
+        data["pid"] = os.getpid()
+        if request.args.get("reset") == "1":
+            metrics.reset()
+        return Response(json.dumps(data, indent=2, ensure_ascii=False, default=float), mimetype="application/json")
+
+    @server.before_request
+    def _start():
+        g.metrics_start = time.perf_counter()
+        g.profiler = _start_profile() if _should_profile(request) else None
+
+    @server.after_request
+    def _finish(response):
+        elapsed_ms = (time.perf_counter() - g.get("metrics_start", time.perf_counter())) * 1e3
+        endpoint = request.path.strip("/") or "index"
+        metrics.add_time(f"http.{endpoint}", elapsed_ms)
+
+        if request.path.endswith("_dash-update-component") and not response.direct_passthrough:
+            # callback 하나의 응답 (직렬화된 figure / Patch / 테이블 등) 크기
+            outputs = _dash_outputs(request)
+            if outputs:
+                metrics.observe(f"payload_bytes.{'+'.join(outputs)}", len(response.get_data()))
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            _stop_profile(profiler)
+            directory = Path(PROFILE_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            label = re.sub(r"[^\w.-]+", "_", "_".join(_dash_outputs(request)) or endpoint)[:80]
+            path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{label}.prof"
+            profiler.dump_stats(path)
+            _rotate_profiles(directory)
+            if METRICS_ENDPOINT:
+                response.headers["X-Profile-File"] = path.name
+        metrics.maybe_flush()
+        return response
+
+    @server.teardown_request
+    def _cleanup(exc):
+        # 처리되지 않은 예외로 after_request 를 건너뛴 경우에도 프로파일러 / 잠금 해제
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            _stop_profile(profiler)
+
+    return server
@@ -0,0 +1,65 @@
+"""
+Background job 설정 (AI Guess / Fitting).
+Dash background callback 은 diskcache + 별도 프로세스에서 실행되므로
+Flask worker 가 긴 피팅 때문에 막히지 않습니다.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import diskcache
+import psutil
+from dash import DiskcacheManager
+
+from app.instrumentation import metrics
+from app.logic.ai_interface import bind_store
+
+CACHE_DIR = os.environ.get("XRR_CACHE_DIR", os.path.join(".cache", "jobs"))
+# 동시에 실행되는 AI / Fitting job 최대 수
+MAX_CONCURRENT_JOBS = int(os.environ.get("XRR_MAX_JOBS", max(1, (os.cpu_count() or 2) // 2)))
+# job 하나가 쓸 수 있는 워커 프로세스 수 (global fit 등), 동시 job 전체가 코어 수를 넘지 않도록
+WORKERS_PER_JOB = max(1, (os.cpu_count() or 1) // MAX_CONCURRENT_JOBS)
+
+job_cache = diskcache.Cache(CACHE_DIR)
+background_callback_manager = DiskcacheManager(job_cache)
+# background job 프로세스의 계측 값도 서버의 /metrics 에서 보이도록 같은 저장소에 모음
+metrics.bind(job_cache)
+# AI Guess 결과도 job 프로세스 사이에서 공유 (같은 업로드로 다시 누르면 backend 를 부르지 않음)
+bind_store(job_cache)
+
+_SLOT_KEY = "job-slot-{}"
+
+
+def _try_acquire(pid):
+    for i in range(MAX_CONCURRENT_JOBS):
+        key = _SLOT_KEY.format(i)
+        if job_cache.add(key, pid):
+            return key
+        # 취소(kill)된 job 이 남긴 슬롯은 회수
+        with job_cache.transact():
+            holder = job_cache.get(key)
+            if holder is not None and not psutil.pid_exists(holder):
+                job_cache.set(key, pid)
+                return key
+    return None
+
+
+@contextmanager
+def job_slot(on_wait=None, poll_interval=0.5):
+    """
+    동시 실행 job 수를 MAX_CONCURRENT_JOBS 로 제한하는 슬롯.
+    슬롯이 빌 때까지 기다리는 동안 on_wait() 를 호출합니다 (대기 상태 표시용).
+    """
+    # 이 프로세스는 job 하나만 실행하고 끝나므로 계측 값을 callback 마다 바로 flush
+    metrics.job_process = True
+    pid = os.getpid()
+    key = _try_acquire(pid)
+    while key is None:
+        if on_wait:
+            on_wait()
+        time.sleep(poll_interval)
+        key = _try_acquire(pid)
+    try:
+        yield
+    finally:
+        job_cache.delete(key)
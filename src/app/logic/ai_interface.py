@@ -1,24 +1,126 @@
-from reflecto_backend.api import ai_guess
+import hashlib
+import os
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
-def run_ai_prediction(tths: np.ndarray, refl: np.ndarray, wavelen: float):
+from app.instrumentation import metrics
+
+
+# 공유 저장소 (diskcache) 의 예측 결과 보관 기간 (초)
+RESULT_TTL = 30 * 24 * 3600
+
+
+class AISession:
     """
-    [사용자 정의 함수]
-    외부에 있는 AI 예측 코드를 여기에 연결합니다.
-    
-    Args:
-        tths (list or np.array): q값 배열
-        refl (list or np.array): Reflectivity(Intensity) 배열
-        wavelength (float): 빔 파장 (Angstrom)
-        
-    Returns:
-        list of dict: Dash DataTable에 들어갈 구조 리스트
+    [AI Model Session]
+    프로세스당 한 번 backend 를 import 해서 계속 재사용합니다.
+    같은 곡선 + 파장에 대한 예측 결과는 메모리 LRU 와 (bind 된 경우) 공유 저장소에 캐시합니다.
+    AI Guess 는 background job (요청마다 새 프로세스) 으로 실행되므로 메모리 LRU 는 job 사이에 남지 않고,
+    공유 저장소 (jobs.job_cache) 가 서버 / 모든 job 프로세스 사이의 캐시입니다.
     """
-    
-    print(f"🤖 AI Prediction Start... (WL: {wavelen}Å)")
 
-    film_params, sio2_param = ai_guess(tths, refl, wavelen)
+    def __init__(self, max_results=256, store=None):
+        self._ai_guess = None
+        self._results = OrderedDict()
+        self.max_results = max_results
+        self.store = store
+
+    @property
+    def ai_guess(self):
+        if self._ai_guess is None:
+            from reflecto_backend.api import ai_guess
+            self._ai_guess = ai_guess
+        return self._ai_guess
+
+    def warm_up(self):
+        """backend import (모델 로딩) 를 미리 해 둠"""
+        self.ai_guess
+        return self
+
+    @staticmethod
+    def _digest(*arrays):
+        h = hashlib.blake2b(digest_size=16)
+        for a in arrays:
+            h.update(np.ascontiguousarray(a, dtype=float).tobytes())
+        return h.hexdigest()
 
+    def _cached(self, key):
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if self.store is not None:
+            try:
+                layers = self.store.get(f"ai-guess:{key}")
+            except Exception as e:
+                print(f"AI cache read error: {e}")
+                return None
+            if layers is not None:
+                self._remember(key, layers)
+            return layers
+        return None
+
+    def _remember(self, key, layers):
+        self._results[key] = layers
+        if len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def predict(self, q, refl, wavelen):
+        """곡선 하나 -> DataTable 레이어 리스트 (backend 에는 입력을 그대로 넘김)"""
+        q = np.asarray(q, dtype=float)
+        refl = np.asarray(refl, dtype=float)
+        key = self._digest(q, refl, [wavelen])
+        layers = self._cached(key)
+        if layers is not None:
+            metrics.count("ai_guess.cache_hits")
+            return [dict(L) for L in layers]
+
+        ai_guess = self.ai_guess
+        with metrics.timer("ai_guess"):
+            film_params, sio2_param = ai_guess(q, refl, wavelen)
+        layers = _to_layers(film_params, sio2_param)
+
+        self._remember(key, layers)
+        if self.store is not None:
+            try:
+                self.store.set(f"ai-guess:{key}", layers, expire=RESULT_TTL)
+            except Exception as e:
+                print(f"AI cache write error: {e}")
+        return [dict(L) for L in layers]
+
+
+_session = None
+_store = None
+
+
+def bind_store(store):
+    """예측 결과를 프로세스 사이에 공유할 저장소 (diskcache.Cache) 연결"""
+    global _store
+    _store = store
+    if _session is not None:
+        _session.store = store
+
+
+def get_session():
+    """현재 프로세스의 AISession (처음 호출 시 생성)"""
+    global _session
+    if _session is None:
+        _session = AISession(store=_store)
+    return _session
+
+
+def _warm_worker():
+    get_session().warm_up()
+
+
+def _predict_chunk(chunk):
+    session = get_session()
+    return [session.predict(q, refl, wl) for q, refl, wl in chunk]
+
+
+def _to_layers(film_params, sio2_param):
     predicted_layers = [
         {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
         {"layer": "SiO₂", "thickness": sio2_param.thickness, "sld": sio2_param.sld, "roughness": sio2_param.roughness},
@@ -30,5 +132,85 @@ def run_ai_prediction(tths: np.ndarray, refl: np.ndarray, wavelen: float):
             "sld": param.sld,
             "roughness": param.roughness}
         )
+    return predicted_layers
+
+
+def run_ai_prediction(tths: np.ndarray, refl: np.ndarray, wavelen: float):
+    """
+    [사용자 정의 함수]
+    외부에 있는 AI 예측 코드를 여기에 연결합니다.
+
+    Args:
+        tths (list or np.array): q값 배열
+        refl (list or np.array): Reflectivity(Intensity) 배열
+        wavelength (float): 빔 파장 (Angstrom)
+
+    Returns:
+        list of dict: Dash DataTable에 들어갈 구조 리스트
+    """
+
+    print(f"🤖 AI Prediction Start... (WL: {wavelen}Å)")
+
+    return get_session().predict(tths, refl, wavelen)
+
+
+def run_lookup_prediction(tths: np.ndarray, refl: np.ndarray, wavelen: float, template, k: int = 1,
+                          refine: bool = False):
+    """
+    [Lookup Initializer]
+    AI 대신 템플릿 스택 (알려진 레시피) 의 미리 계산한 곡선 라이브러리에서 가장 가까운 스택을 찾습니다.
+    라이브러리는 (레시피 = 구조 + Fix / Link / Bounds, q 범위) 별로 한 번만 만들어 디스크에 캐시되고,
+    조회는 수십 ms 입니다 (refine=True 이면 상위 후보를 다듬어서 수백 ms).
+    자유 파라미터 범위는 Bounds 컬럼으로 정하고, Bounds 가 없으면 넓은 기본 범위라 결과가 거칩니다.
+
+    Args:
+        tths (list or np.array): q값 배열
+        refl (list or np.array): Reflectivity(Intensity) 배열
+        wavelength (float): 빔 파장 (Angstrom), q 공간 계산이라 사용하지 않음 (run_ai_prediction 과 같은 시그니처)
+        template (list of dict): 레이어 테이블 (구조 / Fix / Link / Bounds 포함)
+        k (int): 돌려줄 후보 수
+        refine (bool): 상위 후보를 배치 pattern search 로 다듬을지
+
+    Returns:
+        list of dict: 가장 가까운 스택 (k > 1 이면 가까운 순서의 레이어 리스트 k 개)
+    """
+    from app.logic.lookup import lookup_candidates, unbounded_parameters
+
+    print(f"📚 Lookup Prediction Start... (k={k})")
+    unbounded = unbounded_parameters(template)
+    if unbounded:
+        print(f"⚠️ No Bounds for {', '.join(unbounded)}: lookup covers wide default ranges, set Bounds for closer matches")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        candidates = [c["layers"] for c in lookup_candidates(template, tths, refl, k, refine=refine)]
+    if k == 1:
+        return candidates[0] if candidates else None
+    return candidates
+
+
+def predict_many(curves, wavelengths, workers=None, chunk_size=64):
+    """
+    [Batched Prediction]
+    여러 곡선을 한 번에 예측합니다.
+
+    Args:
+        curves: [(q, refl), ...]
+        wavelengths: float 하나 또는 곡선별 리스트
+        workers: 1 이면 현재 프로세스에서, 아니면 모델을 미리 올린 워커 프로세스들에서 실행
+
+    Returns:
+        list of (list of dict): 입력 순서대로의 레이어 리스트
+    """
+    if np.isscalar(wavelengths):
+        wavelengths = [wavelengths] * len(curves)
+    jobs = [(q, refl, wl) for (q, refl), wl in zip(curves, wavelengths)]
+    print(f"🤖 AI Batch Prediction Start... ({len(jobs)} curves)")
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= chunk_size:
+        return _predict_chunk(jobs)
 
-    return predicted_layers
\ No newline at end of file
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_warm_worker) as pool:
+        results = pool.map(_predict_chunk, chunks)
+    return [layers for chunk in results for layers in chunk]
@@ -0,0 +1,133 @@
+import numpy as np
+
+from app.logic.layers import LIMITS, LayerStack
+from app.logic.parratt import FIELDS
+
+# bounds 를 좁힐 때 사용하는 상대 폭
+THICKNESS_MARGIN = 0.2
+SLD_MARGIN = 0.5
+
+
+def fft_spectrum(q, i_exp):
+    """
+    R·q⁴ 의 FFT -> (thickness 축 (Å), amplitude).
+    q 간격이 균일하지 않으면 균일 격자로 보간한 뒤 계산합니다.
+    """
+    q = np.asarray(q, dtype=float)
+    i_exp = np.asarray(i_exp, dtype=float)
+    n = len(q)
+    if n > 2 and not np.allclose(np.diff(q), q[1] - q[0], rtol=1e-3):
+        q_uniform = np.linspace(q[0], q[-1], n)
+        i_exp = np.interp(q_uniform, q, i_exp)
+        q = q_uniform
+
+    r_norm = i_exp * (q ** 4)
+    r_norm = r_norm - np.mean(r_norm)
+    d_q = q[1] - q[0] if n > 1 else 0.01
+    fft_amp = np.abs(np.fft.rfft(r_norm))
+    z_space = np.fft.rfftfreq(n, d=d_q) * 2 * np.pi
+    return z_space, fft_amp
+
+
+def fft_thickness_peaks(q, i_exp, n_peaks=3, min_thickness=10.0):
+    """FFT 스펙트럼의 국소 최대값 -> 두께 후보 (amplitude 큰 순서)"""
+    z, amp = fft_spectrum(q, i_exp)
+    if len(z) < 3:
+        return []
+    is_peak = (amp[1:-1] > amp[:-2]) & (amp[1:-1] >= amp[2:]) & (z[1:-1] >= min_thickness)
+    idx = np.nonzero(is_peak)[0] + 1
+    idx = idx[np.argsort(amp[idx])[::-1][:n_peaks]]
+    return [float(z[i]) for i in idx]
+
+
+def _film_rows(layers):
+    return [i for i, L in enumerate(layers) if "Film" in str(L.get("layer", "")) or "SiO" in str(L.get("layer", ""))]
+
+
+def combine_estimates(ai_layers, fft_peaks, tolerance=0.2):
+    """
+    AI 예측 스택과 FFT 두께 후보를 합칩니다.
+    AI 총 두께와 가장 가까운 FFT 피크가 tolerance 이상 다르면
+    Film / SiO₂ 두께를 그 피크에 맞게 비율 조정합니다.
+    """
+    layers = [dict(L) for L in ai_layers]
+    rows = _film_rows(layers)
+    if not rows or not fft_peaks:
+        return layers
+
+    total = sum(float(layers[i]["thickness"]) for i in rows)
+    if total <= 0:
+        return layers
+    peak = min(fft_peaks, key=lambda z: abs(z - total))
+    if abs(peak - total) / total > tolerance:
+        ratio = peak / total
+        for i in rows:
+            layers[i]["thickness"] = float(layers[i]["thickness"]) * ratio
+    return layers
+
+
+def tightened_bounds(layers):
+    """
+    추정값 주변으로 좁힌 파라미터 bounds.
+    Returns:
+        list of dict: layers 와 같은 길이, {key: (lo, hi)}
+    """
+    bounds = []
+    for L in layers:
+        b = {}
+        for key in ("thickness", "sld", "roughness"):
+            try:
+                val = float(L.get(key))
+            except (ValueError, TypeError):
+                continue
+            lo_lim, hi_lim = LIMITS[key]
+            if key == "thickness":
+                margin = max(THICKNESS_MARGIN * val, 10.0)
+            elif key == "sld":
+                margin = max(SLD_MARGIN * val, 0.5)
+            else:
+                margin = max(val, 5.0)
+            b[key] = (max(lo_lim, val - margin), min(hi_lim, val + margin))
+        bounds.append(b)
+    return bounds
+
+
+def merge_estimates(layers, seed, bounds):
+    """
+    추정 스택 (seed, bounds) 의 값 / 좁힌 bounds 만 사용자 테이블 행에 복사합니다.
+    행은 역할로 짝지음: SiO₂ ↔ SiO₂, Film 행은 순서대로.
+    Fix / Link / Bounds / ×N 컬럼은 그대로 두고, 고정 / 링크된 파라미터와 반복 블록 행 (추정값은 한 주기가 아님) 은 건드리지 않습니다.
+    Returns:
+        (layers, bounds): 사용자 테이블과 같은 행 / 길이
+    """
+    stack = LayerStack.from_table(layers)
+    films, sio2, _ = stack.model_rows()
+    seed_films, seed_sio2, _ = LayerStack.from_table(seed).model_rows()
+    pairs = list(zip([row for row in films if stack.block[row] < 0], seed_films))
+    if sio2 is not None and seed_sio2 is not None:
+        pairs.append((sio2, seed_sio2))
+
+    merged = [dict(L) for L in layers]
+    merged_bounds = [{} for _ in layers]
+    for row, src in pairs:
+        for f, key in enumerate(FIELDS):
+            if not stack.free[row, f] or stack.links[row, f]:
+                continue
+            merged[row][key] = seed[src][key]
+            if key in bounds[src]:
+                merged_bounds[row][key] = bounds[src][key]
+    return merged, merged_bounds
+
+
+def warm_start(q, i_exp, ai_layers, layers=None):
+    """
+    [Warm Start]
+    AI 예측 + FFT 두께 추정 -> (시작 레이어, bounds).
+    run_fitting_algorithm(seed, ..., bounds=bounds) 로 바로 넘길 수 있습니다.
+    layers: 사용자 테이블, 주면 추정값만 그 행에 넣고 제약 컬럼은 유지 (merge_estimates)
+    """
+    peaks = fft_thickness_peaks(q, i_exp)
+    seed = combine_estimates(ai_layers, peaks)
+    if layers is not None:
+        return merge_estimates(layers, seed, tightened_bounds(seed))
+    return seed, tightened_bounds(seed)
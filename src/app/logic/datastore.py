@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = os.environ.get("XRR_DATA_DIR", os.path.join(".cache", "datasets"))
+MEMORY_LIMIT_MB = float(os.environ.get("XRR_DATA_MEM_MB", 512))
+DISK_LIMIT_MB = float(os.environ.get("XRR_DATA_DISK_MB", 2048))
+
+
+class DatasetStore:
+    """
+    업로드 데이터 서버측 저장소.
+    데이터는 (n_columns, N) float64 배열 [q, intensity, (dR)] 로 저장되고
+    클라이언트(dcc.Store)에는 content hash 키만 전달됩니다.
+
+    - 메모리: LRU, memory_limit_mb 를 넘으면 오래된 것부터 메모리에서 내림
+    - 디스크: put 시 .npy 로 바로 기록 (background job 프로세스도 같은 키로 읽을 수 있도록),
+      메모리에 없으면 mmap 으로 다시 열어서 복사 없이 반환.
+      disk_limit_mb 를 넘으면 오래 안 쓴 (mtime, get 할 때마다 갱신) 파일부터 삭제.
+      이 프로세스의 메모리 LRU 에 있는 키는 지우지 않음 (웹 프로세스가 들고 있는 데이터를 job 프로세스가 다시 읽으므로)
+    - 디렉토리는 처음 put 할 때 만듭니다 (import 시 부작용 없음)
+    """
+
+    def __init__(self, directory=DATA_DIR, memory_limit_mb=MEMORY_LIMIT_MB, disk_limit_mb=DISK_LIMIT_MB):
+        self.directory = Path(directory)
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.disk_limit = int(disk_limit_mb * 1024 * 1024)
+        self._memory = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / f"{key}.npy"
+
+    @staticmethod
+    def make_key(data):
+        return hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest() + f"-{data.shape[0]}x{data.shape[1]}"
+
+    def put(self, data):
+        """(n_columns, N) 배열 저장 -> 키"""
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        key = self.make_key(data)
+        path = self._path(key)
+        if not path.exists():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp, path)
+            self._remember(key, data)
+            self._evict(keep=path)
+        else:
+            self._touch(path)
+            self._remember(key, data)
+        return key
+
+    def get(self, key):
+        """키 -> 읽기 전용 (n_columns, N) 배열, 없으면 None"""
+        if not key or not isinstance(key, str):
+            return None
+        path = self._path(key)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                data = self._memory[key]
+            else:
+                data = None
+        if data is not None:
+            self._touch(path)
+            return data
+        if not path.exists():
+            return None
+        data = np.load(path, mmap_mode="r").view(np.ndarray)
+        self._touch(path)
+        self._remember(key, data)
+        return data
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _evict(self, keep=None):
+        """
+        디스크 상한 초과 -> 오래 안 쓴 .npy 부터 삭제 (다른 프로세스가 먼저 지운 파일은 건너뜀).
+        메모리 LRU 에 있는 키는 클라이언트가 아직 쓰는 데이터이므로 남겨 둡니다.
+        """
+        with self._lock:
+            in_memory = {self._path(key) for key in self._memory}
+        files = []
+        for path in self.directory.glob("*.npy"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_limit:
+                break
+            if path == keep or path in in_memory:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _remember(self, key, data):
+        data.setflags(write=False)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._nbytes += data.nbytes
+            # 메모리 상한 초과 -> 디스크 (mmap) 로 내림
+            while self._nbytes > self.memory_limit and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._nbytes -= old.nbytes
+
+
+dataset_store = DatasetStore()
+
+
+def load_dataset(key, errors=False):
+    """
+    dcc.Store 키 -> (q, intensity) 뷰, 데이터가 없으면 (None, None)
+    errors=True 이면 (q, intensity, dR) - dR 컬럼이 없으면 dR 은 None
+    """
+    data = dataset_store.get(key)
+    if data is None:
+        if isinstance(key, str) and key:
+            print(f"⚠️ Dataset {key} is no longer stored (disk limit), upload the file again")
+        return (None, None, None) if errors else (None, None)
+    if errors:
+        return data[0], data[1], data[2] if len(data) > 2 else None
+    return data[0], data[1]
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+
+import diskcache
+import numpy as np
+
+from app.logic.fitting import run_fitting_algorithm
+from app.logic.instrument import Instrument
+from app.logic.layers import LayerStack
+
+FIT_CACHE_DIR = os.environ.get("XRR_FIT_CACHE_DIR", os.path.join(".cache", "fits"))
+FIT_CACHE_MB = float(os.environ.get("XRR_FIT_CACHE_MB", 256))
+# 피팅 엔진 / 키 형식이 바뀌면 올려서 이전 결과를 무효화
+CACHE_VERSION = 1
+# 같은 문제 (시작값만 다름) 당 기억하는 해 수
+MAX_SOLUTIONS = 8
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(np.ascontiguousarray(part, dtype=float).tobytes())
+        elif isinstance(part, (bytes, str)):
+            h.update(part.encode() if isinstance(part, str) else part)
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=float).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def fit_keys(stack, n_rows, q, I, wavelength, errors=None, instrument=None, weighting="log", mask_critical=False,
+             reject_outliers=False):
+    """
+    CompiledStack + 데이터 + 설정 -> (문제 키, 정확한 키).
+    문제 키: 시작값을 뺀 모든 것 (데이터, 고정값 / 구조 / 링크 / 범위 / 반복, 파장, 엔진 설정)
+    정확한 키: 문제 키 + 시작 파라미터 벡터 p0
+    테이블 표기 ("10" vs 10.0, 표시용 컬럼) 는 컴파일된 스택에 남지 않으므로 키에 영향을 주지 않습니다.
+    n_rows / param_map (테이블 행 위치) 는 행별 불확도가 같은 행에 붙도록 키에 포함합니다.
+    """
+    values = stack.values.copy().reshape(-1)
+    values[stack.param_index] = np.nan
+    settings = {
+        "version": CACHE_VERSION,
+        "wavelength": float(wavelength),
+        "instrument": Instrument.from_dict(instrument).to_dict(),
+        "weighting": weighting,
+        "mask_critical": bool(mask_critical),
+        "reject_outliers": bool(reject_outliers),
+        "errors": errors is not None,
+        "repeats": [list(r) for r in stack.repeats],
+        "rows": [n_rows, [list(m) for m in stack.param_map]],
+    }
+    problem = _digest(
+        np.asarray(q, dtype=float), np.asarray(I, dtype=float),
+        np.asarray(errors, dtype=float) if errors is not None else b"",
+        values, stack.param_index.astype(float), stack.tie.astype(float),
+        np.asarray(stack.bounds[0], dtype=float), np.asarray(stack.bounds[1], dtype=float), settings,
+    )
+    return problem, _digest(problem, np.asarray(stack.p0, dtype=float))
+
+
+class FitCache:
+    """
+    [Fit Result Cache]
+    (데이터, 정규화된 스택, 파장, 엔진 설정) -> 피팅 결과 content-addressed 캐시 (diskcache).
+    - "fit:<정확한 키>": (해 벡터 x, info) -> 같은 입력이면 다시 피팅하지 않음
+    - "solutions:<문제 키>": [{"p0", "x", "cost"}] -> 시작값만 바뀐 경우 가장 가까운 해에서 warm start
+    크기 제한을 넘으면 오래 안 쓴 항목부터 지웁니다 (size_limit, LRU).
+    """
+
+    def __init__(self, directory=FIT_CACHE_DIR, size_limit_mb=FIT_CACHE_MB):
+        self.directory = directory
+        self.size_limit = int(size_limit_mb * 1024 * 1024)
+        self._cache = None
+
+    @property
+    def cache(self):
+        # 처음 쓸 때 열기 (import 만으로 디렉토리를 만들지 않도록)
+        if self._cache is None:
+            self._cache = diskcache.Cache(self.directory, size_limit=self.size_limit,
+                                          eviction_policy="least-recently-used")
+        return self._cache
+
+    def get(self, exact_key):
+        return self.cache.get(f"fit:{exact_key}")
+
+    def nearest(self, problem_key, p0, bounds):
+        """시작값 p0 와 가장 가까운 (범위 폭으로 정규화한 거리) 저장된 해, 없으면 None"""
+        solutions = self.cache.get(f"solutions:{problem_key}")
+        if not solutions:
+            return None
+        width = np.maximum(np.asarray(bounds[1]) - np.asarray(bounds[0]), 1e-12)
+        width = np.where(np.isfinite(width), width, np.maximum(np.abs(p0), 1.0))
+        return min(solutions, key=lambda s: float(np.sum(((s["p0"] - p0) / width) ** 2)))
+
+    def put(self, problem_key, exact_key, p0, x, info):
+        cache = self.cache
+        cache.set(f"fit:{exact_key}", (np.asarray(x, dtype=float), info))
+        with cache.transact():
+            solutions = [s for s in cache.get(f"solutions:{problem_key}", []) if not np.array_equal(s["p0"], p0)]
+            solutions.append({"p0": np.asarray(p0, dtype=float), "x": np.asarray(x, dtype=float),
+                              "cost": info["cost"]})
+            cache.set(f"solutions:{problem_key}", solutions[-MAX_SOLUTIONS:])
+
+    def clear(self):
+        self.cache.clear()
+
+    def info(self):
+        return {"size_bytes": self.cache.volume(), "entries": len(self.cache), "size_limit": self.size_limit}
+
+
+fit_cache = FitCache()
+
+
+def cached_fit(current_layers, q_exp, I_exp, wavelength, full_output=False, progress_callback=None, bounds=None,
+               instrument=None, errors=None, weighting="log", mask_critical=False, reject_outliers=False,
+               warm_start=False, cache=None):
+    """
+    run_fitting_algorithm 과 같은 인자 / 반환값, 결과는 fit_cache 에 저장.
+    - 같은 (데이터, 스택, 시작값, 설정) 이면 저장된 해를 바로 반환 (info["cache"] = "hit")
+    - warm_start=True 이고 시작값만 다른 저장된 해가 있으면 가장 가까운 해에서 피팅 (info["cache"] = "warm")
+    - 아니면 그대로 피팅 (info["cache"] = "miss"), 실패한 피팅은 저장하지 않습니다.
+    """
+    cache = cache or fit_cache
+    fit_kwargs = dict(bounds=bounds, instrument=instrument, errors=errors, weighting=weighting,
+                      mask_critical=mask_critical, reject_outliers=reject_outliers)
+    model_stack = LayerStack.from_table(current_layers)
+    if isinstance(current_layers, LayerStack):
+        current_layers = model_stack.to_table()
+    stack = model_stack.compile(bounds)
+    if stack is None or stack.p0.size == 0:
+        return run_fitting_algorithm(current_layers, q_exp, I_exp, wavelength, full_output, progress_callback,
+                                     **fit_kwargs)
+
+    try:
+        problem_key, exact_key = fit_keys(stack, len(current_layers), q_exp, I_exp, wavelength, errors, instrument,
+                                          weighting, mask_critical, reject_outliers)
+        hit = cache.get(exact_key)
+    except Exception as e:
+        print(f"Fit cache error: {e}")
+        return run_fitting_algorithm(current_layers, q_exp, I_exp, wavelength, full_output, progress_callback,
+                                     **fit_kwargs)
+
+    if hit is not None:
+        print("⚡ Fit cache hit")
+        x, info = hit
+        return _cached_result(stack.to_layers(x, current_layers), dict(info, cache="hit"), full_output)
+
+    status, start_layers = "miss", current_layers
+    if warm_start:
+        nearest = cache.nearest(problem_key, stack.p0, stack.bounds)
+        if nearest is not None:
+            print("⚡ Warm start from cached solution")
+            status, start_layers = "warm", stack.to_layers(nearest["x"], current_layers)
+
+    fitted, info = run_fitting_algorithm(start_layers, q_exp, I_exp, wavelength, True, progress_callback,
+                                         **fit_kwargs)
+    info = dict(info, cache=status)
+    if info["success"]:
+        try:
+            # 해 벡터 = 같은 bounds 로 컴파일한 결과 스택의 p0
+            x = LayerStack.from_table(fitted).compile(bounds).p0
+            cache.put(problem_key, exact_key, stack.p0, x, info)
+        except Exception as e:
+            print(f"Fit cache error: {e}")
+    return _cached_result(fitted, info, full_output)
+
+
+def _cached_result(layers, info, full_output):
+    return (layers, info) if full_output else layers
@@ -1,100 +1,280 @@
 import numpy as np
+from scipy.ndimage import median_filter
 from scipy.optimize import least_squares
-from reflecto.simulate.simul_genx import param2refl, ParamSet
+from reflecto.simulate.simul_genx import param2refl
 
-def run_fitting_algorithm(current_layers, q_exp, I_exp, wavelength):
+from app.instrumentation import metrics
+from app.logic.instrument import Instrument
+from app.logic.layers import LayerStack
+from app.logic.parratt import SLD_UNIT
+from app.logic.utils import stack_paramsets
+
+# 잔차 가중치 모드
+WEIGHTINGS = ("log", "linear", "q4")
+
+def run_fitting_algorithm(current_layers, q_exp, I_exp, wavelength, full_output=False, progress_callback=None,
+                          bounds=None, instrument=None, errors=None, weighting="log", mask_critical=False,
+                          reject_outliers=False):
     """
     [Fitting Engine]
     현재 레이어 파라미터를 초기값으로 하여 최적화를 수행합니다.
+    full_output=True 이면 (fitted_layers, info) 를 반환합니다.
+    info: success, cost, nfev, njev(= iteration 수), message, scale, background,
+        chi2, redchi, n_points, n_masked, uncertainties (행별 {key: 표준오차}, fit_statistics 참고)
+    progress_callback: iteration 마다 {"iteration", "cost", "x", "layers"} dict 로 호출됩니다.
+        x 는 현재 파라미터 벡터, layers 는 그 값을 반영한 테이블 dict 리스트입니다.
+    bounds: 레이어별 {key: (lo, hi)} 리스트 (analysis.warm_start 참고), 없으면 기본 범위
+        테이블의 Fix / Link / Bounds 컬럼이 먼저 적용되고, 최적화기는 축소된 파라미터 벡터만 봅니다.
+    instrument: Instrument (또는 dict), 분해능 / footprint / scale / background 를 모델에 포함
+        scale / background 는 고정하지 않으면 매 평가마다 닫힌 형태로 풉니다 (max(I_exp) 정규화 대신).
+    errors: dR 배열 (로더의 세 번째 컬럼), weighting: "log" / "linear" / "q4" (make_residuals 참고)
+    mask_critical: 임계각 아래 점을 피팅에서 제외 (fit_mask 참고)
+    reject_outliers: 피팅 후 잔차로 이상치를 골라 (outlier_mask) 빼고 그 해에서 다시 피팅
     """
     print("🚀 Starting Fitting Process...")
 
-    # [수정] 실험 데이터의 스케일 팩터 계산 (Max Value)
-    scale_factor = np.max(I_exp) if len(I_exp) > 0 else 1.0
-
-    # 1. 파라미터 추출 (Dict -> Flat Array)
-    p0 = []
-    bounds_min = []
-    bounds_max = []
-    param_map = [] 
-
-    for i, layer in enumerate(current_layers):
-        # (1) Thickness (기판 제외)
-        if layer["thickness"] != "∞":
-            val = float(layer.get("thickness", 10))
-            p0.append(val)
-            param_map.append((i, "thickness"))
-            bounds_min.append(0.0)
-            bounds_max.append(5000.0)
-
-        # (2) SLD (Density 대신 SLD 사용)
-        val_s = float(layer.get("sld", 2.0))
-        p0.append(val_s)
-        param_map.append((i, "sld"))
-        bounds_min.append(0.0)
-        bounds_max.append(50.0) 
-
-        # (3) Roughness
-        val_r = float(layer.get("roughness", 0.3))
-        p0.append(val_r)
-        param_map.append((i, "roughness"))
-        bounds_min.append(0.0)
-        bounds_max.append(50.0)
-
-    # 2. Cost Function 정의
+    # 1. 레이어 스택 컴파일 (Dict -> Array, 한 번만)
+    model_stack = LayerStack.from_table(current_layers)
+    if isinstance(current_layers, LayerStack):
+        current_layers = model_stack.to_table()
+    stack = model_stack.compile(bounds)
+    if stack is None:
+        print("❌ Fitting Failed: Film / SiO₂ 레이어가 필요합니다.")
+        return _result(current_layers, _failed_info("Film / SiO₂ layers required"), full_output)
+    if stack.p0.size == 0:
+        print("❌ Fitting Failed: 자유 파라미터가 없습니다 (모두 Fix).")
+        return _result(current_layers, _failed_info("No free parameters"), full_output)
+    print(f"   free parameters: {stack.p0.size} (slots: {stack.param_index.size})")
+
+    # 2. Cost Function 정의 (dict 복사 없이 배열 커널 직접 호출), 제외된 점은 시뮬레이션하지 않음
+    q_exp, I_exp = np.asarray(q_exp, dtype=float), np.asarray(I_exp, dtype=float)
+    mask = fit_mask(q_exp, I_exp, model_stack, weighting, mask_critical)
+    errors = np.asarray(errors, dtype=float)[mask] if errors is not None else None
+    model = make_residuals(stack, q_exp[mask], I_exp[mask], instrument, errors, weighting)
+    limit = _batch_limit(stack, model.q_calc)
+    state = {"iteration": 0, "cost": float("nan")}
+
     def residuals(p):
-        # (A) 파라미터 복원
-        temp_layers = [L.copy() for L in current_layers]
-        for idx, val in enumerate(p):
-            layer_idx, key = param_map[idx]
-            temp_layers[layer_idx][key] = val
-
-        # (B) 시뮬레이션 계산 (Normalized 0~1)
-        I_sim_norm = calculate_xrr_simulation(q_exp, temp_layers)
-        
-        # [수정] 스케일 적용 (Normalized * Scale Factor)
-        I_sim_scaled = I_sim_norm * scale_factor
-        
-        # (C) 잔차 계산 (Log scale)
-        diff = np.log10(np.abs(I_exp) + 1e-10) - np.log10(np.abs(I_sim_scaled) + 1e-10)
+        with metrics.timer("fit.residuals"):
+            diff = model(p)
+        if diff.ndim == 1:
+            state["cost"] = 0.5 * float(diff @ diff)
         return diff
 
+    # TRF 는 iteration 마다 Jacobian 을 한 번 계산하므로 여기서 진행 상황을 보고
+    def jacobian(p):
+        state["iteration"] += 1
+        metrics.count("fit.iterations")
+        if progress_callback:
+            progress_callback(dict(state, x=np.array(p), layers=stack.to_layers(p, current_layers)))
+        return batched_jacobian(residuals, p, stack.bounds, batch_limit=limit)
+
+    def solve(x0):
+        with metrics.timer("fit.least_squares"):
+            return least_squares(residuals, x0, jac=jacobian, bounds=stack.bounds, method='trf', ftol=1e-3)
+
     # 3. 최적화 실행
     try:
-        res = least_squares(residuals, p0, bounds=(bounds_min, bounds_max), method='trf', ftol=1e-3)
-        
+        res = solve(stack.p0)
+        if reject_outliers:
+            # 피팅된 모델 기준 잔차로 이상치를 고르고, 있으면 빼고 그 해에서 다시 피팅
+            keep = outlier_mask(q_exp[mask], model(res.x), weighting, errors)
+            if not keep.all():
+                print(f"   rejecting {int((~keep).sum())} outliers, refitting...")
+                mask[np.flatnonzero(mask)[~keep]] = False
+                errors = errors[keep] if errors is not None else None
+                model = make_residuals(stack, q_exp[mask], I_exp[mask], instrument, errors, weighting)
+                limit = _batch_limit(stack, model.q_calc)
+                first = res
+                res = solve(first.x)
+                res.nfev += first.nfev
+                res.njev = (res.njev or 0) + (first.njev or 0)
+        metrics.observe("fit.nfev", res.nfev)
+        metrics.observe("fit.njev", res.njev or 0)
+
         # 4. 결과 적용
-        fitted_layers = [L.copy() for L in current_layers]
-        for idx, val in enumerate(res.x):
-            layer_idx, key = param_map[idx]
-            fitted_layers[layer_idx][key] = float(val) # float 변환
+        fitted_layers = stack.to_layers(res.x, current_layers)
+        scale, background = model.scale_background(res.x)
 
         print("✅ Fitting Complete!")
-        return fitted_layers
+        info = {
+            "success": bool(res.success),
+            "cost": float(res.cost),
+            "nfev": int(res.nfev),
+            "njev": int(res.njev or 0),
+            "message": res.message,
+            "scale": scale,
+            "background": background,
+            "n_points": int(mask.sum()),
+            "n_masked": int((~mask).sum()),
+        }
+        info.update(fit_statistics(model, res.x, res.jac, stack, len(current_layers)))
+        print(f"   χ²_red = {info['redchi']:.4g} ({info['n_points']} points, {info['n_masked']} masked)")
+        return _result(fitted_layers, info, full_output)
     except Exception as e:
         print(f"❌ Fitting Failed: {e}")
-        return current_layers
+        return _result(current_layers, _failed_info(str(e)), full_output)
+
+def make_residuals(stack, q_exp, I_exp, instrument=None, errors=None, weighting="log"):
+    """
+    가중 잔차 함수를 만듭니다.
+    p: (P,) 또는 (B, P) 배치 -> (M,) 또는 (B, M)
+    weighting:
+      "log"    : log10(I) - log10(I_sim), dR 이 있으면 σ_log = dR / (I ln10) 로 나눔
+      "linear" : (I - I_sim) / σ, σ = dR (없으면 √I 계수 통계)
+      "q4"     : (I - I_sim) q⁴ / σ_q4, σ_q4 = dR q⁴ (없으면 median(I q⁴)) -> Fresnel 감쇠를 보정한 선형 잔차
+    scale / background 는 Instrument 에서 고정하지 않았으면 매 평가마다 같은 가중치로 닫힌 형태로 풀리므로
+    (variable projection) 비선형 최적화는 레이어 파라미터만 탐색합니다. 반환된 함수의 속성:
+      q_calc: 실제로 시뮬레이션하는 q-grid (분해능 커널의 oversampled grid 또는 q_exp)
+      scale_background(p): p 에서의 (scale, background)
+    """
+    q_exp = np.asarray(q_exp, dtype=float)
+    I_exp = np.asarray(I_exp, dtype=float)
+    instrument = Instrument.from_dict(instrument)
+    kernel = instrument.kernel(q_exp) if not instrument.is_ideal else None
+    q_calc = kernel.q_calc if kernel is not None else q_exp
+    sigma = _valid_errors(errors)
+
+    if weighting == "linear":
+        sigma = sigma if sigma is not None else np.sqrt(np.maximum(np.abs(I_exp), 1e-300))
+        weights = 1.0 / sigma ** 2
+        def weigh(I_sim):
+            return (I_exp - I_sim) / sigma
+    elif weighting == "q4":
+        q4 = q_exp ** 4
+        sigma = sigma * q4 if sigma is not None else np.full_like(q_exp, np.median(np.abs(I_exp) * q4) or 1.0)
+        weights = (q4 / sigma) ** 2
+        def weigh(I_sim):
+            return (I_exp - I_sim) * q4 / sigma
+    else:
+        log_I_exp = np.log10(np.abs(I_exp) + 1e-10)
+        sigma_log = sigma / (np.maximum(np.abs(I_exp), 1e-300) * np.log(10.0)) if sigma is not None else 1.0
+        weights = 1.0 / sigma ** 2 if sigma is not None else None
+        def weigh(I_sim):
+            return (log_I_exp - np.log10(np.abs(I_sim) + 1e-10)) / sigma_log
+
+    def measured(p):
+        R = stack.reflectivity(q_calc, p)
+        return kernel.apply(R) if kernel is not None else R
+
+    def residuals(p):
+        return weigh(instrument.intensity(measured(p), I_exp, weights))
+
+    def scale_background(p):
+        scale, background = instrument.scale_background(measured(p), I_exp, weights)
+        return float(scale), float(background)
+
+    residuals.q_calc = q_calc
+    residuals.scale_background = scale_background
+    return residuals
+
+def _valid_errors(errors):
+    """dR 배열 정리: 0 이하 / nan 은 양수 dR 의 중앙값으로, 쓸 수 있는 값이 없으면 None"""
+    if errors is None:
+        return None
+    errors = np.asarray(errors, dtype=float)
+    good = np.isfinite(errors) & (errors > 0)
+    if not good.any():
+        return None
+    return np.where(good, errors, np.median(errors[good]))
+
+def fit_mask(q_exp, I_exp, layers=None, weighting="log", mask_critical=False):
+    """
+    피팅에 쓸 점 (bool 마스크).
+    - 항상: q / I 가 유한하지 않은 점, log 가중치에서는 I <= 0 인 점 제외
+    - mask_critical: 스택에서 가장 큰 SLD 의 임계 q (q_c = 4√(π·SLD)) 아래 (전반사 영역) 제외
+    이상치는 데이터만으로는 fringe 최소점과 구분할 수 없으므로 모델 잔차로 따로 고릅니다 (outlier_mask).
+    """
+    q_exp = np.asarray(q_exp, dtype=float)
+    I_exp = np.asarray(I_exp, dtype=float)
+    mask = np.isfinite(q_exp) & np.isfinite(I_exp)
+    if weighting == "log":
+        mask &= I_exp > 0
+
+    if mask_critical and layers is not None:
+        sld = LayerStack.from_table(layers).sld
+        sld = sld[np.isfinite(sld)]
+        if sld.size and sld.max() > 0:
+            mask &= q_exp > 4.0 * np.sqrt(np.pi * SLD_UNIT * sld.max())
+
+    # 남는 점이 없으면 마스크를 쓰지 않음
+    return mask if mask.any() else np.isfinite(q_exp) & np.isfinite(I_exp)
+
+def outlier_mask(q, residuals, weighting="log", errors=None, threshold=5.0, window=45, min_mad=0.01):
+    """
+    현재 모델의 잔차 -> 남길 점 (bool 마스크).
+    잔차가 q 순서 이동 중앙값에서 threshold·(이동 MAD) 이상 벗어난 점을 이상치로 봅니다.
+    잔차에는 fringe 가 없으므로 fringe 최소점을 이상치로 보지 않습니다.
+    MAD 하한: dR / √I 로 정규화한 잔차는 1, 아니면 min_mad (log 가중치에서는 dex)
+    -> 모델이 거의 정확히 맞는 무노이즈 데이터에서는 아무 점도 빼지 않음
+    """
+    r = np.asarray(residuals, dtype=float)
+    order = np.argsort(np.asarray(q, dtype=float), kind="stable")
+    size = min(window, r.size)
+    dev = np.empty_like(r)
+    dev[order] = r[order] - median_filter(r[order], size=size, mode="nearest")
+    # 노이즈 크기는 q 에 따라 크게 달라지므로 MAD 도 이동 구간에서 계산
+    mad = np.empty_like(r)
+    mad[order] = 1.4826 * median_filter(np.abs(dev[order]), size=size, mode="nearest")
+    floor = 1.0 if weighting == "linear" or _valid_errors(errors) is not None else min_mad
+    return np.abs(dev) <= threshold * np.maximum(mad, floor)
+
+def fit_statistics(residuals, x, jac, stack, n_rows):
+    """
+    최적해에서의 χ² / 축소 χ² / 파라미터 표준오차.
+    공분산 = (JᵀJ)⁻¹ · χ²_red (특이값 분해로 계산, 작은 특이값은 버림)
+    uncertainties: 테이블 행별 {key: 표준오차} (링크된 슬롯은 같은 값, 고정 파라미터는 없음)
+    """
+    r = residuals(x)
+    n, p = r.size, x.size
+    chi2 = float(r @ r)
+    redchi = chi2 / max(n - p, 1)
+
+    stderr = np.full(p, np.nan)
+    if jac is not None and p:
+        _, sv, vt = np.linalg.svd(np.asarray(jac, dtype=float), full_matrices=False)
+        keep = sv > np.finfo(float).eps * max(np.shape(jac)) * (sv[0] if sv.size else 0.0)
+        cov = (vt[keep].T / sv[keep] ** 2) @ vt[keep] * redchi
+        stderr = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+
+    uncertainties = [{} for _ in range(n_rows)]
+    for k, (row, key) in zip(stack.tie, stack.param_map):
+        uncertainties[row][key] = float(stderr[k])
+    return {"chi2": chi2, "redchi": float(redchi), "stderr": stderr.tolist(), "uncertainties": uncertainties}
+
+def _failed_info(message):
+    return {"success": False, "cost": float("nan"), "nfev": 0, "njev": 0, "message": message,
+            "scale": float("nan"), "background": float("nan"), "chi2": float("nan"), "redchi": float("nan"),
+            "n_points": 0, "n_masked": 0, "stderr": [], "uncertainties": []}
+
+def _result(layers, info, full_output):
+    return (layers, info) if full_output else layers
+
+def batched_jacobian(fun, p, bounds, rel_step=1.5e-8, batch_limit=None):
+    """
+    [Batched Jacobian]
+    전진 차분 Jacobian. 모든 섭동 파라미터 세트를 (P+1, P) 배치로 묶어
+    fun 을 한 번(또는 batch_limit 단위 몇 번)만 호출합니다.
+    상한 경계에 붙어 있는 파라미터는 반대 방향으로 섭동합니다.
+    """
+    p = np.asarray(p, dtype=float)
+    lo, hi = bounds
+    h = rel_step * np.maximum(1.0, np.abs(p))
+    h = np.where(p + h > hi, -h, h)
+
+    batch = np.vstack([p, p + np.diag(h)])
+    step = batch_limit or len(batch)
+    f = np.vstack([fun(batch[i:i + step]) for i in range(0, len(batch), step)])
+    return ((f[1:] - f[0]) / h[:, None]).T
+
+def _batch_limit(stack, q, max_elements=4_000_000):
+    """커널 중간 배열 (B x N x M complex) 이 너무 커지지 않도록 배치 크기 제한"""
+    return max(1, max_elements // (stack.n_layers * len(q)))
 
 def calculate_xrr_simulation(q, layers):
-    # utils의 함수와 비슷하지만, fitting 내부에서 빠르게 돌기 위해 재정의하거나 import해서 사용
-    # 여기서는 직접 구현
-    params = []
-    sio2_param = None
-    
-    for layer in layers:
-        try:
-            t = float(layer.get("thickness", 0)) if str(layer.get("thickness")) not in ["∞", "?"] else 0
-            r = float(layer.get("roughness", 0))
-            s = float(layer.get("sld", 0))
-            
-            name = layer.get("layer", "")
-            if "Film" in name:
-                params.append(ParamSet(t, r, s))
-            elif "SiO" in name:
-                sio2_param = ParamSet(t, r, s)
-        except: continue
-
-    if not params or sio2_param is None:
+    """param2refl 시뮬레이션 (0~1 Normalized), layers 는 dict 리스트 또는 LayerStack"""
+    params = stack_paramsets(LayerStack.from_table(layers))
+    if params is None:
         return np.zeros_like(q)
-        
-    return param2refl(q, params, sio2_param)
\ No newline at end of file
+    with metrics.timer("param2refl"):
+        return param2refl(q, *params)
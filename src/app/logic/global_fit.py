@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.stats import qmc
+
+from app.logic.fitting import make_residuals, batched_jacobian, fit_mask, outlier_mask, _batch_limit
+from app.logic.instrument import Instrument
+from app.logic.layers import compile_stack
+
+
+def sample_starts(stack, n_starts, seed=0):
+    """Sobol 샘플로 bounds 전체에서 시작점 생성 (첫 번째는 현재 테이블 값)"""
+    lo, hi = stack.bounds
+    sampler = qmc.Sobol(d=len(lo), scramble=True, seed=seed)
+    m = int(np.ceil(np.log2(max(n_starts - 1, 1))))
+    starts = qmc.scale(sampler.random_base2(m)[:n_starts - 1], lo, hi)
+    return np.vstack([stack.p0, starts])
+
+
+def _local_fit(layers, bounds, q_exp, I_exp, x0, max_nfev, ftol, instrument=None, errors=None, weighting="log"):
+    """워커 프로세스: x0 에서 TRF 로컬 최적화"""
+    stack = compile_stack(layers, bounds)
+    residuals = make_residuals(stack, q_exp, I_exp, instrument, errors, weighting)
+    limit = _batch_limit(stack, residuals.q_calc)
+    res = least_squares(
+        residuals, x0, jac=lambda p: batched_jacobian(residuals, p, stack.bounds, batch_limit=limit),
+        bounds=stack.bounds, method='trf', ftol=ftol, max_nfev=max_nfev
+    )
+    return res.x, float(res.cost), int(res.nfev)
+
+
+def run_global_fit(current_layers, q_exp, I_exp, wavelength, n_starts=64, top_k=5,
+                   keep_fraction=0.25, probe_nfev=15, workers=None, seed=0, bounds=None, instrument=None,
+                   errors=None, weighting="log", mask_critical=False, reject_outliers=False):
+    """
+    [Global Fitting Engine]
+    Sobol multi-start + 단계별 pruning:
+      1) 모든 시작점의 초기 cost 를 한 번의 배치 커널 호출로 계산, 상위 keep_fraction 만 남김
+      2) 남은 시작점을 워커 프로세스에서 짧게(probe_nfev) 최적화, 상위 절반만 남김
+      3) 살아남은 후보를 끝까지 최적화
+    workers: 워커 프로세스 수, 없으면 jobs.WORKERS_PER_JOB (코어 수 / 동시 job 수)
+    bounds: run_fitting_algorithm 과 같은 레이어별 {key: (lo, hi)} 리스트
+    instrument, errors, weighting, mask_critical: run_fitting_algorithm 과 같음
+    reject_outliers: 가장 좋은 해의 잔차로 이상치를 골라 (outlier_mask) 빼고 최종 후보를 다시 최적화
+    Returns:
+        list of dict: cost 오름차순 top_k 개 {"layers", "cost", "x", "nfev"}
+    """
+    print(f"🚀 Starting Global Fit ({n_starts} starts)...")
+    stack = compile_stack(current_layers, bounds)
+    if stack is None or stack.p0.size == 0:
+        print("❌ Fitting Failed: Film / SiO₂ 레이어와 자유 파라미터가 필요합니다.")
+        return []
+
+    starts = sample_starts(stack, n_starts, seed)
+    instrument = Instrument.from_dict(instrument)
+    q_exp, I_exp = np.asarray(q_exp, dtype=float), np.asarray(I_exp, dtype=float)
+    mask = fit_mask(q_exp, I_exp, current_layers, weighting, mask_critical)
+    q_exp, I_exp = q_exp[mask], I_exp[mask]
+    errors = np.asarray(errors, dtype=float)[mask] if errors is not None else None
+    residuals = make_residuals(stack, q_exp, I_exp, instrument, errors, weighting)
+    limit = _batch_limit(stack, residuals.q_calc)
+    r0 = np.vstack([residuals(starts[i:i + limit]) for i in range(0, len(starts), limit)])
+    cost0 = 0.5 * np.einsum('ij,ij->i', r0, r0)
+
+    n_keep = max(top_k, int(np.ceil(len(starts) * keep_fraction)))
+    survivors = starts[np.argsort(cost0)[:n_keep]]
+
+    if workers is None:
+        # job_slot 으로 MAX_CONCURRENT_JOBS 개의 job 이 동시에 돌 수 있으므로 코어를 나눠 씀
+        from app.jobs import WORKERS_PER_JOB
+        workers = WORKERS_PER_JOB
+    with ProcessPoolExecutor(max_workers=min(workers, len(survivors))) as pool:
+        def run_stage(candidates, max_nfev, ftol):
+            futures = [pool.submit(_local_fit, current_layers, bounds, q_exp, I_exp, x0, max_nfev, ftol, instrument,
+                                   errors, weighting) for x0 in candidates]
+            return [f.result() for f in futures]
+
+        probes = run_stage(survivors, probe_nfev, 1e-3)
+        probes.sort(key=lambda r: r[1])
+        n_final = max(top_k, len(probes) // 2)
+        finals = run_stage([x for x, _, _ in probes[:n_final]], None, 1e-6)
+
+        if reject_outliers:
+            finals.sort(key=lambda r: r[1])
+            keep = outlier_mask(q_exp, residuals(finals[0][0]), weighting, errors)
+            if not keep.all():
+                print(f"   rejecting {int((~keep).sum())} outliers, refining top {top_k}...")
+                q_exp, I_exp = q_exp[keep], I_exp[keep]
+                errors = errors[keep] if errors is not None else None
+                nfev = [n for _, _, n in finals[:top_k]]
+                finals = run_stage([x for x, _, _ in finals[:top_k]], None, 1e-6)
+                finals = [(x, cost, n + n0) for (x, cost, n), n0 in zip(finals, nfev)]
+
+    finals.sort(key=lambda r: r[1])
+    results = [
+        {"layers": stack.to_layers(x, current_layers), "cost": cost, "x": x, "nfev": nfev}
+        for x, cost, nfev in finals[:top_k]
+    ]
+    print(f"✅ Global Fit Complete! best cost = {results[0]['cost']:.4g}")
+    return results
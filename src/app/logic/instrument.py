@@ -0,0 +1,233 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from scipy.special import erf
+
+# FWHM -> 가우시안 σ
+FWHM_TO_SIGMA = 1.0 / (2.0 * np.sqrt(2.0 * np.log(2.0)))
+# 가우시안 커널을 자르는 범위 (±σ 배수)
+KERNEL_WIDTH = 4.0
+
+RESOLUTION_MODES = ("none", "dq/q", "dtheta")
+
+
+class Instrument:
+    """
+    [Instrument Model]
+    이상적인 반사율 곡선 -> 실제 측정 강도.
+    - 분해능: dq/q 일정 ("dq/q", resolution = FWHM 비율) 또는 dθ 일정 ("dtheta", resolution = FWHM 각도 °)
+    - footprint / beam overfill: 가우시안 빔 (beam_width = FWHM mm) 이 길이 sample_length (mm) 시료에 걸리는 비율
+    - scale / background: I = scale · footprint · (R ⊗ 분해능) + background
+      None 이면 피팅 파라미터로 취급해서 매 평가마다 닫힌 형태로 풉니다 (project_scale_background).
+    """
+    __slots__ = ("mode", "resolution", "wavelength", "sample_length", "beam_width", "scale", "background", "oversample")
+
+    def __init__(self, mode="none", resolution=0.0, wavelength=1.5406, sample_length=None, beam_width=None,
+                 scale=None, background=None, oversample=4):
+        self.mode = mode if mode in RESOLUTION_MODES else "none"
+        self.resolution = float(resolution or 0.0)
+        self.wavelength = float(wavelength or 1.5406)
+        self.sample_length = float(sample_length) if sample_length else None
+        self.beam_width = float(beam_width) if beam_width else None
+        self.scale = float(scale) if scale is not None else None
+        self.background = float(background) if background is not None else None
+        self.oversample = int(oversample)
+
+    @classmethod
+    def from_dict(cls, data):
+        """dcc.Store dict (또는 Instrument / None) -> Instrument"""
+        if isinstance(data, Instrument):
+            return data
+        return cls(**{k: v for k, v in (data or {}).items() if k in cls.__slots__})
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def kernel_key(self):
+        """커널 (q-grid, 행렬, footprint) 에 영향을 주는 설정만 (scale / background 제외)"""
+        return (self.mode, self.resolution, self.wavelength, self.sample_length, self.beam_width, self.oversample)
+
+    @property
+    def is_ideal(self):
+        return (self.mode == "none" or self.resolution <= 0) and not (self.sample_length and self.beam_width)
+
+    # --- 물리량 ---
+    def theta(self, q):
+        """q (Å⁻¹) -> 입사각 θ (rad)"""
+        return np.arcsin(np.clip(q * self.wavelength / (4.0 * np.pi), 0.0, 1.0))
+
+    def sigma_q(self, q):
+        """q 별 가우시안 분해능 σ_q (Å⁻¹), 분해능이 없으면 None"""
+        if self.mode == "none" or self.resolution <= 0:
+            return None
+        if self.mode == "dq/q":
+            return self.resolution * FWHM_TO_SIGMA * q
+        sigma_theta = np.deg2rad(self.resolution) * FWHM_TO_SIGMA
+        return 4.0 * np.pi / self.wavelength * np.cos(self.theta(q)) * sigma_theta
+
+    def footprint(self, q):
+        """시료에 걸리는 빔 비율 (0~1), 설정이 없으면 1"""
+        if not (self.sample_length and self.beam_width):
+            return np.ones_like(q, dtype=float)
+        sigma_beam = self.beam_width * FWHM_TO_SIGMA
+        return erf(self.sample_length * np.sin(self.theta(q)) / (2.0 * np.sqrt(2.0) * sigma_beam))
+
+    def kernel(self, q):
+        """q-grid 별 ResolutionKernel (kernel_cache 에서 재사용)"""
+        return kernel_cache.get(q, self)
+
+    def scale_background(self, R, I_exp, weights=None):
+        """고정값은 그대로, None 인 scale / background 는 I_exp 에 맞춰 풀어서 (scale, background)"""
+        return project_scale_background(R, I_exp, self.scale, self.background, weights)
+
+    def intensity(self, R, I_exp, weights=None):
+        """(분해능 / footprint 가 적용된) 반사율 (…, M) -> I_exp 와 비교할 강도 (…, M)"""
+        scale, background = self.scale_background(R, I_exp, weights)
+        return R * scale[..., None] + background[..., None]
+
+
+def project_scale_background(R, I_exp, scale=None, background=None, weights=None):
+    """
+    [Variable Projection]
+    I ≈ scale · R + background 에서 선형 파라미터 (scale, background) 를 닫힌 형태로 풉니다.
+    가중 2x2 정규방정식, weights 가 없으면 log 잔차와 같은 상대 오차 가중치 (w = 1/I²), I <= 0 인 점은 제외.
+    background < 0 이 나오면 0 으로 두고 scale 만 다시 풉니다.
+    R: (…, M) -> (scale, background) 각각 (…,) 배열
+    """
+    R = np.asarray(R, dtype=float)
+    I_exp = np.asarray(I_exp, dtype=float)
+    if weights is None:
+        w = np.where(I_exp > 0, 1.0 / np.where(I_exp > 0, I_exp, 1.0) ** 2, 0.0)
+    else:
+        w = np.asarray(weights, dtype=float)
+    shape = R.shape[:-1]
+
+    s_w = w.sum()
+    s_r = R @ w
+    s_rr = (R * R) @ w
+    s_i = w @ I_exp
+    s_ri = R @ (w * I_exp)
+
+    def scale_for(b):
+        return np.maximum((s_ri - b * s_r) / np.maximum(s_rr, 1e-300), 1e-300)
+
+    if scale is not None and background is not None:
+        return np.full(shape, scale), np.full(shape, background)
+    if scale is not None:
+        b = np.maximum((s_i - scale * s_r) / max(s_w, 1e-300), 0.0)
+        return np.full(shape, scale), b
+    if background is not None:
+        return scale_for(background), np.full(shape, background)
+
+    det = s_rr * s_w - s_r * s_r
+    ok = np.abs(det) > 1e-12 * np.maximum(s_rr * s_w, 1e-300)
+    b = np.where(ok, (s_rr * s_i - s_r * s_ri) / np.where(ok, det, 1.0), 0.0)
+    b = np.maximum(b, 0.0)
+    return scale_for(b), b
+
+
+class ResolutionKernel:
+    """
+    데이터셋 (q-grid) 별로 한 번만 만드는 분해능 커널.
+    q_calc: 시뮬레이션할 oversampled q-grid (분해능 σ / oversample 간격)
+    matrix: (M_exp, M_calc) 희소 가우시안 가중치 행렬 (행 합 = 1), 분해능이 없으면 None
+    footprint: (M_exp,) footprint 보정
+    """
+    __slots__ = ("q", "q_calc", "matrix", "footprint")
+
+    def __init__(self, q, q_calc, matrix, footprint):
+        self.q = q
+        self.q_calc = q_calc
+        self.matrix = matrix
+        self.footprint = footprint
+
+    def apply(self, R):
+        """(…, M_calc) 이상적인 반사율 -> (…, M_exp) 측정 반사율 (scale / background 제외)"""
+        R = np.asarray(R, dtype=float)
+        if self.matrix is not None:
+            flat = R.reshape(-1, R.shape[-1])
+            R = np.asarray(self.matrix @ flat.T).T.reshape(R.shape[:-1] + (self.matrix.shape[0],))
+        return R * self.footprint
+
+
+def build_kernel(q, instrument):
+    """
+    [Resolution Kernel]
+    분해능에 맞춘 oversampled q-grid + 희소 가우시안 합성곱 행렬을 만듭니다.
+    dq/q 일정이면 q 에 대해 기하 간격, dθ 일정이면 θ 에 대해 등간격 grid 입니다.
+    실험 q-grid 로 대신하면 양 끝에서 커널이 잘리고 fringe 가 undersample 되므로 항상 oversampled grid 를 씁니다.
+    """
+    q = np.asarray(q, dtype=float)
+    footprint = instrument.footprint(q)
+    sigma = instrument.sigma_q(q)
+    if sigma is None or len(q) == 0:
+        return ResolutionKernel(q, q, None, footprint)
+
+    q_calc = _calc_grid(q, instrument)
+    return ResolutionKernel(q, q_calc, _gaussian_matrix(q, sigma, q_calc), footprint)
+
+
+def _calc_grid(q, instrument):
+    q_min, q_max = max(np.min(q), 1e-6), np.max(q)
+    step = 1.0 / instrument.oversample
+    if instrument.mode == "dq/q":
+        ratio = 1.0 + instrument.resolution * FWHM_TO_SIGMA * step
+        lo = q_min * (1.0 - KERNEL_WIDTH * instrument.resolution * FWHM_TO_SIGMA)
+        lo = max(lo, q_min * 0.1)
+        hi = q_max * (1.0 + KERNEL_WIDTH * instrument.resolution * FWHM_TO_SIGMA)
+        return lo * ratio ** np.arange(int(np.ceil(np.log(hi / lo) / np.log(ratio))) + 1)
+
+    sigma_theta = np.deg2rad(instrument.resolution) * FWHM_TO_SIGMA
+    th = instrument.theta(np.array([q_min, q_max]))
+    lo = max(th[0] - KERNEL_WIDTH * sigma_theta, th[0] * 0.1)
+    hi = min(th[1] + KERNEL_WIDTH * sigma_theta, np.pi / 2)
+    theta = np.arange(lo, hi + sigma_theta * step, sigma_theta * step)
+    return 4.0 * np.pi / instrument.wavelength * np.sin(theta)
+
+
+def _gaussian_matrix(q, sigma, q_calc):
+    """행 i = q[i] 중심, σ[i] 가우시안을 q_calc 위에서 사다리꼴 적분한 가중치 (±KERNEL_WIDTH σ 에서 자름)"""
+    widths = np.gradient(q_calc) if len(q_calc) > 1 else np.ones(1)
+    start = np.searchsorted(q_calc, q - KERNEL_WIDTH * sigma, side="left")
+    stop = np.searchsorted(q_calc, q + KERNEL_WIDTH * sigma, side="right")
+    # 커널 안에 grid 점이 없으면 가장 가까운 점 하나
+    empty = stop <= start
+    start[empty] = np.clip(np.searchsorted(q_calc, q[empty]), 0, len(q_calc) - 1)
+    stop[empty] = start[empty] + 1
+
+    counts = stop - start
+    rows = np.repeat(np.arange(len(q)), counts)
+    cols = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+    z = (q_calc[cols] - q[rows]) / np.maximum(sigma[rows], 1e-12)
+    weights = np.exp(-0.5 * z * z) * widths[cols]
+    norm = np.bincount(rows, weights=weights, minlength=len(q))
+    weights /= np.where(norm > 0, norm, 1.0)[rows]
+    return sparse.csr_matrix((weights, (rows, cols)), shape=(len(q), len(q_calc)))
+
+
+class KernelCache:
+    """(q-grid hash, instrument 설정) -> ResolutionKernel LRU 캐시 (데이터셋별로 한 번만 생성)"""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, q, instrument):
+        q = np.ascontiguousarray(q, dtype=float)
+        key = (hashlib.blake2b(q.tobytes(), digest_size=16).hexdigest(), instrument.kernel_key())
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+        kernel = build_kernel(q, instrument)
+        self._data[key] = kernel
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return kernel
+
+    def clear(self):
+        self._data.clear()
+
+
+kernel_cache = KernelCache()
@@ -0,0 +1,329 @@
+import re
+import warnings
+
+import numpy as np
+
+from app.logic.parratt import CompiledStack, FIELDS
+
+# 파라미터 기본 범위 / 값을 읽을 수 없을 때의 기본값
+LIMITS = {"thickness": (0.0, 5000.0), "sld": (0.0, 50.0), "roughness": (0.0, 50.0)}
+DEFAULTS = {"thickness": 10.0, "sld": 2.0, "roughness": 0.3}
+SUBSTRATE_DEFAULT = {"sld": 2.33, "roughness": 0.2}
+
+# 테이블 제약 컬럼에서 쓰는 파라미터 이름 (FIELDS 순서의 인덱스)
+SYMBOLS = ("d", "ρ", "σ")
+_FIELD_NAMES = {
+    "d": 0, "t": 0, "thickness": 0,
+    "ρ": 1, "rho": 1, "sld": 1,
+    "σ": 2, "sigma": 2, "roughness": 2,
+}
+_NUM = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_REPEAT_RE = re.compile(r"^\s*(?:([^\s:×x*]+)\s*[:×x*]\s*|[×x*]\s*)?(\d+)\s*$")
+_LINK_RE = re.compile(r"(\w+)\s*:\s*(\w+)")
+_BOUND_RE = re.compile(rf"([^\s:=,;]+)\s*[:=]\s*({_NUM})\s*(?:~|\.\.|-|to)\s*({_NUM})")
+
+
+def _parse(value):
+    """테이블 셀 -> float ("∞" -> inf, "?" / 빈칸 / 잘못된 값 -> nan)"""
+    if value == "∞":
+        return np.inf
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _field(token):
+    return _FIELD_NAMES.get(token.strip().lower())
+
+
+def _parse_fix(text):
+    """"d, σ" / "all" -> 고정할 필드 인덱스 집합"""
+    tokens = [t for t in re.split(r"[\s,;/]+", str(text or "")) if t]
+    if any(t.lower() in ("all", "*") for t in tokens):
+        return {0, 1, 2}
+    return {f for f in map(_field, tokens) if f is not None}
+
+
+def _parse_link(text):
+    """
+    "σ:A, d:B" -> {필드: 그룹}, 필드 없이 "A" 만 쓰면 세 파라미터 모두 같은 그룹.
+    콜론 주위 공백은 Bounds 처럼 허용 ("σ: A" == "σ:A"), 필드별 지정이 그룹 전체 지정보다 우선합니다.
+    """
+    text = str(text or "")
+    links = {}
+    for tag in re.split(r"[\s,;]+", _LINK_RE.sub(" ", text)):
+        if tag:
+            links.update({f: tag for f in range(3)})
+    for name, tag in _LINK_RE.findall(text):
+        if _field(name) is not None:
+            links[_field(name)] = tag
+    return links
+
+
+def _parse_bounds(text):
+    """"d:100~200, σ:0-5" -> {필드: (lo, hi)}"""
+    out = {}
+    for name, lo, hi in _BOUND_RE.findall(str(text or "")):
+        f = _field(name)
+        lo, hi = float(lo), float(hi)
+        if f is not None and lo <= hi:
+            out[f] = (lo, hi)
+    return out
+
+
+def _parse_repeat(text):
+    """"20" / "×20" / "A:20" -> (그룹, 반복 횟수), 반복이 아니면 None"""
+    m = _REPEAT_RE.match(str(text or ""))
+    if not m or int(m.group(2)) < 2:
+        return None
+    return m.group(1) or "", int(m.group(2))
+
+
+def _intersect(a, b, label=""):
+    """두 범위의 교집합, 비어 있으면 경고하고 a"""
+    if b is None:
+        return a
+    lo, hi = max(a[0], b[0]), min(a[1], b[1])
+    if lo > hi:
+        warnings.warn(f"{label or 'bounds'}: {b[0]:g}~{b[1]:g} does not overlap {a[0]:g}~{a[1]:g}, "
+                      f"keeping {a[0]:g}~{a[1]:g}", RuntimeWarning, stacklevel=3)
+        return a
+    return lo, hi
+
+
+def _cell(value):
+    """float -> 테이블 셀"""
+    if np.isinf(value):
+        return "∞"
+    if np.isnan(value):
+        return "?"
+    return float(value)
+
+
+class LayerStack:
+    """
+    [Layer Model]
+    DataTable 레이어 (문자열 / 숫자 혼합 dict) 를 한 번만 파싱해서 배열로 들고 있는 모델.
+    행 순서는 테이블 그대로 (기판이 맨 위 행).
+    thickness / sld / roughness: (N,) float 배열 (∞ = inf, ? = nan)
+    free: (N, 3) bool 마스크 [thickness, sld, roughness]
+    links: (N, 3) 링크 그룹 이름 ("" = 링크 없음), 같은 필드 + 같은 그룹은 한 파라미터로 피팅
+    limits: (N, 3, 2) 사용자 범위 (nan = 기본 LIMITS)
+    repeat: (N,) 반복 횟수 (1 = 반복 없음), block: (N,) 반복 블록 번호 (-1 = 없음)
+        ×N 컬럼 값이 같은 연속된 행들이 한 주기 [A/B/…] 가 되어 N 번 반복됩니다.
+    """
+    __slots__ = ("names", "thickness", "sld", "roughness", "free", "links", "limits", "repeat", "block")
+
+    def __init__(self, names, thickness, sld, roughness, free=None, links=None, limits=None, repeat=None, block=None):
+        self.names = list(names)
+        self.thickness = np.asarray(thickness, dtype=float)
+        self.sld = np.asarray(sld, dtype=float)
+        self.roughness = np.asarray(roughness, dtype=float)
+        n = len(self.names)
+        if free is None:
+            free = np.ones((n, 3), dtype=bool)
+        self.free = np.asarray(free, dtype=bool).copy()
+        # 두께가 ∞ 인 행 (기판) 은 항상 고정
+        self.free[:, 0] &= ~np.isinf(self.thickness)
+        self.links = np.full((n, 3), "", dtype=object) if links is None else np.asarray(links, dtype=object)
+        self.limits = np.full((n, 3, 2), np.nan) if limits is None else np.asarray(limits, dtype=float)
+        self.repeat = np.ones(n, dtype=int) if repeat is None else np.asarray(repeat, dtype=int)
+        self.block = np.full(n, -1, dtype=int) if block is None else np.asarray(block, dtype=int)
+
+    # --- DataTable 변환 (유일한 변환 지점) ---
+    @classmethod
+    def from_table(cls, rows):
+        if isinstance(rows, LayerStack):
+            return rows
+        rows = rows or []
+        n = len(rows)
+        free = np.ones((n, 3), dtype=bool)
+        links = np.full((n, 3), "", dtype=object)
+        limits = np.full((n, 3, 2), np.nan)
+        repeat = np.ones(n, dtype=int)
+        block = np.full(n, -1, dtype=int)
+        previous, n_blocks = None, 0
+        for i, r in enumerate(rows):
+            rep = _parse_repeat(r.get("repeat"))
+            if rep is not None:
+                if rep != previous:
+                    n_blocks += 1
+                repeat[i], block[i] = rep[1], n_blocks - 1
+            previous = rep
+            free[i, list(_parse_fix(r.get("fix")))] = False
+            for f, tag in _parse_link(r.get("link")).items():
+                links[i, f] = tag
+            for f, b in _parse_bounds(r.get("bounds")).items():
+                limits[i, f] = b
+        return cls(
+            [str(r.get("layer", "-")) for r in rows],
+            [_parse(r.get("thickness")) for r in rows],
+            [_parse(r.get("sld")) for r in rows],
+            [_parse(r.get("roughness")) for r in rows],
+            free, links, limits, repeat, block,
+        )
+
+    def to_table(self, formatted=False):
+        """
+        formatted=False: 편집 가능한 값 (∞ / ? 유지)
+        formatted=True : 결과 테이블 표시용 문자열 (값이 없으면 0)
+        """
+        if formatted:
+            t, s, r = (np.nan_to_num(a, nan=0.0, posinf=0.0) for a in (self.thickness, self.sld, self.roughness))
+            return [
+                {"layer": n, "thickness": f"{t[i]:.1f}", "sld": f"{s[i]:.2f}", "roughness": f"{r[i]:.1f}"}
+                for i, n in enumerate(self.names)
+            ]
+        return [
+            {"layer": n, "thickness": _cell(self.thickness[i]), "sld": _cell(self.sld[i]), "roughness": _cell(self.roughness[i]),
+             "fix": self._fix_cell(i), "link": self._link_cell(i), "bounds": self._bounds_cell(i),
+             "repeat": self._repeat_cell(i)}
+            for i, n in enumerate(self.names)
+        ]
+
+    def _repeat_cell(self, i):
+        b = self.block[i]
+        if b < 0:
+            return ""
+        # 같은 횟수의 다른 블록과 붙어 있으면 그룹 이름으로 구분
+        rows = np.flatnonzero(self.block == b)
+        neighbours = [j for j in (rows[0] - 1, rows[-1] + 1) if 0 <= j < len(self)]
+        if any(self.block[j] >= 0 and self.repeat[j] == self.repeat[i] for j in neighbours):
+            return f"{chr(65 + b % 26)}:{self.repeat[i]}"
+        return str(self.repeat[i])
+
+    # --- 제약 컬럼 (Fix / Link / Bounds) ---
+    def _fix_cell(self, i):
+        fixed = [SYMBOLS[f] for f in range(3) if not self.free[i, f] and not (f == 0 and np.isinf(self.thickness[i]))]
+        return "all" if len(fixed) == 3 else ", ".join(fixed)
+
+    def _link_cell(self, i):
+        tags = list(self.links[i])
+        if tags[0] and tags.count(tags[0]) == 3:
+            return tags[0]
+        return ", ".join(f"{SYMBOLS[f]}:{tag}" for f, tag in enumerate(tags) if tag)
+
+    def _bounds_cell(self, i):
+        return ", ".join(
+            f"{SYMBOLS[f]}:{lo:g}~{hi:g}" for f, (lo, hi) in enumerate(self.limits[i]) if np.isfinite(lo)
+        )
+
+    def bounds_for(self, row, f):
+        """행 / 필드의 피팅 범위 (사용자 Bounds 컬럼, 없으면 LIMITS)"""
+        lo, hi = self.limits[row, f]
+        return (lo, hi) if np.isfinite(lo) else LIMITS[FIELDS[f]]
+
+    def __len__(self):
+        return len(self.names)
+
+    def key(self):
+        """해시 가능한 키 (캐시용, 시뮬레이션 값만 포함)"""
+        return (tuple(self.names), self.thickness.tobytes(), self.sld.tobytes(), self.roughness.tobytes(),
+                self.repeat.tobytes(), self.block.tobytes())
+
+    @property
+    def values(self):
+        """(3, N) [thickness, sld, roughness]"""
+        return np.vstack([self.thickness, self.sld, self.roughness])
+
+    # --- 시뮬레이션 모델 ---
+    def model_rows(self, unroll=False):
+        """
+        시뮬레이션에 쓰이는 행: (film 행 리스트, SiO₂ 행, 기판 행)
+        calculate_xrr_simulation / param2refl 과 같은 규칙 ('Film', 'SiO' 이름만 사용).
+        unroll=True 이면 반복 블록의 film 행을 반복 횟수만큼 펼쳐서 돌려줍니다.
+        """
+        films, sio2, substrate = [], None, None
+        for i, name in enumerate(self.names):
+            if "Film" in name:
+                films.append(i)
+            elif "SiO" in name:
+                sio2 = i
+            elif np.isinf(self.thickness[i]) and substrate is None:
+                substrate = i
+        if unroll:
+            unrolled = []
+            for i, row in enumerate(films):
+                b = self.block[row]
+                if b >= 0 and i + 1 < len(films) and self.block[films[i + 1]] == b:
+                    continue
+                period = [j for j in films[:i + 1] if self.block[j] == b] if b >= 0 else [row]
+                unrolled += period * (self.repeat[row] if b >= 0 else 1)
+            films = unrolled
+        return films, sio2, substrate
+
+    def repeat_blocks(self):
+        """{블록 번호: (행 리스트, 반복 횟수)}"""
+        return {
+            b: (list(np.flatnonzero(self.block == b)), int(self.repeat[self.block == b][0]))
+            for b in np.unique(self.block[self.block >= 0])
+        }
+
+    def compile(self, bounds=None):
+        """
+        피팅용 CompiledStack. 공기 쪽부터 [Film (역순), SiO₂, 기판] 으로 배열합니다.
+        기판은 고정, free 마스크가 켜진 Film / SiO₂ 파라미터만 자유 파라미터가 됩니다.
+        같은 필드 + 같은 링크 그룹의 자유 슬롯은 하나의 파라미터를 공유합니다
+        (초기값은 공기 쪽 첫 슬롯, 범위는 교집합). 고정된 슬롯은 링크되지 않습니다.
+        반복 블록은 한 주기만 슬롯으로 들어가고 repeats 로 반복 횟수를 넘기므로
+        주기당 파라미터만 피팅됩니다.
+        bounds: 행별 {key: (lo, hi)} 리스트 (warm start 등), 테이블 Bounds 와 교집합
+            (겹치지 않는 범위는 RuntimeWarning 을 내고 테이블 / 먼저 나온 슬롯의 범위를 씁니다)
+        스택을 만들 수 없으면 None.
+        """
+        films, sio2, substrate = self.model_rows()
+        if not films or sio2 is None:
+            return None
+
+        rows = films[::-1] + [sio2]
+        n = len(rows) + 1
+        values = np.zeros((3, n))
+        source = self.values
+        param_index, param_map, tie, lo, hi = [], [], [], [], []
+        groups = {}
+        for slot, row in enumerate(rows):
+            for f, key in enumerate(FIELDS):
+                val = source[f, row]
+                values[f, slot] = DEFAULTS[key] if not np.isfinite(val) else val
+                if not self.free[row, f]:
+                    continue
+                label = f"{self.names[row]} {key}"
+                b = _intersect(self.bounds_for(row, f), bounds[row].get(key) if bounds else None, label)
+                group = (f, self.links[row, f]) if self.links[row, f] else None
+                if group in groups:
+                    k = groups[group]
+                    lo[k], hi[k] = _intersect((lo[k], hi[k]), b, f"{label} (link {group[1]})")
+                else:
+                    k = len(lo)
+                    lo.append(b[0])
+                    hi.append(b[1])
+                    if group:
+                        groups[group] = k
+                param_index.append(f * n + slot)
+                param_map.append((row, key))
+                tie.append(k)
+
+        # 기판 (고정)
+        sub_sld = self.sld[substrate] if substrate is not None else np.nan
+        sub_rough = self.roughness[substrate] if substrate is not None else np.nan
+        values[1, -1] = sub_sld if np.isfinite(sub_sld) else SUBSTRATE_DEFAULT["sld"]
+        values[2, -1] = sub_rough if np.isfinite(sub_rough) else SUBSTRATE_DEFAULT["roughness"]
+
+        repeats = []
+        for b, (block_rows, count) in self.repeat_blocks().items():
+            slots = [slot for slot, row in enumerate(rows) if row in block_rows]
+            if slots:
+                repeats.append((min(slots), max(slots) + 1, count))
+
+        param_index, tie = np.array(param_index, dtype=int), np.array(tie, dtype=int)
+        lo, hi = np.array(lo, dtype=float), np.array(hi, dtype=float)
+        # 각 파라미터의 초기값 = 그 파라미터를 쓰는 첫 슬롯의 값
+        first = np.unique(tie, return_index=True)[1]
+        p0 = np.clip(values.reshape(-1)[param_index[first]], lo, hi)
+        return CompiledStack(values, param_index, param_map, p0, (lo, hi), tie, repeats)
+
+
+def compile_stack(layers, bounds=None):
+    """테이블 dict 리스트 (또는 LayerStack) -> CompiledStack / None"""
+    return LayerStack.from_table(layers).compile(bounds)
@@ -0,0 +1,87 @@
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+COMMENT_CHARS = ("#", "%", ";", "!", "//")
+PREFIX_LINES = 50
+MAX_COLUMNS = 3  # q, R, dR
+
+_NUMBER = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+
+
+def _is_comment(line):
+    return line.startswith(COMMENT_CHARS)
+
+
+def _split(line, sep):
+    return line.split() if sep is None else [tok.strip() for tok in line.split(sep)]
+
+
+def _detect_delimiter(line):
+    for sep in (",", "\t", ";"):
+        if sep in line:
+            return sep
+    return None  # 공백
+
+
+def sniff_format(lines):
+    """
+    앞부분 몇 줄로 구분자, 헤더(주석 포함) 줄 수, 컬럼 수를 결정합니다.
+    Returns:
+        (sep, skip_rows, n_columns) / 숫자 데이터 줄이 없으면 None
+    """
+    for i, raw in enumerate(lines):
+        line = raw.strip()
+        if not line or _is_comment(line):
+            continue
+        sep = _detect_delimiter(line)
+        tokens = [t for t in _split(line, sep) if t]
+        numeric = [_NUMBER.match(t) is not None for t in tokens]
+        if len(tokens) >= 2 and all(numeric[:2]):
+            n_columns = 0
+            for ok in numeric[:MAX_COLUMNS]:
+                if not ok:
+                    break
+                n_columns += 1
+            return sep, i, n_columns
+    return None
+
+
+def load_xrr_text(text):
+    """
+    [Fast Loader]
+    .dat / .xy / .txt 텍스트 -> (n_columns, N) float64 배열 [q, R, (dR)].
+    앞부분에서 구분자/헤더를 찾은 뒤 본문은 pandas C 파서로 한 번에 읽습니다.
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="replace")
+
+    prefix = text[:8192].splitlines()[:PREFIX_LINES]
+    fmt = sniff_format(prefix)
+    if fmt is None:
+        raise ValueError("No numeric data found")
+    sep, skip_rows, n_columns = fmt
+
+    comment = next((c for c in COMMENT_CHARS if len(c) == 1 and c != sep and c in text), None)
+    df = pd.read_csv(
+        io.StringIO(text),
+        sep=r"\s+" if sep is None else sep,
+        engine="c",
+        header=None,
+        skiprows=skip_rows,
+        usecols=range(n_columns),
+        comment=comment,
+        skip_blank_lines=True,
+        on_bad_lines="skip",
+    )
+    if not all(dtype.kind == "f" or dtype.kind == "i" for dtype in df.dtypes):
+        # 본문 중간에 숫자가 아닌 값이 섞인 경우만 느린 변환
+        df = df.apply(pd.to_numeric, errors="coerce")
+
+    data = df.to_numpy(dtype=np.float64).T
+    finite = np.isfinite(data[:2]).all(axis=0)
+    if not finite.all():
+        data = data[:, finite]
+    return np.ascontiguousarray(data)
@@ -0,0 +1,346 @@
+import hashlib
+import os
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from scipy.stats import qmc
+
+from app.logic.instrument import project_scale_background
+from app.logic.layers import SYMBOLS, LayerStack
+
+LIBRARY_DIR = os.environ.get("XRR_LIBRARY_DIR", os.path.join(".cache", "library"))
+LIBRARY_MB = float(os.environ.get("XRR_LIBRARY_MB", 256))
+LIBRARY_VERSION = 3
+# canonical q-grid 포인트 수 / 라이브러리 곡선 수 (Sobol 샘플, 2 의 거듭제곱으로 내림) / PCA 차원
+N_Q = 256
+MAX_SIZE = 16384
+N_COMPONENTS = 24
+# Bounds 컬럼이 없는 자유 파라미터의 라이브러리 범위 (템플릿 값과 무관 -> 레시피당 라이브러리 하나)
+# 자유 파라미터 여러 개를 이 범위 전체로 샘플하면 곡선 간격이 너무 넓어서 조회 결과가 거칠어집니다 (경고).
+LIBRARY_LIMITS = {"thickness": (5.0, 1000.0), "sld": (0.5, 25.0), "roughness": (0.0, 15.0)}
+# 데이터 최저값에서 이 자릿수 이내의 점은 background 가 지배할 수 있으므로 라이브러리 비교에서 제외
+FLOOR_DECADES = 1.5
+# PCA 거리로 고른 뒤 실제 데이터 (scale / background 를 풀어서) 로 다시 정렬할 후보 수
+N_CANDIDATES = 64
+# refine=True 일 때: 다듬을 상위 후보 수 / 반복 수 (배치 pattern search)
+N_REFINE = 8
+REFINE_ITER = 20
+# 재정렬 / 다듬기에 쓰는 데이터 최대 점 수
+MAX_POINTS = 256
+# 커널 중간 배열 (B x N x M complex) 크기 제한
+_MAX_ELEMENTS = 4_000_000
+
+
+class CurveLibrary:
+    """
+    [Lookup Library]
+    스택 템플릿 (레시피) 하나의 파라미터 범위 위에서 미리 시뮬레이션한 곡선 라이브러리.
+    곡선은 canonical q-grid 위의 log10 R (평균을 뺀 값 -> scale 무관) 을 PCA 로 압축한 좌표로 들고 있고,
+    조회 때는 데이터에서 background 가 지배하는 꼬리를 뺀 점들만으로 거리를 계산합니다.
+    """
+    __slots__ = ("q", "params", "mean", "components", "coords", "compiled")
+
+    def __init__(self, q, params, mean, components, coords, compiled):
+        self.q = q
+        self.params = params
+        self.mean = mean
+        self.components = components
+        self.coords = coords
+        self.compiled = compiled
+
+    def query(self, q, I, k=1):
+        """
+        실험 곡선 -> (거리 (k,), 파라미터 벡터 (k, P)), 가까운 순서.
+        거리는 signal_points 의 점에서만, 그 점들 위의 평균을 다시 빼서 계산합니다 (scale 무관, 재구성 곡선 기준).
+        """
+        k = min(k, len(self.params))
+        log_i = curve_log(self.q, q, I)
+        S = signal_points(log_i)
+        # 재구성 곡선 (mean + cᵀC) 과 데이터의 S 위 거리: ||A c - y||² = cᵀGc - 2cᵀb + yᵀy
+        A = self.components[:, S].T
+        A = A - A.mean(axis=0)
+        y = log_i[S] - self.mean[S]
+        y = y - y.mean()
+        G, b = A.T @ A, A.T @ y
+        d2 = ((self.coords @ G) * self.coords).sum(axis=1) - 2.0 * self.coords @ b + y @ y
+        idx = np.argpartition(d2, k - 1)[:k] if k < len(d2) else np.arange(len(d2))
+        idx = idx[np.argsort(d2[idx])]
+        return np.sqrt(np.maximum(d2[idx], 0.0) / S.sum()), self.params[idx]
+
+
+def library_bounds(table):
+    """템플릿 -> compile 에 넘길 행별 범위 (LIBRARY_LIMITS, 테이블 Bounds 가 있으면 그 교집합)"""
+    return [dict(LIBRARY_LIMITS) for _ in table]
+
+
+def unbounded_parameters(template):
+    """템플릿에서 Bounds 컬럼 없이 LIBRARY_LIMITS 전체로 샘플되는 자유 파라미터 이름 ("Film d", ...)"""
+    stack = LayerStack.from_table(template)
+    films, sio2, _ = stack.model_rows()
+    rows = films + ([sio2] if sio2 is not None else [])
+    return [f"{stack.names[row]} {SYMBOLS[f]}" for row in rows for f in range(3)
+            if stack.free[row, f] and not np.isfinite(stack.limits[row, f, 0])]
+
+
+def compile_template(template):
+    """템플릿 -> (CompiledStack, 테이블) / 자유 파라미터가 없으면 (None, 테이블)."""
+    table = LayerStack.from_table(template).to_table()
+    compiled = LayerStack.from_table(table).compile(library_bounds(table))
+    if compiled is None or len(compiled.p0) == 0:
+        return None, table
+    return compiled, table
+
+
+def canonical_q(q, n_q=N_Q):
+    """데이터 q 범위 안쪽으로 (1e-3 Å⁻¹ 단위로 맞춘) 등간격 grid, 범위가 너무 좁으면 None"""
+    q = np.asarray(q, dtype=float)
+    q = q[np.isfinite(q) & (q > 0)]
+    if len(q) < 2:
+        return None
+    lo, hi = np.ceil(q.min() * 1e3) / 1e3, np.floor(q.max() * 1e3) / 1e3
+    if hi <= lo:
+        return None
+    return np.linspace(lo, hi, n_q)
+
+
+def _valid(q, I):
+    q = np.asarray(q, dtype=float)
+    I = np.asarray(I, dtype=float)
+    ok = np.isfinite(q) & np.isfinite(I) & (I > 0)
+    order = np.argsort(q[ok])
+    return q[ok][order], I[ok][order]
+
+
+def curve_log(q_canon, q, I):
+    """(q, I) -> canonical grid 위 log10 I (I <= 0 인 점은 제외)"""
+    q, I = _valid(q, I)
+    return np.interp(q_canon, q, np.log10(I))
+
+
+def curve_features(q_canon, q, I):
+    """(q, I) -> canonical grid 위 log10 I 에서 평균을 뺀 특징 벡터"""
+    log_i = curve_log(q_canon, q, I)
+    return log_i - log_i.mean()
+
+
+def signal_points(log_i, floor_decades=FLOOR_DECADES):
+    """
+    background 가 지배하지 않는 점 (bool 마스크): 마지막으로 최저값 + floor_decades 위에 있던 점까지.
+    꼬리가 평평해져도 (background) 그 앞의 fringe 구간만으로 비교합니다. 남는 점이 너무 적으면 전부.
+    """
+    above = np.flatnonzero(log_i > log_i.min() + floor_decades)
+    mask = np.zeros(log_i.shape, dtype=bool)
+    if above.size:
+        mask[:above[-1] + 1] = True
+    return mask if mask.sum() >= 16 else np.ones(log_i.shape, dtype=bool)
+
+
+def parameter_grid(lo, hi, max_size=MAX_SIZE, seed=0, log_axes=None):
+    """
+    (lo, hi) 범위의 Sobol 준난수 파라미터 샘플 (2^⌊log2 max_size⌋ 개, seed 가 같으면 같은 샘플).
+    완전 grid 는 파라미터가 늘면 축당 점 수가 급격히 줄어들지만 (6 개면 5 점), Sobol 은 축마다 모든 값이 다릅니다.
+    log_axes: log 간격으로 샘플할 축 (bool 마스크, 두께처럼 상대 변화가 중요한 파라미터)
+    """
+    lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+    m = int(np.floor(np.log2(max_size)))
+    u = qmc.Sobol(d=len(lo), scramble=True, seed=seed).random_base2(m)
+    params = lo + u * (hi - lo)
+    if log_axes is not None:
+        log_axes = np.asarray(log_axes, dtype=bool) & (lo > 0)
+        a, b = np.log(lo[log_axes]), np.log(hi[log_axes])
+        params[:, log_axes] = np.exp(a + u[:, log_axes] * (b - a))
+    return params
+
+
+def _thickness_axes(compiled):
+    """파라미터 벡터에서 두께 파라미터 마스크"""
+    first = np.unique(compiled.tie, return_index=True)[1]
+    return np.array([compiled.param_map[i][1] == "thickness" for i in first], dtype=bool)
+
+
+def build_library(template, q_canon, max_size=MAX_SIZE, n_components=N_COMPONENTS):
+    """템플릿 스택 -> CurveLibrary / 자유 파라미터가 없으면 None"""
+    compiled, _ = compile_template(template)
+    if compiled is None:
+        return None
+
+    lo, hi = compiled.bounds
+    params = parameter_grid(lo, hi, max_size, log_axes=_thickness_axes(compiled))
+    chunk = max(1, _MAX_ELEMENTS // (compiled.n_layers * len(q_canon)))
+    log_r = np.empty((len(params), len(q_canon)))
+    for start in range(0, len(params), chunk):
+        R = compiled.reflectivity(q_canon, params[start:start + chunk])
+        log_r[start:start + chunk] = np.log10(np.maximum(R, 1e-300))
+    features = log_r - log_r.mean(axis=1, keepdims=True)
+
+    mean = features.mean(axis=0)
+    _, _, vt = np.linalg.svd(features - mean, full_matrices=False)
+    components = vt[:min(n_components, len(vt))]
+    return CurveLibrary(q_canon, params, mean, components, (features - mean) @ components.T, compiled)
+
+
+class LibraryCache:
+    """
+    (레시피, q 범위) -> CurveLibrary.
+    레시피 = 구조 (행 / 반복) + Fix / Link / Bounds + 고정된 값. 자유 파라미터의 현재 값은 키에 들어가지 않으므로
+    테이블 값을 고치거나 피팅 결과를 적용해도 같은 라이브러리를 씁니다.
+    메모리 LRU + 디스크 (.npz, 파라미터 / PCA 좌표), 디스크는 size_limit_mb 를 넘으면 오래 안 쓴 파일부터 지웁니다.
+    """
+
+    def __init__(self, directory=LIBRARY_DIR, maxsize=8, size_limit_mb=LIBRARY_MB):
+        self.directory = Path(directory)
+        self.maxsize = maxsize
+        self.size_limit = int(size_limit_mb * 1024 * 1024)
+        self._data = OrderedDict()
+
+    @staticmethod
+    def make_key(stack, q_canon, max_size, n_components):
+        values = stack.values.copy()
+        values[stack.free.T] = np.nan
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr(stack.names).encode())
+        for a in (values, stack.free, stack.limits, stack.repeat, stack.block):
+            h.update(np.ascontiguousarray(a).tobytes())
+        h.update(repr(stack.links.tolist()).encode())
+        h.update(repr((q_canon[0], q_canon[-1], len(q_canon), max_size, n_components, sorted(LIBRARY_LIMITS.items()),
+                       LIBRARY_VERSION)).encode())
+        return h.hexdigest()
+
+    def get(self, template, q_canon, max_size=MAX_SIZE, n_components=N_COMPONENTS):
+        stack = LayerStack.from_table(template)
+        key = self.make_key(stack, q_canon, max_size, n_components)
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+
+        path = self.directory / f"{key}.npz"
+        library = None
+        if path.exists():
+            compiled, _ = compile_template(template)
+            try:
+                with np.load(path) as f:
+                    library = CurveLibrary(f["q"], f["params"], f["mean"], f["components"], f["coords"], compiled)
+                os.utime(path)
+            except Exception as e:
+                print(f"Library cache read error: {e}")
+        if library is None:
+            print(f"📚 Building lookup library ({max_size} curves max)...")
+            library = build_library(template, q_canon, max_size, n_components)
+            if library is None:
+                return None
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp.npz")
+            np.savez(tmp, q=library.q, params=library.params, mean=library.mean,
+                     components=library.components, coords=library.coords)
+            os.replace(tmp, path)
+            self._evict(keep=path)
+
+        self._data[key] = library
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return library
+
+    def _evict(self, keep=None):
+        """디스크 용량 상한 초과 -> 오래 안 쓴 (.npz mtime) 라이브러리부터 삭제"""
+        files = sorted(self.directory.glob("*.npz"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for path in files:
+            if total <= self.size_limit:
+                break
+            if path == keep:
+                continue
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        self._data.clear()
+
+
+library_cache = LibraryCache()
+
+
+def _fit_points(q, I, max_points=MAX_POINTS):
+    """재정렬 / 최적화용 데이터 (유효한 점, 많으면 등간격으로 솎음)"""
+    q, I = _valid(q, I)
+    if len(q) > max_points:
+        idx = np.linspace(0, len(q) - 1, max_points).round().astype(int)
+        q, I = q[idx], I[idx]
+    return q, I
+
+
+def _log_cost(compiled, q, I, params):
+    """파라미터 배치 (B, P) -> scale / background 를 풀었을 때의 log 잔차 제곱합 (B,)"""
+    R = compiled.reflectivity(q, params)
+    scale, background = project_scale_background(R, I)
+    model = R * scale[:, None] + background[:, None]
+    diff = np.log10(I) - np.log10(np.maximum(model, 1e-300))
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def _polish(compiled, q, I, params, cost, step, n_iter=REFINE_ITER):
+    """
+    후보 (B, P) 를 배치 pattern search 로 다듬습니다: 매 반복 각 파라미터 ±step 을 한 번에 평가해서
+    나아지면 이동, 아니면 그 후보의 step 을 절반으로. least_squares 없이 배치 시뮬레이션 n_iter 번.
+    """
+    lo, hi = compiled.bounds
+    params, cost = params.copy(), cost.copy()
+    n, p = params.shape
+    step = np.tile(step, (n, 1))
+    moves = np.concatenate([np.eye(p), -np.eye(p)])
+    rows = np.arange(n)
+    for _ in range(n_iter):
+        trial = np.clip(params[:, None, :] + moves[None] * step[:, None, :], lo, hi)
+        trial_cost = _log_cost(compiled, q, I, trial.reshape(-1, p)).reshape(n, 2 * p)
+        best = trial_cost.argmin(axis=1)
+        better = trial_cost[rows, best] < cost
+        params[better] = trial[rows, best][better]
+        cost[better] = trial_cost[rows, best][better]
+        step[~better] *= 0.5
+    return params, cost
+
+
+def lookup_candidates(template, q, I, k=5, n_candidates=N_CANDIDATES, refine=False):
+    """
+    [Lookup Initializer]
+    템플릿 스택의 라이브러리에서 실험 곡선과 가장 가까운 k 개 스택.
+    1) PCA 거리 (background 꼬리 제외) 로 n_candidates 개 + 현재 테이블 값
+    2) 실제 데이터 위에서 scale / background 를 풀어 log 잔차로 다시 정렬
+    3) refine=True 이면 상위 N_REFINE 개를 배치 pattern search 로 다듬음 (_polish, 수백 ms)
+    조회 자체는 수십 ms 이고, 정밀한 값은 이어서 하는 피팅이 찾습니다.
+    Bounds 없는 자유 파라미터가 있으면 RuntimeWarning (unbounded_parameters 참고).
+    Returns: [{"layers": 테이블 dict 리스트, "distance": RMS log10 잔차 (dex)}, ...] (가까운 순서)
+    """
+    q_canon = canonical_q(q)
+    if q_canon is None or not template:
+        return []
+    unbounded = unbounded_parameters(template)
+    if unbounded:
+        warnings.warn(f"lookup: no Bounds for {', '.join(unbounded)}; the library spans LIBRARY_LIMITS "
+                      f"and matches will be coarse", RuntimeWarning, stacklevel=2)
+    library = library_cache.get(template, q_canon)
+    if library is None:
+        return []
+    compiled = library.compiled
+    table = LayerStack.from_table(template).to_table()
+
+    _, params = library.query(q, I, max(k, n_candidates))
+    q_fit, I_fit = _fit_points(q, I)
+    # 현재 테이블 값도 후보로 (조회 결과가 시작 스택보다 나빠지지 않도록)
+    current = LayerStack.from_table(table).compile(library_bounds(table)).p0
+    params = np.vstack([current, params])
+    cost = _log_cost(compiled, q_fit, I_fit, params)
+    order = np.argsort(cost)
+    params, cost = params[order], cost[order]
+
+    if refine:
+        # 첫 step = 라이브러리 샘플 간격 (축당 곡선 수^(1/P))
+        lo, hi = compiled.bounds
+        step = (hi - lo) / len(library.params) ** (1.0 / params.shape[1])
+        top = slice(0, N_REFINE)
+        params[top], cost[top] = _polish(compiled, q_fit, I_fit, params[top], cost[top], step)
+        order = np.argsort(cost)
+        params, cost = params[order], cost[order]
+    return [{"layers": compiled.to_layers(p, table), "distance": float(np.sqrt(c / len(q_fit)))}
+            for p, c in zip(params[:k], cost[:k])]
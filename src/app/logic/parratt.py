@@ -0,0 +1,170 @@
+import numpy as np
+
+# SLD 단위 (1e-6 Å⁻²)
+SLD_UNIT = 1e-6
+# kz=0 근처에서 0으로 나누는 것을 막기 위한 아주 작은 흡수항
+_EPS_ABS = 1e-12j
+
+FIELDS = ("thickness", "sld", "roughness")
+
+
+def parratt_reflectivity(q, thickness, sld, roughness, repeats=()):
+    """
+    [Native Parratt Kernel]
+    모든 q 포인트에 대해 한 번에 Parratt 재귀를 수행합니다.
+
+    Args:
+        q (np.ndarray): (M,) q값 배열 (Å⁻¹)
+        thickness, sld, roughness (np.ndarray): (..., N) 레이어 배열.
+            index 0 = 공기 바로 아래 레이어, index N-1 = 기판.
+            roughness[j] 는 레이어 j 윗면 계면의 거칠기입니다.
+            앞쪽 차원(...)은 배치 차원으로 그대로 브로드캐스트됩니다.
+        repeats: [(start, stop, count), ...] 레이어 start..stop-1 이 한 주기이고 count 번 반복됨.
+            주기는 한 번만 계산하고 전달 행렬을 count 제곱합니다 (기판은 포함할 수 없음).
+
+    Returns:
+        np.ndarray: (..., M) Reflectivity (0~1)
+    """
+    q = np.asarray(q, dtype=float)
+    thickness = np.asarray(thickness, dtype=float)[..., None]
+    sld = np.asarray(sld, dtype=float)[..., None]
+    sigma2 = np.asarray(roughness, dtype=float)[..., None] ** 2
+
+    # kz_j = sqrt(kz0² - 4π·SLD_j)
+    kz0 = (q / 2.0).astype(complex)
+    kz = np.sqrt(kz0 ** 2 - 4.0 * np.pi * SLD_UNIT * sld + _EPS_ABS)
+
+    n = kz.shape[-2]
+    k_top = kz0
+    # 계면별 Fresnel 계수 (Névot–Croce 거칠기)
+    r = np.empty(kz.shape, dtype=complex)
+    for j in range(n):
+        k_bot = kz[..., j, :]
+        r[..., j, :] = _fresnel(k_top, k_bot, sigma2[..., j, :])
+        k_top = k_bot
+
+    # 기판에서부터 위로 재귀
+    blocks = {stop - 1: (start, count) for start, stop, count in repeats}
+    R = r[..., n - 1, :]
+    j = n - 2
+    while j >= 0:
+        if j in blocks:
+            R = _repeat_block(R, r, kz, thickness, sigma2, *blocks[j], j)
+            j = blocks[j][0] - 1
+            continue
+        phase = np.exp(2j * kz[..., j, :] * thickness[..., j, :])
+        R_ph = R * phase
+        R = (r[..., j, :] + R_ph) / (1.0 + r[..., j, :] * R_ph)
+        j -= 1
+
+    return np.abs(R) ** 2
+
+
+def _fresnel(k_top, k_bot, sigma2):
+    return (k_top - k_bot) / (k_top + k_bot) * np.exp(-2.0 * k_top * k_bot * sigma2)
+
+
+def _layer_matrix(r, kz, d):
+    """
+    Parratt 한 단계 R -> (r + R·φ) / (1 + r·R·φ) 를 뫼비우스 변환 행렬 [[φ, r], [r·φ, 1]] 로 표현.
+    2x2 행렬은 원소 배열 튜플 (a, b, c, d) 로 다룹니다 (작은 행렬 matmul 보다 빠름).
+    """
+    phase = np.exp(2j * kz * d)
+    return phase, r, r * phase, np.ones_like(r)
+
+
+def _matmul(m, n):
+    """뫼비우스 행렬은 스칼라배에 무관 -> 곱할 때마다 정규화해서 오버/언더플로 방지"""
+    a = m[0] * n[0] + m[1] * n[2]
+    b = m[0] * n[1] + m[1] * n[3]
+    c = m[2] * n[0] + m[3] * n[2]
+    d = m[2] * n[1] + m[3] * n[3]
+    scale = np.maximum(np.maximum(np.abs(a), np.abs(b)), np.maximum(np.abs(c), np.abs(d)))
+    return a / scale, b / scale, c / scale, d / scale
+
+
+def _matrix_power(m, count):
+    """2x2 행렬의 count 제곱 (이진 거듭제곱, O(log count)), count >= 1"""
+    result = None
+    while count:
+        if count & 1:
+            result = m if result is None else _matmul(result, m)
+        count >>= 1
+        if count:
+            m = _matmul(m, m)
+    return result
+
+
+def _repeat_block(R, r, kz, thickness, sigma2, start, count, last):
+    """
+    레이어 start..last 주기를 count 번 반복한 블록을 R 위에 적용합니다.
+    첫 주기의 윗면만 블록 위 레이어와의 계면이고, 나머지 주기의 윗면은 주기 마지막 레이어와의 계면입니다.
+    """
+    # 블록 아래쪽부터: 한 주기를 R 에 적용 (count - 1) 번은 주기 행렬 거듭제곱으로
+    if count > 1:
+        rest = None
+        for j in range(last, start, -1):
+            m = _layer_matrix(r[..., j, :], kz[..., j, :], thickness[..., j, :])
+            rest = m if rest is None else _matmul(m, rest)
+        r_inner = _fresnel(kz[..., last, :], kz[..., start, :], sigma2[..., start, :])
+        period = _layer_matrix(r_inner, kz[..., start, :], thickness[..., start, :])
+        if rest is not None:
+            period = _matmul(period, rest)
+        a, b, c, d = _matrix_power(period, count - 1)
+        R = (a * R + b) / (c * R + d)
+
+    # 첫 주기는 일반 Parratt 재귀 (윗면 = 블록 위 레이어와의 계면)
+    for j in range(last, start - 1, -1):
+        R_ph = R * np.exp(2j * kz[..., j, :] * thickness[..., j, :])
+        R = (r[..., j, :] + R_ph) / (1.0 + r[..., j, :] * R_ph)
+    return R
+
+
+class CompiledStack:
+    """
+    피팅용으로 미리 컴파일한 배열 기반 레이어 스택.
+    values: (3, N) 배열 [thickness, sld, roughness], 공기 쪽 레이어부터 기판 순서.
+    param_index: 자유 슬롯 각각이 values.ravel() 의 어느 위치인지.
+    tie: 자유 슬롯 각각이 파라미터 벡터 p 의 몇 번째 원소를 쓰는지 (링크된 슬롯은 같은 원소 공유).
+    repeats: 반복 블록 [(start, stop, count), ...] (parratt_reflectivity 참고)
+    """
+    __slots__ = ("values", "param_index", "param_map", "p0", "bounds", "tie", "repeats")
+
+    def __init__(self, values, param_index, param_map, p0, bounds, tie=None, repeats=()):
+        self.values = values
+        self.param_index = param_index
+        self.param_map = param_map
+        self.p0 = p0
+        self.bounds = bounds
+        self.tie = np.arange(len(param_index)) if tie is None else np.asarray(tie, dtype=int)
+        self.repeats = tuple(repeats)
+
+    @property
+    def n_layers(self):
+        return self.values.shape[1]
+
+    def expand(self, p):
+        """파라미터 벡터 (P,) 또는 배치 (B, P) -> (…, 3, N) 값 배열"""
+        p = np.asarray(p, dtype=float)[..., self.tie]
+        if p.ndim == 1:
+            v = self.values.copy()
+            v.reshape(-1)[self.param_index] = p
+            return v
+        v = np.broadcast_to(self.values, (p.shape[0],) + self.values.shape).copy()
+        v.reshape(p.shape[0], -1)[:, self.param_index] = p
+        return v
+
+    def reflectivity(self, q, p):
+        v = self.expand(p)
+        return parratt_reflectivity(q, v[..., 0, :], v[..., 1, :], v[..., 2, :], self.repeats)
+
+    def simulate(self, q):
+        """피팅 없이 현재 값 (values) 그대로 계산"""
+        return parratt_reflectivity(q, *self.values, self.repeats)
+
+    def to_layers(self, p, layers):
+        """피팅 결과를 원래 테이블 dict 리스트에 반영"""
+        new_layers = [L.copy() for L in layers]
+        for val, (row, key) in zip(np.asarray(p, dtype=float)[self.tie], self.param_map):
+            new_layers[row][key] = float(val)
+        return new_layers
@@ -1,14 +1,54 @@
 import plotly.graph_objects as go
 import numpy as np
 
+from app.logic.analysis import fft_spectrum
+
+# 화면 표시용 최대 포인트 수 (피팅은 항상 전체 해상도 사용)
+MAX_DISPLAY_POINTS = 2000
+
+# 메인 그래프 trace 순서 (Patch 로 부분 업데이트할 때 인덱스로 사용)
+TRACE_EXP, TRACE_AI, TRACE_FIT = 0, 1, 2
+
+def display_indices(y, max_points=MAX_DISPLAY_POINTS, log=True):
+    """
+    [Decimation]
+    bucket 별 min / max 포인트만 남기는 인덱스 (log=True 이면 log(y) 기준).
+    피크 / 골짜기 모양은 유지하면서 포인트 수를 max_points 이하로 줄입니다.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max(1, (max_points - 2) // 2)
+    size = int(np.ceil(n / n_buckets))
+    vals = np.full(n_buckets * size, np.nan)
+    vals[:n] = np.log10(np.clip(np.abs(y), 1e-300, None)) if log else y
+    vals = vals.reshape(n_buckets, size)
+    valid = ~np.isnan(vals).all(axis=1)
+
+    offset = np.arange(n_buckets)[valid] * size
+    lo = offset + np.nanargmin(vals[valid], axis=1)
+    hi = offset + np.nanargmax(vals[valid], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lo, hi]))
+
+def _decimate(q, *ys, max_points=MAX_DISPLAY_POINTS, log=True):
+    """첫 번째 y 로 인덱스를 고르고 q 와 모든 y 에 같은 인덱스 적용"""
+    if q is None or ys[0] is None or len(q) <= max_points:
+        return (q,) + ys
+    idx = display_indices(ys[0], max_points, log)
+    return (q[idx],) + tuple(None if y is None else np.asarray(y)[idx] for y in ys)
+
 def create_comparison_graph(q, i_exp, i_ai, i_fit):
     """
     3가지 라인을 그리는 메인 그래프
     1. Exp (Blue Dots)
     2. AI Prediction (Yellow/Orange Dashed)
     3. Final Fit (Red Solid)
+    데이터가 있으면 3개 trace 를 항상 같은 순서로 만들고, 값이 없는 trace 는 숨깁니다.
     """
     fig = go.Figure()
+    q, i_exp, i_ai, i_fit = _decimate(q, i_exp, i_ai, i_fit)
     
     # 1. Experimental Data (항상 표시)
     if i_exp is not None:
@@ -17,17 +57,15 @@ def create_comparison_graph(q, i_exp, i_ai, i_fit):
             marker=dict(size=4, color='#2563eb', symbol='circle-open', opacity=0.6)
         ))
     
-    # 2. AI Prediction (AI값이 있을 때만)
-    if i_ai is not None:
+        # 2. AI Prediction (AI값이 있을 때만 표시)
         fig.add_trace(go.Scatter(
-            x=q, y=i_ai, mode='lines', name='AI Prediction', 
+            x=q, y=i_ai, mode='lines', name='AI Prediction', visible=i_ai is not None,
             line=dict(color='#f59e0b', width=2, dash='dash') # Amber color
         ))
         
-    # 3. Final Fit (피팅값이 있을 때만)
-    if i_fit is not None:
+        # 3. Final Fit (피팅값이 있을 때만 표시)
         fig.add_trace(go.Scatter(
-            x=q, y=i_fit, mode='lines', name='Final Fit', 
+            x=q, y=i_fit, mode='lines', name='Final Fit', visible=i_fit is not None,
             line=dict(color='#dc2626', width=3) # Red solid
         ))
 
@@ -46,13 +84,11 @@ def create_comparison_graph(q, i_exp, i_ai, i_fit):
 
 def create_residual_graph(q, i_exp, i_target, label="Resid"):
     """Residual Graph 생성"""
-    min_len = min(len(i_exp), len(i_target))
-    # 로그 차이 계산
-    diff = np.log10(i_exp[:min_len]) - np.log10(i_target[:min_len])
+    q, diff = residual_trace(q, i_exp, i_target)
     
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=q[:min_len], y=diff, mode='lines', name=label,
+        x=q, y=diff, mode='lines', name=label,
         line=dict(color='#64748b', width=1), 
         fill='tozeroy', fillcolor='rgba(100, 116, 139, 0.2)'
     ))
@@ -65,14 +101,17 @@ def create_residual_graph(q, i_exp, i_target, label="Resid"):
     )
     return fig
 
+def residual_trace(q, i_exp, i_target):
+    """Δ log R (표시용으로 decimation 적용)"""
+    min_len = min(len(i_exp), len(i_target))
+    # 로그 차이 계산
+    diff = np.log10(i_exp[:min_len]) - np.log10(i_target[:min_len])
+    q, diff = _decimate(q[:min_len], diff, log=False)
+    return q, diff
+
 def create_fft_graph(q, i_exp):
     """FFT Graph 생성"""
-    r_norm = i_exp * (q ** 4)
-    r_norm = r_norm - np.mean(r_norm)
-    n = len(q)
-    d_q = q[1] - q[0] if n > 1 else 0.01
-    fft_amp = np.abs(np.fft.rfft(r_norm))
-    z_space = np.fft.rfftfreq(n, d=d_q) * 2 * np.pi 
+    z_space, fft_amp = _decimate(*fft_spectrum(q, i_exp), log=False)
     
     fig = go.Figure()
     fig.add_trace(go.Scatter(
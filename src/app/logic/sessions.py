@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DB_PATH = os.environ.get("XRR_DB_PATH", os.path.join(".cache", "fits.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fits (
+    id              INTEGER PRIMARY KEY,
+    created_at      REAL NOT NULL,
+    sample          TEXT,
+    source          TEXT,
+    data_hash       TEXT NOT NULL,
+    wavelength      REAL,
+    n_points        INTEGER,
+    success         INTEGER,
+    cost            REAL,
+    redchi          REAL,
+    nfev            INTEGER,
+    njev            INTEGER,
+    wall_time_s     REAL,
+    message         TEXT,
+    settings        TEXT,
+    initial_layers  TEXT NOT NULL,
+    final_layers    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fit_layers (
+    fit_id          INTEGER NOT NULL REFERENCES fits(id) ON DELETE CASCADE,
+    position        INTEGER NOT NULL,
+    material        TEXT,
+    thickness       REAL,
+    sld             REAL,
+    roughness       REAL,
+    thickness_err   REAL,
+    sld_err         REAL,
+    roughness_err   REAL,
+    PRIMARY KEY (fit_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_fits_sample ON fits(sample, created_at);
+CREATE INDEX IF NOT EXISTS idx_fits_created ON fits(created_at);
+CREATE INDEX IF NOT EXISTS idx_fits_hash ON fits(data_hash, created_at);
+CREATE INDEX IF NOT EXISTS idx_layers_material ON fit_layers(material, fit_id);
+"""
+
+_FIT_COLUMNS = ("created_at", "sample", "source", "data_hash", "wavelength", "n_points", "success", "cost", "redchi",
+                "nfev", "njev", "wall_time_s", "message", "settings", "initial_layers", "final_layers")
+_KEYS = ("thickness", "sld", "roughness")
+_INSERT_FIT = f"INSERT INTO fits ({', '.join(_FIT_COLUMNS)}) VALUES ({', '.join('?' * len(_FIT_COLUMNS))})"
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, default=float)
+
+
+class SessionDB:
+    """
+    [Fit Session Database]
+    피팅 세션 기록 (로컬 SQLite).
+    fits: 세션당 한 행 (데이터 hash, 파장, 시작 / 최종 스택 JSON, cost, 시간, 엔진 설정)
+    fit_layers: 최종 스택의 레이어별 값 / 불확도 (재료별 조회, CSV export 용)
+    sample / 날짜 / 데이터 hash / 재료에 인덱스가 있어서 이력 조회, 다시 열기 (reopen), export 가 쿼리 한 번입니다.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connect(self):
+        """스레드 / 프로세스별 연결 (background job 프로세스도 같은 파일을 씀)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # --- 기록 ---
+    def record_fits(self, records):
+        """
+        세션 여러 개를 한 트랜잭션으로 기록 -> id 리스트.
+        record: {"sample", "source", "data_hash", "wavelength", "n_points", "initial_layers", "final_layers",
+                 "info" (run_fitting_algorithm full_output), "wall_time_s", "settings", "created_at" (선택)}
+        """
+        if not records:
+            return []
+        conn = self._connect()
+        with conn:
+            # id 는 SQLite (INTEGER PRIMARY KEY) 가 정함
+            ids = [conn.execute(_INSERT_FIT, self._fit_row(r)).lastrowid for r in records]
+            conn.executemany(
+                "INSERT INTO fit_layers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for fit_id, r in zip(ids, records) for row in self._layer_rows(fit_id, r)],
+            )
+        return ids
+
+    def record_fit(self, **record):
+        return self.record_fits([record])[0]
+
+    @staticmethod
+    def _fit_row(r):
+        info = r.get("info") or {}
+        return (
+            r.get("created_at") or time.time(), r.get("sample"), r.get("source"), r["data_hash"],
+            _float(r.get("wavelength")), r.get("n_points") or info.get("n_points"),
+            int(bool(info.get("success"))), _float(info.get("cost")), _float(info.get("redchi")),
+            info.get("nfev"), info.get("njev"), _float(r.get("wall_time_s")), info.get("message"),
+            _json(r.get("settings") or {}), _json(r["initial_layers"]), _json(r["final_layers"]),
+        )
+
+    @staticmethod
+    def _layer_rows(fit_id, r):
+        uncertainties = (r.get("info") or {}).get("uncertainties") or []
+        rows = []
+        for i, layer in enumerate(r["final_layers"]):
+            errs = uncertainties[i] if i < len(uncertainties) else {}
+            rows.append((fit_id, i, layer.get("layer"), *(_float(layer.get(k)) for k in _KEYS),
+                         *(_float(errs.get(k)) for k in _KEYS)))
+        return rows
+
+    # --- 조회 ---
+    @staticmethod
+    def _select(sample=None, data_hash=None, material=None, since=None, until=None, limit=None):
+        """조건 -> (fits 를 고르는 SELECT (최신 순), 인자)"""
+        where, args = [], []
+        for clause, val in (("sample = ?", sample), ("data_hash = ?", data_hash), ("created_at >= ?", since),
+                            ("created_at < ?", until),
+                            ("id IN (SELECT fit_id FROM fit_layers WHERE material = ?)", material)):
+            if val is not None:
+                where.append(clause)
+                args.append(val)
+        sql = "SELECT * FROM fits" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY created_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return sql, args
+
+    def query(self, **filters):
+        """
+        조건에 맞는 세션 (최신 순) -> dict 리스트 (layers / settings 는 JSON 을 풀어서).
+        filters: sample, data_hash, material (최종 스택에 그 이름의 레이어가 있는 세션),
+                 since / until (unix time), limit
+        """
+        rows = []
+        for row in self._connect().execute(*self._select(**filters)):
+            d = dict(row)
+            for key in ("settings", "initial_layers", "final_layers"):
+                d[key] = json.loads(d[key]) if d[key] else None
+            rows.append(d)
+        return rows
+
+    def latest(self, sample=None, data_hash=None):
+        rows = self.query(sample=sample, data_hash=data_hash, limit=1)
+        return rows[0] if rows else None
+
+    def reopen(self, data_hash):
+        """
+        데이터 hash -> (가장 최근 성공한 세션 dict (없으면 None), 그 데이터의 저장된 세션 수), 쿼리 한 번.
+        같은 파일을 다시 열 때 마지막 피팅 스택을 복원하는 데 씁니다.
+        """
+        row = self._connect().execute(
+            "SELECT *, COUNT(*) OVER () AS n_saved FROM fits WHERE data_hash = ? "
+            "ORDER BY success DESC, created_at DESC LIMIT 1", (data_hash,)
+        ).fetchone()
+        if row is None:
+            return None, 0
+        d = dict(row)
+        n_saved = d.pop("n_saved")
+        if not d["success"]:
+            return None, n_saved
+        for key in ("settings", "initial_layers", "final_layers"):
+            d[key] = json.loads(d[key]) if d[key] else None
+        return d, n_saved
+
+    def count(self, **filters):
+        sql, args = self._select(**filters)
+        return self._connect().execute(f"SELECT COUNT(*) FROM ({sql})", args).fetchone()[0]
+
+    def export_rows(self, **filters):
+        """
+        세션 + 레이어를 JOIN 쿼리 한 번으로 읽어 batch 결과와 같은 형식의 평평한 행으로
+        (L{i}_{재료}_{key}, L{i}_{재료}_{key}_err), 최신 순
+        """
+        sql, args = self._select(**filters)
+        cursor = self._connect().execute(
+            f"SELECT f.id, f.created_at, f.sample, f.source, f.data_hash, f.wavelength, f.success, f.cost, "
+            f"f.redchi, f.nfev, f.njev, f.wall_time_s, l.position, l.material, "
+            f"l.thickness, l.sld, l.roughness, l.thickness_err, l.sld_err, l.roughness_err "
+            f"FROM ({sql}) f LEFT JOIN fit_layers l ON l.fit_id = f.id ORDER BY f.created_at DESC, f.id, l.position",
+            args,
+        )
+        rows, out = [], None
+        for r in cursor:
+            if out is None or out["id"] != r["id"]:
+                out = {
+                    "id": r["id"],
+                    "date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["created_at"])),
+                    "sample": r["sample"], "source": r["source"], "data_hash": r["data_hash"],
+                    "wavelength": r["wavelength"], "success": bool(r["success"]), "cost": r["cost"],
+                    "redchi": r["redchi"], "nfev": r["nfev"], "iterations": r["njev"],
+                    "wall_time_s": r["wall_time_s"],
+                }
+                rows.append(out)
+            if r["position"] is None:
+                continue
+            prefix = f"L{r['position']}_{r['material'] or '-'}"
+            for key in _KEYS:
+                out[f"{prefix}_{key}"] = r[key]
+                if r[f"{key}_err"] is not None:
+                    out[f"{prefix}_{key}_err"] = r[f"{key}_err"]
+        return rows
+
+    def delete(self, ids):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM fits WHERE id = ?", [(i,) for i in ids])
+
+
+session_db = SessionDB()
@@ -1,21 +1,46 @@
 import base64
-import io
-import pandas as pd
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 
 from reflecto.simulate.simul_genx import param2refl, ParamSet
 
+from app.instrumentation import metrics
+from app.logic.instrument import Instrument
+from app.logic.layers import LayerStack
+from app.logic.loader import load_xrr_text
+
+class RateLimiter:
+    """호출 빈도를 max_rate_hz 이하로 제한 (진행 상황 그래프 갱신용)"""
+
+    def __init__(self, max_rate_hz=4.0):
+        self.interval = 1.0 / max_rate_hz
+        self._last = float("-inf")
+
+    def ready(self):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+def read_xrr_file(path, errors=False):
+    """로컬 데이터 파일 -> (q, intensity) 배열, errors=True 이면 (q, intensity, dR 또는 None)"""
+    with open(path, 'rb') as f:
+        data = load_xrr_text(f.read())
+    if errors:
+        return data[0], data[1], data[2] if len(data) > 2 else None
+    return data[0], data[1]
+
+@metrics.timed("parse_contents")
 def parse_contents(contents, filename):
-    """업로드된 파일을 파싱하여 Dict 형태로 반환"""
+    """업로드된 파일을 파싱하여 (n_columns, N) float64 배열 [q, intensity, (dR)] 로 반환"""
     content_type, content_string = contents.split(',')
     decoded = base64.b64decode(content_string)
     try:
-        df = pd.read_csv(
-            io.StringIO(decoded.decode('utf-8')), 
-            sep=None, engine='python', header=None, names=['q', 'intensity']
-        )
-        df = df.apply(pd.to_numeric, errors='coerce').dropna()
-        return df.to_dict('records')
+        return load_xrr_text(decoded)
     except Exception as e:
         print(f"Error parsing file: {e}")
         return None
@@ -31,35 +56,107 @@ def reset_suggestion_table(layers):
         "roughness": "?"
     } for item in layers]
 
-def calculate_xrr_curve(q, layers):
-    """물리 엔진을 이용한 시뮬레이션 (0~1 Normalized)"""
+class SimulationCache:
+    """
+    (q-grid hash, layer stack) -> 시뮬레이션 결과 LRU 캐시.
+    레이어가 바뀌지 않은 곡선은 UI 이벤트마다 다시 계산하지 않습니다.
+    Flask 는 callback 을 여러 스레드에서 실행하므로 OrderedDict 는 잠금 안에서만 다룹니다 (계산은 잠금 밖).
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                value = self._data[key]
+            else:
+                self.misses += 1
+                value = None
+        if value is not None:
+            metrics.count("simulation_cache.hits")
+            return value
+        metrics.count("simulation_cache.misses")
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def info(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+simulation_cache = SimulationCache()
+
+def q_grid_hash(q):
+    q = np.ascontiguousarray(q, dtype=float)
+    return hashlib.blake2b(q.tobytes(), digest_size=16).hexdigest()
+
+def layers_key(layers):
+    """레이어 dict 리스트 (또는 LayerStack) -> 해시 가능한 키 ("10" 과 10.0 은 같은 키)"""
+    return LayerStack.from_table(layers).key()
+
+def stack_paramsets(stack):
+    """LayerStack -> param2refl 입력 (film ParamSet 리스트, SiO₂ ParamSet) / 필수 레이어가 없으면 None"""
+    films, sio2, _ = stack.model_rows(unroll=True)
+    if not films or sio2 is None:
+        return None
+    t = np.nan_to_num(stack.thickness, nan=0.0, posinf=0.0)
+    r = np.nan_to_num(stack.roughness, nan=0.0)
+    s = np.nan_to_num(stack.sld, nan=0.0)
+    return [ParamSet(t[i], r[i], s[i]) for i in films], ParamSet(t[sio2], r[sio2], s[sio2])
+
+@metrics.timed("calculate_xrr_curve")
+def calculate_xrr_curve(q, layers, instrument=None):
+    """
+    물리 엔진을 이용한 시뮬레이션 (0~1 Normalized), 결과는 simulation_cache 에 저장.
+    instrument 가 있으면 분해능 / footprint 까지 적용합니다 (scale / background 는 Instrument.intensity 에서 데이터에 맞춤).
+    """
     if not layers or q is None or len(q) == 0:
         return np.zeros_like(q) if q is not None else []
 
-    params = []
-    sio2_param = None
-    
-    for layer in layers:
-        try:
-            t = float(layer.get("thickness", 0)) if str(layer.get("thickness")) not in ["∞", "?"] else 0
-            r = float(layer.get("roughness", 0)) if str(layer.get("roughness")) != "?" else 0
-            s = float(layer.get("sld", 0)) if str(layer.get("sld")) != "?" else 0
-            
-            name = layer.get("layer", "")
-            
-            if "Film" in name:
-                params.append(ParamSet(t, r, s))
-            elif "SiO" in name: # SiO2, SiO
-                sio2_param = ParamSet(t, r, s)
-        except (ValueError, TypeError):
-            continue
+    stack = LayerStack.from_table(layers)
+    instrument = Instrument.from_dict(instrument) if instrument is not None else None
+    if instrument is None or instrument.is_ideal:
+        key = (q_grid_hash(q), stack.key())
+        return simulation_cache.get_or_compute(key, lambda: _simulate_xrr_curve(q, stack))
+
+    kernel = instrument.kernel(q)
+    key = (q_grid_hash(q), stack.key(), instrument.kernel_key())
+    return simulation_cache.get_or_compute(key, lambda: kernel.apply(_simulate_xrr_curve(kernel.q_calc, stack)))
 
+def _simulate_xrr_curve(q, stack):
+    """param2refl 호출 (캐시 미스일 때만), 반복 블록이 있으면 주기 전달 행렬을 쓰는 native 커널"""
+    if (stack.block >= 0).any():
+        compiled = stack.compile()
+        if compiled is None:
+            return np.zeros_like(q)
+        return compiled.simulate(q) + 1e-10
+
+    params = stack_paramsets(stack)
     # 필수 파라미터가 없으면 0 반환
-    if not params or sio2_param is None:
+    if params is None:
         return np.zeros_like(q)
 
     try:
-        intensity = param2refl(q, params, sio2_param)
+        with metrics.timer("param2refl"):
+            intensity = param2refl(q, *params)
         return np.abs(intensity) + 1e-10
     except Exception as e:
         print(f"Simulation Error: {e}")
@@ -67,19 +164,6 @@ def calculate_xrr_curve(q, layers):
 
 def format_table_data(layers_data):
     """테이블 표시용 데이터 포맷팅"""
-    table_data = []
-    if layers_data:
-        for layer in layers_data:
-            try:
-                t = float(layer.get('thickness', 0)) if str(layer.get('thickness')) not in ["∞", "?"] else 0
-                d = float(layer.get('sld', 0)) if str(layer.get('sld')) != "?" else 0
-                r = float(layer.get('roughness', 0)) if str(layer.get('roughness')) != "?" else 0
-                table_data.append({
-                    "layer": layer.get("layer", "-"),
-                    "thickness": f"{t:.1f}",
-                    "sld": f"{d:.2f}", # SLD는 그대로 표시
-                    "roughness": f"{r:.1f}"
-                })
-            except:
-                table_data.append(layer)
-    return table_data
\ No newline at end of file
+    if not layers_data:
+        return []
+    return LayerStack.from_table(layers_data).to_table(formatted=True)
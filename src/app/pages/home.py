@@ -2,6 +2,8 @@ from pathlib import Path
 import dash
 from dash import html, dcc, callback, Input, Output, no_update
 
+from app.instrumentation import instrumented
+
 dash.register_page(__name__, path="/")
 
 layout = html.Div(
@@ -61,6 +63,7 @@ layout = html.Div(
     Input("btn-download-sample", "n_clicks"),
     prevent_initial_call=True
 )
+@instrumented
 def download_sample(n_clicks):
     if not n_clicks:
         return no_update
@@ -39,7 +39,37 @@ def render_sidebar():
                 
             ], style={'marginTop': '10px'}),
             
-            html.Div("Default: Cu K-α (1.5406 Å)", style={'fontSize': '0.75rem', 'color': '#94a3b8', 'marginTop': '-5px'})
+            html.Div("Default: Cu K-α (1.5406 Å)", style={'fontSize': '0.75rem', 'color': '#94a3b8', 'marginTop': '-5px'}),
+
+            # (3) Instrument (분해능 / footprint / scale / background)
+            html.Div([
+                html.Label("Instrument", style={'fontSize': '0.85rem', 'fontWeight': '600', 'color': '#334155'}),
+                html.Div([
+                    dcc.Dropdown(
+                        id='instrument-resolution-mode',
+                        options=[
+                            {'label': 'Ideal', 'value': 'none'},
+                            {'label': 'dq/q (%)', 'value': 'dq/q'},
+                            {'label': 'dθ (°)', 'value': 'dtheta'},
+                        ],
+                        value='none', clearable=False, style={'flex': '1', 'fontSize': '0.8rem'}
+                    ),
+                    dcc.Input(id='instrument-resolution', type='number', placeholder='FWHM', min=0, step=0.001,
+                              className='param-input', style={'flex': '1'}),
+                ], className="input-row", style={'alignItems': 'center'}),
+                html.Div([
+                    dcc.Input(id='instrument-sample-length', type='number', placeholder='Sample (mm)', min=0,
+                              className='param-input', style={'flex': '1'}),
+                    dcc.Input(id='instrument-beam-width', type='number', placeholder='Beam (mm)', min=0, step=0.01,
+                              className='param-input', style={'flex': '1'}),
+                ], className="input-row"),
+                html.Div([
+                    dcc.Input(id='instrument-scale', type='number', placeholder='Scale (auto)', min=0,
+                              className='param-input', style={'flex': '1'}),
+                    dcc.Input(id='instrument-background', type='number', placeholder='Background (auto)', min=0,
+                              className='param-input', style={'flex': '1'}),
+                ], className="input-row"),
+            ], style={'marginTop': '10px'}),
 
         ], className="sidebar-section"),
 
@@ -69,7 +99,17 @@ def render_sidebar():
                     {'name': 'd(nm)', 'id': 'thickness', 'type': 'numeric', 'editable': True},
                     {'name': 'ρ', 'id': 'sld', 'type': 'numeric', 'editable': True},
                     {'name': 'σ', 'id': 'roughness', 'type': 'numeric', 'editable': True},
+                    {'name': 'Fix', 'id': 'fix', 'editable': True},
+                    {'name': 'Link', 'id': 'link', 'editable': True},
+                    {'name': 'Bounds', 'id': 'bounds', 'editable': True},
+                    {'name': '×N', 'id': 'repeat', 'editable': True},
                 ],
+                tooltip_header={
+                    'fix': '고정할 파라미터: d, ρ, σ 또는 all',
+                    'link': '같은 그룹끼리 하나의 파라미터로 피팅: σ:A (또는 A = d, ρ, σ 모두)',
+                    'bounds': '피팅 범위: d:100~200, σ:0~5',
+                    'repeat': '반복 횟수: 값이 같은 연속된 Film 행이 한 주기 [A/B]×N (붙어 있는 다른 블록은 A:20, B:20)',
+                },
                 data=INITIAL_LAYERS,
                 row_deletable=True,
                 style_as_list_view=True,
@@ -98,11 +138,37 @@ def render_sidebar():
         html.Div([
             html.Div("4. Fitting Engine", className="sidebar-title"),
             html.Button("🤖 Initialize AI Guess", id="btn-init-ai", className="btn-secondary"),
+            html.Button("📚 Lookup Guess (recipe)", id="btn-init-lookup", className="btn-secondary",
+                        title="현재 레이어 테이블을 레시피로 미리 계산한 곡선 라이브러리에서 가장 가까운 스택",
+                        style={'marginTop': '10px'}),
             html.Button("▶ Start Fitting", id="btn-start-fit", className="btn-primary", style={'marginTop': '10px'}),
+            dcc.Checklist(
+                id="fit-options",
+                options=[
+                    {"label": " Warm start (AI + FFT)", "value": "warm"},
+                    {"label": " Global search (multi-start)", "value": "global"},
+                    {"label": " Mask below critical angle", "value": "mask_critical"},
+                    {"label": " Reject outliers", "value": "outliers"},
+                    {"label": " Start from cached fits", "value": "cache_warm"},
+                ],
+                value=[],
+                style={'fontSize': '0.8rem', 'color': '#334155', 'marginTop': '8px'}
+            ),
+            dcc.Dropdown(
+                id="fit-weighting",
+                options=[
+                    {"label": "Residual: log R", "value": "log"},
+                    {"label": "Residual: linear (σ = dR)", "value": "linear"},
+                    {"label": "Residual: R·q⁴", "value": "q4"},
+                ],
+                value="log", clearable=False,
+                style={'fontSize': '0.8rem', 'marginTop': '8px'}
+            ),
+            html.Button("■ Cancel", id="btn-cancel-job", className="btn-secondary", style={'marginTop': '10px'}),
             
             html.Div([
-                html.Div("Status: Ready", style={'fontWeight': 'bold', 'fontSize': '0.85rem'}),
-                html.Div("χ²: 0.0000", style={'color': '#64748b', 'fontSize': '0.8rem'})
+                html.Div("Status: Ready", id="job-status", style={'fontWeight': 'bold', 'fontSize': '0.85rem'}),
+                html.Div("χ²: -", id="fit-chi2", style={'color': '#64748b', 'fontSize': '0.8rem'})
             ], style={'marginTop': '15px', 'background': '#f8fafc', 'padding': '10px', 'borderRadius': '5px'})
         ], className="sidebar-section", style={'borderBottom': 'none'}),
 
@@ -51,7 +51,8 @@ def render_right_panel():
                                 style_header={'backgroundColor': '#fff', 'fontWeight': 'bold', 'borderBottom': '2px solid #e2e8f0'},
                                 style_as_list_view=True
                             ),
-                            html.Button("💾 Export CSV", id="btn-export", className="btn-primary", style={'marginTop': 'auto', 'padding': '8px'})
+                            html.Button("💾 Export CSV", id="btn-export", className="btn-primary", style={'marginTop': 'auto', 'padding': '8px'}),
+                            dcc.Download(id="download-fits"),
                         ], style={'padding': '10px', 'display': 'flex', 'flexDirection': 'column', 'height': '100%'})
                     ], 
                     style={'borderBottom': '1px solid #e2e8f0'}, 
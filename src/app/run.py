@@ -1,5 +1,9 @@
+import logging
+
 from .app import app
 from app import layout
 
 def run():
-    app.run(port=8050, debug=True)
\ No newline at end of file
+    # callback 계측 로그 (app.instrumentation)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    app.run(port=8050, debug=True)
@@ -0,0 +1,264 @@
+"""
+AI 학습용 시뮬레이션 데이터 생성.
+
+    python -m app.training_data shards/ --n 1000000 --shard-size 100000 --seed 0
+
+MATERIAL_DB 의 SLD 를 prior 로 레이어 스택을 샘플링하고, 같은 레이어 수끼리 묶어 배치로 시뮬레이션한 뒤
+고정 크기 .npy shard (memory-mapped) 에 바로 씁니다. shard 별 seed 는 SeedSequence 에서 나누므로
+워커 수 / 실행 순서와 무관하게 같은 seed 면 같은 데이터가 나옵니다.
+
+출력 디렉토리:
+    manifest.json                   설정 / priors / shard 목록
+    q.npy                           (n_q,) 공통 q-grid
+    shard_00000.curves.npy          (n, n_q) float32 log10 R
+    shard_00000.params.npy          (n, max_films + 1, 3) float32 [thickness, sld, roughness]
+                                    공기 쪽 film 부터, 마지막 행 = SiO₂, 없는 film 은 nan
+    shard_00000.films.npy           (n,) int8 film 수
+    shard_00000.materials.npy       (n, max_films) int8 MATERIAL_DB 인덱스 (-1 = 없음)
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from reflecto.simulate.simul_genx import param2refl, ParamSet
+
+from app.logic.instrument import Instrument
+from app.logic.layers import SUBSTRATE_DEFAULT
+from app.logic.materials import MATERIAL_DB
+from app.logic.parratt import parratt_reflectivity
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+# 샘플링 범위 (SLD 는 MATERIAL_DB 값 × 밀도 비율)
+PRIORS = {
+    "n_films": (1, 3),
+    "thickness": (10.0, 1000.0),       # Å, log-uniform
+    "roughness": (0.0, 15.0),          # Å, 두께의 절반 이하
+    "density": (0.8, 1.05),            # 박막은 bulk 보다 밀도가 낮은 경우가 많음
+    "sio2_thickness": (5.0, 30.0),
+    "sio2_roughness": (1.0, 6.0),
+    "sio2_density": (0.9, 1.05),
+}
+
+
+def material_slds():
+    """MATERIAL_DB -> (formula 리스트, SLD 배열), SiO₂ 인덱스"""
+    formulas = [m["formula"] for m in MATERIAL_DB]
+    slds = np.array([float(m["sld"]) for m in MATERIAL_DB])
+    return formulas, slds, formulas.index("SiO₂")
+
+
+def sample_stacks(rng, n, max_films, priors=PRIORS):
+    """
+    n 개의 레이어 스택 샘플링.
+    Returns: params (n, max_films + 1, 3), films (n,), materials (n, max_films)
+    """
+    _, slds, sio2_index = material_slds()
+    lo_films, hi_films = priors["n_films"]
+    films = rng.integers(lo_films, min(hi_films, max_films) + 1, size=n)
+    materials = rng.integers(0, len(slds), size=(n, max_films))
+    present = np.arange(max_films) < films[:, None]
+    materials[~present] = -1
+
+    params = np.full((n, max_films + 1, 3), np.nan)
+    t_lo, t_hi = priors["thickness"]
+    thickness = np.exp(rng.uniform(np.log(t_lo), np.log(t_hi), size=(n, max_films)))
+    sld = slds[np.maximum(materials, 0)] * rng.uniform(*priors["density"], size=(n, max_films))
+    roughness = np.minimum(rng.uniform(*priors["roughness"], size=(n, max_films)), thickness / 2)
+    params[:, :max_films] = np.where(present[..., None], np.stack([thickness, sld, roughness], axis=-1), np.nan)
+
+    params[:, -1, 0] = rng.uniform(*priors["sio2_thickness"], size=n)
+    params[:, -1, 1] = slds[sio2_index] * rng.uniform(*priors["sio2_density"], size=n)
+    params[:, -1, 2] = rng.uniform(*priors["sio2_roughness"], size=n)
+    return params, films.astype(np.int8), materials.astype(np.int8)
+
+
+def to_paramsets(params, n_films):
+    """샘플 하나 -> param2refl 입력 (film ParamSet 리스트 (SiO₂ 쪽부터, 테이블 순서), SiO₂ ParamSet)"""
+    films = [ParamSet(t, r, s) for t, s, r in params[:n_films][::-1]]
+    t, s, r = params[-1]
+    return films, ParamSet(t, r, s)
+
+
+def simulate_batch(q, params, films, kernel=None, engine="native"):
+    """
+    샘플 배치 -> (n, n_q) 반사율.
+    engine="native": film 수가 같은 샘플끼리 한 번에 Parratt 커널을 돌립니다 (레이어: film… -> SiO₂ -> 기판).
+    engine="param2refl": 앱의 기준 시뮬레이션으로 곡선마다 계산 (느림, 검증용).
+    kernel 이 있으면 kernel.q_calc 에서 계산한 뒤 분해능을 적용합니다.
+    """
+    q_calc = kernel.q_calc if kernel is not None else q
+    out = np.empty((len(params), len(q_calc)))
+    if engine == "param2refl":
+        for i in range(len(params)):
+            out[i] = np.abs(param2refl(q_calc, *to_paramsets(params[i], films[i])))
+        return kernel.apply(out) if kernel is not None else out
+    for k in np.unique(films):
+        idx = np.flatnonzero(films == k)
+        layers = np.concatenate([params[idx, :k], params[idx, -1:]], axis=1)
+        substrate = np.broadcast_to([np.inf, SUBSTRATE_DEFAULT["sld"], SUBSTRATE_DEFAULT["roughness"]],
+                                    (len(idx), 1, 3))
+        layers = np.concatenate([layers, substrate], axis=1)
+        out[idx] = parratt_reflectivity(q_calc, np.nan_to_num(layers[..., 0], posinf=0.0), layers[..., 1], layers[..., 2])
+    return kernel.apply(out) if kernel is not None else out
+
+
+def add_counting_noise(rng, R, flux=(1e5, 1e8), background=(0.5, 5.0)):
+    """곡선별 flux (log-uniform) / background 로 Poisson 계수 노이즈를 넣고 다시 반사율 단위로"""
+    n = len(R)
+    f = np.exp(rng.uniform(np.log(flux[0]), np.log(flux[1]), size=(n, 1)))
+    b = rng.uniform(*background, size=(n, 1))
+    return np.maximum(rng.poisson(R * f + b) - b, 0.5) / f
+
+
+def generate_shard(out_dir, index, n, seed, config):
+    """
+    워커 프로세스: shard 하나를 batch_size 단위로 샘플링 / 시뮬레이션해서 memmap 에 기록.
+    임시 이름으로 쓴 뒤 끝나면 이름을 바꾸므로, 완성된 shard 만 최종 파일명으로 존재합니다.
+    """
+    out_dir = Path(out_dir)
+    # SeedSequence(seed).spawn(...)[index] 와 같은 스트림 -> 워커 수 / 순서와 무관
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    q = np.load(out_dir / "q.npy")
+    max_films = config["max_films"]
+    instrument = Instrument(mode="dq/q", resolution=config["resolution"]) if config["resolution"] else None
+    kernel = instrument.kernel(q) if instrument is not None else None
+
+    names = shard_files(index)
+    shapes = {
+        "curves": ((n, len(q)), np.float32),
+        "params": ((n, max_films + 1, 3), np.float32),
+        "films": ((n,), np.int8),
+        "materials": ((n, max_films), np.int8),
+    }
+    arrays = {key: open_memmap(out_dir / (names[key] + ".tmp"), mode="w+", dtype=dtype, shape=shape)
+              for key, (shape, dtype) in shapes.items()}
+
+    batch_size = config["batch_size"]
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        params, films, materials = sample_stacks(rng, stop - start, max_films, config["priors"])
+        R = simulate_batch(q, params, films, kernel, config["engine"])
+        if config["noise"]:
+            R = add_counting_noise(rng, R)
+        arrays["curves"][start:stop] = np.log10(np.maximum(R, 1e-12))
+        arrays["params"][start:stop] = params
+        arrays["films"][start:stop] = films
+        arrays["materials"][start:stop] = materials
+
+    for arr in arrays.values():
+        arr.flush()
+    arrays.clear()
+    for name in names.values():
+        os.replace(out_dir / (name + ".tmp"), out_dir / name)
+    return {"index": index, "n": n, "files": names}
+
+
+def shard_files(index):
+    return {key: f"shard_{index:05d}.{key}.npy" for key in ("curves", "params", "films", "materials")}
+
+
+def _shard_complete(out_dir, index, n):
+    """shard 파일이 모두 있고 곡선 수가 n 이면 True (n 을 늘려 다시 돌리면 마지막 shard 는 새로 생성)"""
+    names = shard_files(index)
+    if not all((out_dir / name).exists() for name in names.values()):
+        return False
+    return np.load(out_dir / names["curves"], mmap_mode="r").shape[0] == n
+
+
+def generate(out_dir, n_total, shard_size=100_000, seed=0, q=None, max_films=3, resolution=0.0, noise=False,
+             batch_size=512, workers=None, priors=PRIORS, engine="native"):
+    """
+    [Training Data Generator]
+    n_total 개의 곡선을 shard 로 나눠 ProcessPool 에서 생성합니다 (manifest.json 은 먼저 기록).
+    이미 완성된 shard 는 건너뛰므로 중단된 실행을 같은 설정으로 다시 돌리면 이어서 생성합니다.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    q = np.linspace(0.005, 0.3, 512) if q is None else np.asarray(q, dtype=float)
+    config = {"max_films": max_films, "resolution": resolution, "noise": noise, "batch_size": batch_size,
+              "priors": priors, "engine": engine}
+
+    manifest_path = out_dir / MANIFEST
+    if manifest_path.exists():
+        old = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if (old["seed"], old["shard_size"], old["config"]) != (seed, shard_size, json.loads(json.dumps(config))) \
+                or not np.array_equal(np.load(out_dir / "q.npy"), q):
+            raise ValueError(f"{out_dir} already holds a dataset with different settings")
+    np.save(out_dir / "q.npy", q)
+
+    sizes = [min(shard_size, n_total - s) for s in range(0, n_total, shard_size)]
+    todo = [i for i, n in enumerate(sizes) if not _shard_complete(out_dir, i, n)]
+    manifest = {
+        "version": FORMAT_VERSION,
+        "seed": seed,
+        "n_total": n_total,
+        "shard_size": shard_size,
+        "n_q": len(q),
+        "q_range": [float(q.min()), float(q.max())],
+        "fields": ["thickness", "sld", "roughness"],
+        "materials": material_slds()[0],
+        "substrate": SUBSTRATE_DEFAULT,
+        "config": config,
+        "shards": [{"index": i, "n": n, "files": shard_files(i)} for i, n in enumerate(sizes)],
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"🚀 Generating {n_total} curves in {len(sizes)} shards ({len(sizes) - len(todo)} already done)...")
+
+    start = time.perf_counter()
+    if todo:
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(generate_shard, out_dir, i, sizes[i], seed, config)
+                       for i in todo]
+            for done, fut in enumerate(as_completed(futures), 1):
+                info = fut.result()
+                print(f"✅ [{done}/{len(todo)}] shard {info['index']} ({info['n']} curves)")
+
+    elapsed = time.perf_counter() - start
+    if todo:
+        n_new = sum(sizes[i] for i in todo)
+        print(f"✅ Done in {elapsed:.1f}s ({n_new / max(elapsed, 1e-9) * 3600:.3g} curves/hour) -> {out_dir}")
+    return manifest
+
+
+def load_shards(out_dir):
+    """manifest 를 읽어 (q, [shard 별 {"curves", "params", "films", "materials"} 읽기 전용 memmap]) 반환"""
+    out_dir = Path(out_dir)
+    manifest = json.loads((out_dir / MANIFEST).read_text(encoding="utf-8"))
+    shards = [{key: np.load(out_dir / name, mmap_mode="r") for key, name in shard["files"].items()}
+              for shard in manifest["shards"]]
+    return np.load(out_dir / "q.npy"), shards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated XRR training data generator")
+    parser.add_argument("out", help="출력 디렉토리")
+    parser.add_argument("--n", type=int, default=100_000, help="생성할 곡선 수")
+    parser.add_argument("--shard-size", type=int, default=100_000, help="shard 당 곡선 수")
+    parser.add_argument("--seed", type=int, default=0, help="난수 seed (같은 seed = 같은 데이터)")
+    parser.add_argument("--q-min", type=float, default=0.005, help="q 최소값 (Å⁻¹)")
+    parser.add_argument("--q-max", type=float, default=0.3, help="q 최대값 (Å⁻¹)")
+    parser.add_argument("--n-q", type=int, default=512, help="q 포인트 수")
+    parser.add_argument("--max-films", type=int, default=3, help="최대 film 레이어 수")
+    parser.add_argument("--resolution", type=float, default=0.0, help="dq/q 분해능 (FWHM 비율, 0 = 없음)")
+    parser.add_argument("--noise", action="store_true", help="Poisson 계수 노이즈 추가")
+    parser.add_argument("--batch-size", type=int, default=512, help="한 번에 시뮬레이션할 곡선 수")
+    parser.add_argument("--workers", type=int, default=None, help="프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--engine", choices=("native", "param2refl"), default="native",
+                        help="시뮬레이션 엔진 (native = 배치 Parratt 커널)")
+    args = parser.parse_args(argv)
+
+    generate(args.out, args.n, args.shard_size, args.seed, np.linspace(args.q_min, args.q_max, args.n_q),
+             args.max_films, args.resolution, args.noise, args.batch_size, args.workers, engine=args.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from app.logic import layers
+from app.logic.analysis import merge_estimates, tightened_bounds, warm_start
+from app.logic.layers import compile_stack
+
+# 사용자 테이블: SiO₂ σ 고정, Film 두 개의 σ 링크, 반복 블록 [A/B]×10
+USER_LAYERS = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 12.0, "sld": 2.2, "roughness": 2.0, "fix": "σ", "bounds": "d:5~30"},
+    {"layer": "Film A", "thickness": 20.0, "sld": 7.0, "roughness": 3.0, "repeat": "10"},
+    {"layer": "Film B", "thickness": 30.0, "sld": 3.0, "roughness": 3.0, "repeat": "10"},
+    {"layer": "Film cap", "thickness": 50.0, "sld": 4.0, "roughness": 4.0, "link": "σ:R"},
+    {"layer": "Film top", "thickness": 40.0, "sld": 5.0, "roughness": 5.0, "link": "σ:R"},
+]
+AI_LAYERS = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 15.0, "sld": 2.5, "roughness": 3.0},
+    {"layer": "Film", "thickness": 60.0, "sld": 4.5, "roughness": 2.0},
+    {"layer": "Film", "thickness": 35.0, "sld": 5.5, "roughness": 1.0},
+]
+
+
+def test_merge_copies_only_free_unlinked_values():
+    bounds = [{}, {"thickness": (10.0, 20.0), "sld": (2.0, 3.0), "roughness": (0.0, 8.0)},
+              {"thickness": (50.0, 70.0)}, {"thickness": (25.0, 45.0)}]
+    merged, merged_bounds = merge_estimates(USER_LAYERS, AI_LAYERS, bounds)
+
+    assert len(merged) == len(merged_bounds) == len(USER_LAYERS)
+    # 제약 컬럼 / 이름 / 반복 블록 행은 그대로
+    for before, after in zip(USER_LAYERS, merged):
+        for key in ("layer", "fix", "link", "bounds", "repeat"):
+            assert after.get(key) == before.get(key)
+    assert merged[2:4] == USER_LAYERS[2:4]
+    # SiO₂: σ 는 고정이라 그대로, d / ρ 는 추정값
+    assert (merged[1]["thickness"], merged[1]["sld"], merged[1]["roughness"]) == (15.0, 2.5, 2.0)
+    assert merged_bounds[1] == {"thickness": (10.0, 20.0), "sld": (2.0, 3.0)}
+    # 반복 블록 밖의 Film 행이 순서대로 AI Film 과 짝지어지고, 링크된 σ 는 그대로
+    assert (merged[4]["thickness"], merged[4]["roughness"]) == (60.0, 4.0)
+    assert (merged[5]["thickness"], merged[5]["roughness"]) == (35.0, 5.0)
+    assert merged_bounds[4] == {"thickness": (50.0, 70.0)}
+    assert merged_bounds[0] == merged_bounds[2] == merged_bounds[3] == {}
+
+
+def test_warm_started_stack_keeps_ties_fixed_and_repeats():
+    q = np.linspace(0.01, 0.3, 600)
+    truth = compile_stack(USER_LAYERS)
+    i_exp = 1e6 * truth.reflectivity(q, truth.p0)
+
+    seed, bounds = warm_start(q, i_exp, AI_LAYERS, USER_LAYERS)
+    stack = compile_stack(seed, bounds)
+    assert stack.param_map == truth.param_map
+    np.testing.assert_array_equal(stack.tie, truth.tie)
+    assert stack.repeats == truth.repeats
+    # 좁힌 bounds 는 테이블 Bounds 와 교집합
+    lo, hi = stack.bounds
+    k = stack.tie[stack.param_map.index((1, "thickness"))]
+    assert 5.0 <= lo[k] <= hi[k] <= 30.0
+
+
+def test_tightened_bounds_stay_inside_layer_limits(monkeypatch):
+    monkeypatch.setitem(layers.LIMITS, "thickness", (0.0, 105.0))
+    bounds = tightened_bounds([{"layer": "Film", "thickness": 100.0, "sld": 0.2, "roughness": 1.0}])[0]
+    assert bounds["thickness"] == (80.0, 105.0)
+    assert bounds["sld"] == (0.0, 0.7)
+    assert bounds["roughness"] == (0.0, 6.0)
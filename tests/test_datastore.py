@@ -0,0 +1,39 @@
+import numpy as np
+
+from app.logic.datastore import DatasetStore, load_dataset
+
+
+def dataset(seed, n=1000):
+    rng = np.random.default_rng(seed)
+    q = np.linspace(0.01, 0.5, n)
+    return np.vstack([q, rng.lognormal(0.0, 1.0, n)])
+
+
+def test_directory_is_created_on_first_put(tmp_path):
+    store = DatasetStore(tmp_path / "datasets")
+    assert not store.directory.exists()
+    assert store.get("missing") is None
+
+    data = dataset(0)
+    key = store.put(data)
+    assert store.directory.is_dir()
+    assert key == store.put(data)
+    np.testing.assert_array_equal(store.get(key), data)
+    # 다른 프로세스 (job) 는 디스크에서 같은 키로 읽음
+    np.testing.assert_array_equal(DatasetStore(tmp_path / "datasets").get(key), data)
+
+
+def test_disk_eviction_keeps_keys_held_in_memory(tmp_path):
+    # 한 데이터셋 ≈ 16 kB: 메모리에는 두 개, 디스크 상한은 한 개 분량
+    web = DatasetStore(tmp_path, memory_limit_mb=0.035, disk_limit_mb=0.02)
+    keys = [web.put(dataset(seed)) for seed in range(4)]
+
+    job = DatasetStore(tmp_path)
+    assert [job.get(key) is not None for key in keys] == [False, False, True, True]
+    assert list(web._memory) == keys[2:]
+
+
+def test_load_dataset_reports_missing_key(capsys):
+    assert load_dataset("0" * 32 + "-2x10") == (None, None)
+    assert load_dataset(None, errors=True) == (None, None, None)
+    assert capsys.readouterr().out.count("upload the file again") == 1
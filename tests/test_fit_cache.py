@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import app.logic.fit_cache as fit_cache_module
+from app.logic.fit_cache import FitCache, cached_fit, fit_keys
+from app.logic.layers import compile_stack
+
+WAVELENGTH = 1.5406
+TRUTH = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 15.0, "sld": 2.2, "roughness": 3.0, "fix": "σ"},
+    {"layer": "Film", "thickness": 126.0, "sld": 6.4, "roughness": 4.0},
+]
+
+
+def start(**film):
+    return [dict(TRUTH[0]), dict(TRUTH[1]), dict(TRUTH[2], thickness=120.0, sld=6.0, **film)]
+
+
+@pytest.fixture(scope="module")
+def data():
+    stack = compile_stack(TRUTH)
+    q = np.linspace(0.01, 0.4, 400)
+    return q, 3.7e5 * stack.reflectivity(q, stack.p0) + 2.0
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FitCache(tmp_path)
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    """실제로 실행된 피팅의 시작 두께"""
+    calls = []
+    run = fit_cache_module.run_fitting_algorithm
+
+    def counting(layers, *args, **kwargs):
+        calls.append(layers[2]["thickness"])
+        return run(layers, *args, **kwargs)
+
+    monkeypatch.setattr(fit_cache_module, "run_fitting_algorithm", counting)
+    return calls
+
+
+def test_fit_keys_are_stable(data):
+    q, I = data
+    problem, exact = fit_keys(compile_stack(start()), 3, q, I, WAVELENGTH)
+    # 같은 입력 (새로 만든 배열 / 테이블) -> 같은 키
+    assert fit_keys(compile_stack(start()), 3, q.copy(), I.copy(), WAVELENGTH) == (problem, exact)
+    # 표시용 컬럼은 키에 영향 없음
+    assert fit_keys(compile_stack(start(note="x")), 3, q, I, WAVELENGTH) == (problem, exact)
+
+    # 시작값만 다름 -> 같은 문제, 다른 정확한 키
+    moved = fit_keys(compile_stack(start(roughness=5.0)), 3, q, I, WAVELENGTH)
+    assert moved[0] == problem and moved[1] != exact
+    # 데이터 / 파장 / 고정값 / 엔진 설정이 다르면 다른 문제
+    fixed = start()
+    fixed[1]["roughness"] = 2.0
+    for other in (fit_keys(compile_stack(start()), 3, q, I * 1.01, WAVELENGTH),
+                  fit_keys(compile_stack(start()), 3, q, I, 1.0),
+                  fit_keys(compile_stack(fixed), 3, q, I, WAVELENGTH),
+                  fit_keys(compile_stack(start()), 3, q, I, WAVELENGTH, weighting="linear")):
+        assert other[0] != problem
+
+
+def test_cached_fit_hit_returns_stored_solution(data, cache, fits):
+    q, I = data
+    fitted, info = cached_fit(start(), q, I, WAVELENGTH, full_output=True, cache=cache)
+    assert info["cache"] == "miss" and info["success"]
+    assert abs(fitted[2]["thickness"] - 126.0) < 0.5
+
+    again, hit = cached_fit(start(), q, I, WAVELENGTH, full_output=True, cache=cache)
+    assert hit["cache"] == "hit"
+    assert len(fits) == 1
+    assert again == fitted
+    assert cache.info()["entries"] == 2
+
+
+def test_cached_fit_warm_starts_from_nearest_solution(data, cache, fits):
+    q, I = data
+    cached_fit(start(), q, I, WAVELENGTH, cache=cache)
+
+    # 시작값만 바뀐 같은 문제: warm_start 이면 저장된 해에서 시작
+    fitted, info = cached_fit(start(roughness=6.0), q, I, WAVELENGTH, full_output=True, warm_start=True,
+                              cache=cache)
+    assert info["cache"] == "warm"
+    assert fits[1] == pytest.approx(126.0, abs=0.5)
+    assert abs(fitted[2]["thickness"] - 126.0) < 0.5
+
+    # warm_start 가 없으면 테이블 시작값 그대로
+    _, info = cached_fit(start(roughness=7.0), q, I, WAVELENGTH, full_output=True, cache=cache)
+    assert info["cache"] == "miss"
+    assert fits[2] == 120.0
+
+
+def test_fit_without_free_parameters_bypasses_cache(data, cache):
+    q, I = data
+    layers = start(fix="all")
+    layers[1]["fix"] = "all"
+    # 자유 파라미터가 없으면 캐시를 거치지 않음
+    _, info = cached_fit(layers, q, I, WAVELENGTH, full_output=True, cache=cache)
+    assert not info["success"] and "cache" not in info
+    assert cache.info()["entries"] == 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.logic.fitting import fit_mask, outlier_mask, run_fitting_algorithm
+from app.logic.layers import compile_stack
+
+
+def film(thickness, sld=4.4, roughness=4.0):
+    return [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+        {"layer": "SiO₂", "thickness": 15.0, "sld": 2.2, "roughness": 3.0},
+        {"layer": "Film", "thickness": thickness, "sld": sld, "roughness": roughness},
+    ]
+
+
+def simulate(layers, q):
+    stack = compile_stack(layers)
+    return stack.reflectivity(q, stack.p0)
+
+
+@pytest.mark.parametrize("thickness, n_points", [(300.0, 600), (1000.0, 2000)])
+def test_noiseless_data_masks_nothing(thickness, n_points):
+    layers = film(thickness)
+    q = np.linspace(0.01, 0.5, n_points)
+    I = simulate(layers, q)
+
+    assert fit_mask(q, I, layers).all()
+    _, info = run_fitting_algorithm(layers, q, I, 1.5406, full_output=True, reject_outliers=True)
+    assert info["success"]
+    assert info["n_masked"] == 0
+
+
+def test_outlier_is_rejected_but_fringe_minima_kept():
+    layers = film(300.0)
+    q = np.linspace(0.01, 0.5, 600)
+    rng = np.random.default_rng(0)
+    I = simulate(layers, q) * rng.lognormal(0.0, 0.02, q.size)
+    spikes = [150, 420]
+    I[spikes] *= 20.0
+
+    r = np.log10(I) - np.log10(simulate(layers, q))
+    keep = outlier_mask(q, r)
+    assert not keep[spikes].any()
+    assert keep.sum() == q.size - len(spikes)
+
+    _, info = run_fitting_algorithm(layers, q, I, 1.5406, full_output=True, reject_outliers=True)
+    assert info["n_masked"] == len(spikes)
+
+
+def test_outlier_mask_uses_unit_floor_for_normalized_residuals():
+    q = np.linspace(0.01, 0.5, 200)
+    r = np.random.default_rng(1).normal(0.0, 1.0, q.size) * 1e-3
+    r[50] = 3.0
+    assert outlier_mask(q, r, weighting="log").sum() == q.size - 1
+    assert outlier_mask(q, r, weighting="linear").all()
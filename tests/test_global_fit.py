@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from app.logic.fitting import run_fitting_algorithm
+from app.logic.global_fit import run_global_fit, sample_starts
+from app.logic.layers import compile_stack
+
+TRUTH = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 15.0, "sld": 2.2, "roughness": 3.0, "bounds": "d:5~40, ρ:1.5~3, σ:0~6"},
+    {"layer": "Film", "thickness": 180.0, "sld": 6.4, "roughness": 4.0, "bounds": "d:50~300, ρ:2~10, σ:0~8"},
+]
+# 로컬 피팅만으로는 두께 골짜기를 못 넘는 시작값
+START = [dict(TRUTH[0]), dict(TRUTH[1], thickness=25.0), dict(TRUTH[2], thickness=90.0, sld=4.0)]
+
+
+@pytest.fixture(scope="module")
+def data():
+    stack = compile_stack(TRUTH)
+    q = np.linspace(0.01, 0.4, 400)
+    return q, 1e6 * stack.reflectivity(q, stack.p0)
+
+
+def test_sample_starts_is_deterministic():
+    stack = compile_stack(START)
+    starts = sample_starts(stack, 33, seed=3)
+    assert starts.shape == (33, stack.p0.size)
+    np.testing.assert_array_equal(starts, sample_starts(stack, 33, seed=3))
+    assert not np.array_equal(starts, sample_starts(stack, 33, seed=4))
+    # 첫 시작점은 테이블 값, 나머지는 bounds 안
+    np.testing.assert_array_equal(starts[0], stack.p0)
+    lo, hi = stack.bounds
+    assert (starts >= lo).all() and (starts <= hi).all()
+    assert len(np.unique(starts[1:, 0])) == 32
+
+
+def test_global_fit_recovers_truth_where_local_fit_fails(data):
+    q, I = data
+    truth = [TRUTH[r][k] for r in (1, 2) for k in ("thickness", "sld", "roughness")]
+    local = run_fitting_algorithm(START, q, I, 1.5406)
+    assert abs(local[2]["thickness"] - 180.0) > 1.0
+
+    results = run_global_fit(START, q, I, 1.5406, n_starts=32, top_k=3, workers=2)
+    assert len(results) == 3
+    assert [r["cost"] for r in results] == sorted(r["cost"] for r in results)
+    best = results[0]["layers"]
+    got = [float(best[r][k]) for r in (1, 2) for k in ("thickness", "sld", "roughness")]
+    np.testing.assert_allclose(got, truth, rtol=1e-2, atol=0.05)
+    # Bounds 컬럼 등 테이블 컬럼은 그대로
+    assert best[2]["bounds"] == TRUTH[2]["bounds"]
+
+
+def test_global_fit_needs_free_parameters(data):
+    q, I = data
+    fixed = [dict(layer, fix="all") for layer in START]
+    assert run_global_fit(fixed, q, I, 1.5406, workers=1) == []
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from app.logic.fitting import make_residuals, run_fitting_algorithm
+from app.logic.instrument import Instrument, build_kernel, project_scale_background
+from app.logic.layers import compile_stack
+
+# 희소 커널 vs 직접 가우시안 합성곱 허용 상대 오차
+CONV_RTOL = 1e-3
+
+LAYERS = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 15.0, "sld": 2.2, "roughness": 3.0},
+    {"layer": "Film", "thickness": 300.0, "sld": 4.4, "roughness": 4.0},
+]
+
+
+@pytest.fixture(scope="module")
+def stack():
+    return compile_stack(LAYERS)
+
+
+def direct_convolution(stack, q, instrument, width=6.0, n=1201):
+    """각 q 에서 ±width σ 전체 가우시안을 촘촘한 grid 위에서 직접 적분"""
+    sigma = instrument.sigma_q(q)
+    z = np.linspace(-width, width, n)
+    x = q[:, None] + sigma[:, None] * z
+    R = stack.reflectivity(np.clip(x, 1e-6, None).ravel(), stack.p0).reshape(x.shape)
+    g = np.exp(-0.5 * z * z)
+    return np.trapezoid(R * g, z, axis=1) / np.trapezoid(g, z)
+
+
+@pytest.mark.parametrize("n_points", [300, 2000])
+@pytest.mark.parametrize("mode, resolution", [("dq/q", 0.03), ("dq/q", 0.1), ("dtheta", 0.02), ("dtheta", 0.005)])
+def test_sparse_kernel_matches_direct_convolution(stack, mode, resolution, n_points):
+    instrument = Instrument(mode, resolution)
+    q = np.linspace(0.01, 0.5, n_points)
+    kernel = build_kernel(q, instrument)
+    smeared = kernel.apply(stack.reflectivity(kernel.q_calc, stack.p0))
+
+    check = slice(None, None, max(1, n_points // 200))
+    expected = direct_convolution(stack, q[check], instrument)
+    np.testing.assert_allclose(smeared[check], expected, rtol=CONV_RTOL)
+
+
+def test_kernel_grid_is_smaller_than_dense_data():
+    # 2000 점 / dq/q 3% 데이터는 실험 q-grid 보다 적은 점에서 시뮬레이션
+    q = np.linspace(0.01, 0.5, 2000)
+    kernel = build_kernel(q, Instrument("dq/q", 0.03))
+    assert len(kernel.q_calc) < len(q)
+    assert kernel.q_calc[0] < q[0] and kernel.q_calc[-1] > q[-1]
+
+
+def test_ideal_instrument_has_no_matrix(stack):
+    q = np.linspace(0.01, 0.5, 100)
+    kernel = build_kernel(q, Instrument())
+    assert kernel.matrix is None
+    R = stack.reflectivity(q, stack.p0)
+    np.testing.assert_array_equal(kernel.apply(R), R)
+
+
+# --- project_scale_background ---
+
+SCALE, BACKGROUND = 3.7e5, 2.0
+FILM = [dict(LAYERS[0]), dict(LAYERS[1]), dict(LAYERS[2], thickness=126.0, sld=6.4)]
+
+
+def measured(rng=None, outlier=False):
+    stack = compile_stack(FILM)
+    q = np.linspace(0.01, 0.4, 400)
+    I = SCALE * stack.reflectivity(q, stack.p0) + BACKGROUND
+    if rng is not None:
+        I *= rng.lognormal(0.0, 0.02, q.size)
+    if outlier:
+        I[np.argmin(np.abs(q - 0.035))] *= 1.8
+    return stack, q, I
+
+
+def test_projection_recovers_scale_and_background():
+    stack, q, I = measured()
+    R = stack.reflectivity(q, stack.p0)
+    for weights in (None, np.ones_like(q)):
+        scale, background = project_scale_background(R, I, weights=weights)
+        assert scale.shape == background.shape == ()
+        np.testing.assert_allclose([scale, background], [SCALE, BACKGROUND], rtol=1e-8)
+
+
+def test_projection_keeps_fixed_values():
+    stack, q, I = measured()
+    R = stack.reflectivity(q, stack.p0)
+    scale, background = project_scale_background(R, I, scale=SCALE)
+    assert scale == SCALE
+    np.testing.assert_allclose(background, BACKGROUND, rtol=1e-8)
+    scale, background = project_scale_background(R, I, background=BACKGROUND)
+    assert background == BACKGROUND
+    np.testing.assert_allclose(scale, SCALE, rtol=1e-8)
+    assert project_scale_background(R, I, 1.0, 0.5) == (1.0, 0.5)
+
+
+def test_negative_background_is_clamped():
+    stack, q, _ = measured()
+    R = stack.reflectivity(q, stack.p0)
+    I = SCALE * R - 0.5 * SCALE * R.min()
+    scale, background = project_scale_background(R, I)
+    assert background == 0.0
+    np.testing.assert_allclose(scale, project_scale_background(R, I, background=0.0)[0])
+
+
+def test_projection_excludes_non_positive_points():
+    stack, q, I = measured()
+    R = stack.reflectivity(q, stack.p0)
+    bad = I.copy()
+    bad[::7] = 0.0
+    bad[3::7] = -5.0
+    keep = bad > 0
+    np.testing.assert_allclose(project_scale_background(R, bad), project_scale_background(R[keep], bad[keep]))
+
+
+def test_projection_is_batched():
+    stack, q, I = measured()
+    R = np.stack([stack.reflectivity(q, stack.p0) * f for f in (0.5, 1.0, 2.0)])
+    scale, background = project_scale_background(R, I)
+    assert scale.shape == background.shape == (3,)
+    np.testing.assert_allclose(scale, SCALE / np.array([0.5, 1.0, 2.0]), rtol=1e-8)
+    for row, s, b in zip(R, scale, background):
+        np.testing.assert_allclose(project_scale_background(row, I), (s, b))
+
+
+def test_noisy_projection_at_truth():
+    # 2% 잡음 + 임계각 근처 1.8 배 이상치에서도 참 파라미터의 scale / background 를 0.5% 안에서 복원
+    stack, q, I = measured(np.random.default_rng(0), outlier=True)
+    scale, background = make_residuals(stack, q, I).scale_background(stack.p0)
+    np.testing.assert_allclose([scale, background], [SCALE, BACKGROUND], rtol=5e-3)
+
+
+def test_fit_with_projection_beats_max_normalization():
+    _, q, I = measured(np.random.default_rng(0), outlier=True)
+    start = [dict(FILM[0]), dict(FILM[1]), dict(FILM[2], thickness=120.0, sld=6.0)]
+
+    fitted, info = run_fitting_algorithm(start, q, I, 1.5406, full_output=True)
+    assert info["success"] and info["cost"] < 0.1
+    assert abs(fitted[2]["thickness"] - 126.0) < 0.5
+    np.testing.assert_allclose(info["scale"], SCALE, rtol=0.1)
+    np.testing.assert_allclose(info["background"], BACKGROUND, rtol=0.05)
+
+    # 예전 방식: scale = max(I_exp), background 없음
+    _, old = run_fitting_algorithm(start, q, I, 1.5406, full_output=True,
+                                   instrument=Instrument(scale=I.max(), background=0.0))
+    assert old["cost"] > 100 * info["cost"]
@@ -0,0 +1,61 @@
+import diskcache
+import pytest
+from flask import Flask
+
+import app.instrumentation as instrumentation
+from app.instrumentation import Metrics
+
+
+@pytest.fixture
+def store(tmp_path):
+    with diskcache.Cache(tmp_path) as cache:
+        yield cache
+
+
+def stored_calls(store, name):
+    return (store.get(instrumentation._STORE_KEY) or instrumentation._empty())["counters"].get(name, 0)
+
+
+def test_server_flushes_every_n_events(store, monkeypatch):
+    monkeypatch.setattr(instrumentation, "FLUSH_EVENTS", 3)
+    monkeypatch.setattr(instrumentation, "FLUSH_SECONDS", 3600.0)
+    metrics = Metrics()
+    metrics.bind(store)
+    for expected in (0, 0, 3, 3):
+        metrics.count("calls")
+        metrics.maybe_flush()
+        assert stored_calls(store, "calls") == expected
+    # collect 는 남은 로컬 값까지 합침
+    assert metrics.collect()["counters"]["calls"] == 4
+
+
+def test_server_flushes_on_timer(store, monkeypatch):
+    monkeypatch.setattr(instrumentation, "FLUSH_SECONDS", 0.0)
+    metrics = Metrics()
+    metrics.bind(store)
+    metrics.count("calls")
+    metrics.maybe_flush()
+    assert stored_calls(store, "calls") == 1
+
+
+def test_job_process_flushes_every_callback(store, monkeypatch):
+    monkeypatch.setattr(instrumentation, "FLUSH_SECONDS", 3600.0)
+    metrics = Metrics()
+    metrics.bind(store)
+    metrics.job_process = True
+    metrics.add_time("fit", 12.0)
+    metrics.maybe_flush()
+    assert store.get(instrumentation._STORE_KEY)["timers"]["fit"] == [1, 12.0, 12.0]
+
+
+@pytest.mark.parametrize("enabled, status", [(False, 404), (True, 200)])
+def test_metrics_endpoint_needs_config_flag(tmp_path, monkeypatch, enabled, status):
+    monkeypatch.setattr(instrumentation, "METRICS_ENDPOINT", enabled)
+    monkeypatch.setattr(instrumentation, "PROFILE_DIR", str(tmp_path))
+    server = instrumentation.install(Flask(__name__))
+    client = server.test_client()
+    # 프록시 뒤 (remote_addr 가 로컬) 요청도 설정으로만 판단
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == status
+    response = client.get("/metrics?profile=1", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert ("X-Profile-File" in response.headers) == enabled
+    assert len(list(tmp_path.glob("*.prof"))) == enabled
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from app.logic.layers import LayerStack, _intersect, _parse_bounds, _parse_fix, _parse_link
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", set()),
+    (None, set()),
+    ("d", {0}),
+    ("d, σ", {0, 2}),
+    ("thickness; rho / sigma", {0, 1, 2}),
+    ("all", {0, 1, 2}),
+    ("*", {0, 1, 2}),
+    ("x, d", {0}),
+])
+def test_parse_fix(text, expected):
+    assert _parse_fix(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", {}),
+    ("A", {0: "A", 1: "A", 2: "A"}),
+    ("σ:A", {2: "A"}),
+    ("σ: A", {2: "A"}),
+    ("σ :A", {2: "A"}),
+    ("σ:A, d:B", {0: "B", 2: "A"}),
+    ("sigma : A;thickness:B", {0: "B", 2: "A"}),
+    ("A, σ:B", {0: "A", 1: "A", 2: "B"}),
+    ("x:A", {}),
+])
+def test_parse_link(text, expected):
+    assert _parse_link(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", {}),
+    ("d:100~200", {0: (100.0, 200.0)}),
+    ("d : 100 ~ 200, σ:0-5", {0: (100.0, 200.0), 2: (0.0, 5.0)}),
+    ("ρ=1e-1..2.5", {1: (0.1, 2.5)}),
+    ("d:200~100", {}),
+    ("x:1~2", {}),
+])
+def test_parse_bounds(text, expected):
+    assert _parse_bounds(text) == expected
+
+
+def test_link_and_bounds_columns_parse_spacing_alike():
+    assert _parse_link("σ: A") == _parse_link("σ:A")
+    assert _parse_bounds("σ: 1~2") == _parse_bounds("σ:1~2")
+
+
+def test_intersect():
+    assert _intersect((0.0, 10.0), None) == (0.0, 10.0)
+    assert _intersect((0.0, 10.0), (5.0, 20.0)) == (5.0, 10.0)
+    assert _intersect((0.0, 10.0), (10.0, 20.0)) == (10.0, 10.0)
+
+
+def test_intersect_warns_on_conflict():
+    with pytest.warns(RuntimeWarning, match="does not overlap"):
+        assert _intersect((0.0, 10.0), (20.0, 30.0), "Film thickness") == (0.0, 10.0)
+
+
+def test_linked_parameters_share_one_slot_with_intersected_bounds():
+    rows = [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+        {"layer": "SiO₂", "thickness": 15, "sld": 2.2, "roughness": 3, "link": "σ: A", "bounds": "σ:0~6"},
+        {"layer": "Film", "thickness": 100, "sld": 4, "roughness": 4, "link": "σ:A", "bounds": "σ:2~8"},
+    ]
+    stack = LayerStack.from_table(rows).compile()
+    assert len(stack.p0) == 5
+    k = stack.tie[[key for _, key in stack.param_map].index("roughness")]
+    assert (stack.bounds[0][k], stack.bounds[1][k]) == (2.0, 6.0)
+
+
+def test_conflicting_link_bounds_warn():
+    rows = [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+        {"layer": "SiO₂", "thickness": 15, "sld": 2.2, "roughness": 3, "link": "σ:A", "bounds": "σ:0~2"},
+        {"layer": "Film", "thickness": 100, "sld": 4, "roughness": 4, "link": "σ:A", "bounds": "σ:5~8"},
+    ]
+    with pytest.warns(RuntimeWarning, match="link A"):
+        stack = LayerStack.from_table(rows).compile()
+    assert np.isfinite(stack.p0).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from app.logic.loader import load_xrr_text, sniff_format
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (["0.01 100.0", "0.02 90.0"], (None, 0, 2)),
+    (["0.01\t100.0\t1.5", "0.02\t90.0\t1.4"], ("\t", 0, 3)),
+    (["0.01,100.0,1.5,7", "0.02,90.0,1.4,7"], (",", 0, 3)),
+    (["0.01; 1e+2", "0.02; 9e1"], (";", 0, 2)),
+    (["q R dR", "0.01 100.0 1.5"], (None, 1, 3)),
+    (["q,R", "", "0.01,100.0"], (",", 2, 2)),
+    (["# scan 1", "% sample: Si", "; operator", "! gonio", "// q R", "  .01  1E2  "], (None, 5, 2)),
+    (["2theta intensity", "0.01 100.0 n/a"], (None, 1, 2)),
+])
+def test_sniff_format(lines, expected):
+    assert sniff_format(lines) == expected
+
+
+@pytest.mark.parametrize("lines", [[], ["# only comments"], ["q R", "a b"], ["0.01"]])
+def test_sniff_format_without_numeric_rows(lines):
+    assert sniff_format(lines) is None
+
+
+def test_load_skips_header_comments_and_bad_rows():
+    text = "# XRR scan\nq,R,dR\n0.01,100.0,1.5\n# pause\n0.02,90.0,1.4\n0.03,nan,1.0\n\n0.04,80.0,1.2\n"
+    data = load_xrr_text(text.encode())
+    np.testing.assert_array_equal(data, [[0.01, 0.02, 0.04], [100.0, 90.0, 80.0], [1.5, 1.4, 1.2]])
+    assert data.flags.c_contiguous
+
+
+def test_load_without_numeric_data():
+    with pytest.raises(ValueError, match="No numeric data"):
+        load_xrr_text("q R\n")
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import app.logic.lookup as lookup
+from app.logic.fitting import run_fitting_algorithm
+from app.logic.layers import compile_stack
+
+BOUNDS = ("d:5~40, ρ:1.5~3, σ:0~6", "d:50~300, ρ:2~10, σ:0~8")
+# (SiO₂ d, ρ, σ, Film d, ρ, σ)
+TRUTHS = [
+    (15.0, 2.2, 3.0, 120.0, 6.4, 4.0),
+    (30.0, 2.6, 2.0, 250.0, 4.0, 6.0),
+    (8.0, 1.9, 5.0, 80.0, 8.5, 2.0),
+    (22.0, 2.3, 1.0, 180.0, 3.2, 5.0),
+    (12.0, 2.0, 4.0, 60.0, 9.5, 3.0),
+]
+
+
+def template(bounds=("", "")):
+    return [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+        {"layer": "SiO₂", "thickness": 15.0, "sld": 2.2, "roughness": 3.0, "bounds": bounds[0]},
+        {"layer": "Film", "thickness": 100.0, "sld": 4.0, "roughness": 4.0, "bounds": bounds[1]},
+    ]
+
+
+def curve(truth, q):
+    layers = template(BOUNDS)
+    layers[1].update(thickness=truth[0], sld=truth[1], roughness=truth[2])
+    layers[2].update(thickness=truth[3], sld=truth[4], roughness=truth[5])
+    stack = compile_stack(layers)
+    return 1e6 * stack.reflectivity(q, stack.p0)
+
+
+@pytest.fixture(scope="module")
+def library_cache(tmp_path_factory):
+    # 라이브러리는 모듈당 한 번만 생성
+    return lookup.LibraryCache(tmp_path_factory.mktemp("library"))
+
+
+@pytest.fixture(autouse=True)
+def use_library_cache(library_cache, monkeypatch):
+    monkeypatch.setattr(lookup, "library_cache", library_cache)
+
+
+def test_parameter_grid_is_deterministic_and_log_spaced():
+    lo, hi = np.array([5.0, 0.5]), np.array([1000.0, 25.0])
+    params = lookup.parameter_grid(lo, hi, 4096, log_axes=[True, False])
+    assert params.shape == (4096, 2)
+    np.testing.assert_array_equal(params, lookup.parameter_grid(lo, hi, 4096, log_axes=[True, False]))
+    assert (params >= lo).all() and (params <= hi).all()
+    # 두께 축은 log 간격 (중앙값 ≈ 기하 평균), 나머지는 등간격
+    assert np.median(params[:, 0]) == pytest.approx(np.sqrt(5.0 * 1000.0), rel=0.05)
+    assert np.median(params[:, 1]) == pytest.approx(12.75, rel=0.05)
+    # 완전 grid 와 달리 축마다 모든 값이 다름
+    assert len(np.unique(params[:, 0])) == len(params)
+
+
+def test_lookup_warns_without_bounds():
+    assert lookup.unbounded_parameters(template(BOUNDS)) == []
+    assert lookup.unbounded_parameters(template()) == ["Film d", "Film ρ", "Film σ", "SiO₂ d", "SiO₂ ρ", "SiO₂ σ"]
+    q = np.linspace(0.01, 0.4, 400)
+    with pytest.warns(RuntimeWarning, match="no Bounds"):
+        lookup.lookup_candidates(template(), q, curve(TRUTHS[0], q), k=1)
+
+
+@pytest.mark.parametrize("truth", TRUTHS)
+def test_lookup_recovers_noiseless_template_curve(truth):
+    q = np.linspace(0.01, 0.4, 800)
+    I = curve(truth, q)
+    start = compile_stack(template(BOUNDS))
+    q_fit, I_fit = lookup._fit_points(q, I)
+    start_distance = np.sqrt(lookup._log_cost(start, q_fit, I_fit, start.p0[None])[0] / len(q_fit))
+
+    best = lookup.lookup_candidates(template(BOUNDS), q, I, k=1)[0]
+    assert best["distance"] < 0.25
+    assert best["distance"] < start_distance / 3
+
+    refined = lookup.lookup_candidates(template(BOUNDS), q, I, k=1, refine=True)[0]
+    assert refined["distance"] < 0.1
+    assert refined["distance"] <= best["distance"]
+
+    # 다듬은 후보에서 시작한 로컬 피팅은 참값으로 수렴
+    fitted = run_fitting_algorithm(refined["layers"], q, I, 1.5406)
+    got = [float(fitted[r][k]) for r in (1, 2) for k in ("thickness", "sld", "roughness")]
+    np.testing.assert_allclose(got, truth, rtol=1e-2, atol=0.05)
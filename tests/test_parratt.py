@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.logic.fitting import calculate_xrr_simulation
+from app.logic.layers import compile_stack
+from app.logic.materials import MATERIAL_DB
+
+# native 커널 vs param2refl 허용 오차: R > R_FLOOR 인 점에서 |Δlog10 R| (dex), 그 아래는 절대 오차
+LOG_TOL = 1e-3
+R_FLOOR = 1e-10
+
+SLDS = sorted({float(m["sld"]) for m in MATERIAL_DB})
+Q = np.linspace(0.005, 0.6, 800)
+
+
+def stack_rows(films, sio2=(15.0, 2.20, 3.0)):
+    rows = [
+        {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+        {"layer": "SiO₂", "thickness": sio2[0], "sld": sio2[1], "roughness": sio2[2]},
+    ]
+    rows += [{"layer": "Film", "thickness": t, "sld": s, "roughness": r} for t, s, r in films]
+    return rows
+
+
+def assert_parity(rows):
+    stack = compile_stack(rows)
+    native = stack.reflectivity(Q, stack.p0)
+    reference = np.asarray(calculate_xrr_simulation(Q, rows), dtype=float)
+
+    above = (reference > R_FLOOR) & (native > R_FLOOR)
+    dlog = np.abs(np.log10(native[above]) - np.log10(reference[above]))
+    assert dlog.max(initial=0.0) <= LOG_TOL, f"max |Δlog10 R| = {dlog.max():.2e} at q = {Q[above][dlog.argmax()]:.4f}"
+    np.testing.assert_allclose(native[~above], reference[~above], atol=R_FLOOR)
+
+
+@pytest.mark.parametrize("sld", SLDS)
+@pytest.mark.parametrize("thickness, roughness", [(20.0, 0.0), (150.0, 3.0), (600.0, 8.0)])
+def test_single_film_matches_param2refl(sld, thickness, roughness):
+    assert_parity(stack_rows([(thickness, sld, roughness)]))
+
+
+@pytest.mark.parametrize("top, bottom", list(itertools.combinations(SLDS, 2)))
+def test_bilayer_matches_param2refl(top, bottom):
+    # 테이블 순서: 기판 쪽 Film 이 먼저
+    assert_parity(stack_rows([(80.0, bottom, 4.0), (40.0, top, 2.0)]))
+
+
+def test_batched_kernel_matches_single_evaluation():
+    stack = compile_stack(stack_rows([(80.0, 7.19, 4.0), (40.0, 19.32, 2.0)]))
+    p = stack.p0 * np.array([[1.0], [0.9], [1.1]])
+    batch = stack.reflectivity(Q, p)
+    for i in range(len(p)):
+        np.testing.assert_allclose(batch[i], stack.reflectivity(Q, p[i]), rtol=1e-12)
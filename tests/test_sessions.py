@@ -0,0 +1,77 @@
+import pytest
+
+from app.logic.sessions import SessionDB
+
+INITIAL = [
+    {"layer": "Si Substrate", "thickness": "∞", "sld": 2.33, "roughness": 0.2},
+    {"layer": "SiO₂", "thickness": 15.0, "sld": 2.2, "roughness": 3.0},
+    {"layer": "Film", "thickness": 120.0, "sld": 6.0, "roughness": 4.0, "fix": "σ"},
+]
+
+
+def record(sample, data_hash, created_at, thickness, success=True):
+    final = [dict(INITIAL[0]), dict(INITIAL[1]), dict(INITIAL[2], thickness=thickness)]
+    return {
+        "sample": sample, "source": f"{sample}.dat", "data_hash": data_hash, "wavelength": 1.5406,
+        "n_points": 400, "initial_layers": INITIAL, "final_layers": final, "created_at": created_at,
+        "wall_time_s": 0.5, "settings": {"weighting": "log"},
+        "info": {"success": success, "cost": 0.01, "redchi": 1.1, "nfev": 40, "njev": 12, "message": "ok",
+                 "uncertainties": [{}, {"thickness": 0.1}, {"thickness": 0.3, "sld": 0.02}]},
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SessionDB(tmp_path / "sub" / "fits.sqlite3")
+    ids = db.record_fits([
+        record("A", "hash-a", 100.0, 126.0),
+        record("A", "hash-a", 200.0, 127.0, success=False),
+        record("B", "hash-b", 150.0, 80.0),
+    ])
+    assert ids == [1, 2, 3]
+    return db
+
+
+def test_record_and_query_round_trip(db):
+    rows = db.query(sample="A")
+    assert [r["created_at"] for r in rows] == [200.0, 100.0]
+    first = rows[1]
+    assert first["initial_layers"] == INITIAL
+    assert first["final_layers"][2]["thickness"] == 126.0
+    assert first["settings"] == {"weighting": "log"}
+    assert (first["success"], first["nfev"], first["njev"], first["n_points"]) == (1, 40, 12, 400)
+
+    assert [r["sample"] for r in db.query()] == ["A", "B", "A"]
+    assert [r["id"] for r in db.query(data_hash="hash-b")] == [3]
+    assert [r["id"] for r in db.query(since=120.0, until=200.0)] == [3]
+    assert [r["id"] for r in db.query(material="SiO₂", limit=1)] == [2]
+    assert db.query(material="Au") == []
+    assert db.count(sample="A") == 2
+    assert db.latest(sample="B")["id"] == 3
+
+
+def test_reopen_prefers_latest_successful_session(db):
+    session, n_saved = db.reopen("hash-a")
+    assert n_saved == 2
+    assert session["id"] == 1 and session["final_layers"][2]["thickness"] == 126.0
+    assert db.reopen("missing") == (None, 0)
+
+    db.record_fit(**record("C", "hash-c", 300.0, 50.0, success=False))
+    assert db.reopen("hash-c") == (None, 1)
+
+
+def test_export_rows_flatten_layers_and_uncertainties(db):
+    row = db.export_rows(sample="B")[0]
+    assert row["id"] == 3 and row["iterations"] == 12 and row["success"] is True
+    assert row["L2_Film_thickness"] == 80.0 and row["L2_Film_thickness_err"] == 0.3
+    assert row["L1_SiO₂_thickness_err"] == 0.1
+    assert "L2_Film_roughness_err" not in row
+    # 숫자가 아닌 기판 두께 ("∞") 는 NULL
+    assert row["L0_Si Substrate_thickness"] is None
+
+
+def test_delete_cascades_to_layers(db):
+    db.delete([1, 3])
+    assert [r["id"] for r in db.query()] == [2]
+    assert [r["id"] for r in db.export_rows()] == [2]
+    assert db._connect().execute("SELECT COUNT(*) FROM fit_layers").fetchone()[0] == 3
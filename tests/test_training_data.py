@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from app.training_data import generate, load_shards, sample_stacks, shard_files
+
+Q = np.linspace(0.005, 0.3, 64)
+SETTINGS = dict(n_total=50, shard_size=20, seed=7, q=Q, batch_size=8)
+
+
+def assert_same_shards(a, b):
+    (q_a, shards_a), (q_b, shards_b) = load_shards(a), load_shards(b)
+    np.testing.assert_array_equal(q_a, q_b)
+    assert len(shards_a) == len(shards_b) == 3
+    for x, y in zip(shards_a, shards_b):
+        for key in x:
+            np.testing.assert_array_equal(x[key], y[key])
+
+
+def test_sample_stacks_respect_priors():
+    params, films, materials = sample_stacks(np.random.default_rng(0), 500, 3)
+    present = np.arange(3) < films[:, None]
+    assert ((films >= 1) & (films <= 3)).all()
+    assert (materials[~present] == -1).all() and (materials[present] >= 0).all()
+    assert np.isnan(params[:, :3][~present]).all()
+    thickness, roughness = params[:, :3, 0][present], params[:, :3, 2][present]
+    assert ((thickness >= 10.0) & (thickness <= 1000.0)).all()
+    assert (roughness <= thickness / 2).all()
+    assert np.isfinite(params[:, -1]).all()
+
+
+def test_shards_do_not_depend_on_worker_count(tmp_path):
+    manifest = generate(tmp_path / "one", workers=1, **SETTINGS)
+    generate(tmp_path / "two", workers=2, **SETTINGS)
+    assert [s["n"] for s in manifest["shards"]] == [20, 20, 10]
+    assert_same_shards(tmp_path / "one", tmp_path / "two")
+
+    _, shards = load_shards(tmp_path / "one")
+    curves = shards[0]["curves"]
+    assert curves.shape == (20, len(Q)) and curves.dtype == np.float32
+    assert not curves.flags.writeable
+    # log10 R: 전반사 구간은 ≈ 0, 큰 q 에서 감소
+    assert np.all(curves[:, 0] > -0.5) and np.all(curves[:, -1] < curves[:, 0])
+
+
+def test_rerun_resumes_missing_shard(tmp_path):
+    generate(tmp_path / "full", workers=1, **SETTINGS)
+    generate(tmp_path / "resumed", workers=1, **SETTINGS)
+    (tmp_path / "resumed" / shard_files(1)["params"]).unlink()
+    generate(tmp_path / "resumed", workers=1, **SETTINGS)
+    assert_same_shards(tmp_path / "full", tmp_path / "resumed")
+
+    with pytest.raises(ValueError, match="different settings"):
+        generate(tmp_path / "resumed", workers=1, **dict(SETTINGS, seed=8))